@@ -47,7 +47,6 @@ __email__ = 'bibi21000@gmail.com'
 
 
 import os
-import pickle
 from typing import TYPE_CHECKING, Any, ClassVar, cast
 from pathlib import Path
 import copy
@@ -1942,6 +1941,8 @@ class OSIntProcessor:
 
     def table_idents(self, doctree: nodes.document, docname: str, table_node, idents, relations, links, sources) -> None:
         """ """
+        # Only used to filter linked items
+        relations, links = set(relations), set(links)
         table = nodes.table()
 
         # Groupe de colonnes
@@ -2200,6 +2201,8 @@ class OSIntProcessor:
 
     def table_sources(self, doctree: nodes.document, docname: str, table_node, sources, orgs, idents, relations, events, links, quotes) -> None:
         """ """
+        # Only used to filter linked items
+        orgs, idents, relations, events, links = set(orgs), set(idents), set(relations), set(events), set(links)
         table = nodes.table()
 
         # Groupe de colonnes
@@ -4230,8 +4233,8 @@ class OSIntDomain(Domain):
     def merge_domaindata(self, docnames: Set[str], otherdata: dict[str, Any]) -> None:
         # ~ for docname in docnames:
             # ~ self.orgs[docname] = otherdata['orgs'][docname]
-        for docname in docnames:
-            self.quest.merge_quest(docname, otherdata['quest'])
+        # Only the items of docnames are merged, duplicates are reported
+        self.quest.merge_quest(docnames, otherdata['quest'])
 
     @reify_classmethod
     def _imp_json(cls):
@@ -4443,9 +4446,9 @@ class OSIntBuildDone:
 
     def process(self, app, exception) -> None:
         if exception is None:
-            with open(os.path.join(app.builder.doctreedir, 'osint_quest.pickle'), 'wb') as handle:
-            # ~ with open(os.path.join(app.builder.outdir, 'osint_quest.pickle'), 'wb') as handle:
-                pickle.dump(app.env.domains.get('osint').quest, handle, protocol=pickle.HIGHEST_PROTOCOL)
+            from .storelib import OSIntQuestStore
+            # Only the items of the documents changed by this build are written
+            OSIntQuestStore(app.builder.doctreedir).save(app.env.domains.get('osint').quest)
 
 class OSIntRelatedOutdated:
 
@@ -4468,19 +4471,44 @@ def OSIntEnvUpdated(app, env) -> list():
         for plg in osint_plugins['directive']:
             relateds += plg.related()
 
+    quest = env.get_domain("osint").quest
+    changed = quest.get_changed()
     for related in relateds:
-        related_obj = getattr(env.get_domain("osint").quest, related)
+        related_obj = getattr(quest, related)
         for obj in related_obj:
             docname = related_obj[obj].docname
-            if docname is not None and docname not in ret:
+            if docname is None:
+                continue
+            # Always check to remember the dependencies for the next build
+            outdated = getattr(related_obj[obj], 'outdated', None)
+            if env.config.osint_related_depends is True and outdated is not None \
+              and outdated(changed) is False:
+                continue
+            if docname not in ret:
                 ret.append(docname)
     if env.config.osint_emit_warnings:
         logger.warning(__("Env updated for docs %s"), ret)
     return ret
 
 
+def OSIntEnvFetchSources(app, env) -> list():
+    """Fetch the sources queued while reading docs"""
+    from .fetchlib import OSIntFetcher
+    plugins = osint_plugins.get('source', []) + osint_plugins.get('directive', [])
+    fetcher = OSIntFetcher(env, plugins,
+        workers=env.config.osint_fetch_workers,
+        per_host=env.config.osint_fetch_per_host,
+        timeout=env.config.osint_fetch_timeout)
+    fetcher.process(env.get_domain("osint").quest)
+    return []
+
+
 def OSIntEnvBeforeReadDocs(app, env, docnames):
     global osint_plugins
+    from .storelib import OSIntQuestStore
+    quest = env.get_domain('osint').quest
+    OSIntQuestStore(env.doctreedir).begin(quest)
+    quest.reset_changed()
     for plg_cat in osint_plugins:
         for plg in osint_plugins[plg_cat]:
             plg.init(env)
@@ -4509,6 +4537,11 @@ config_values = [
     ('osint_auths', [], 'html'),
     ('osint_http_proxy', None, 'html'),
     ('osint_socks_proxy', None, 'html'),
+    ('osint_fetch_deferred', True, 'html'),
+    ('osint_fetch_workers', 4, 'html'),
+    ('osint_fetch_per_host', 2, 'html'),
+    ('osint_fetch_timeout', 1800, 'html'),
+    ('osint_related_depends', True, 'html'),
 ]
 
 def extend_plugins(app):
@@ -4669,6 +4702,7 @@ def setup(app: Sphinx) -> ExtensionMetadata:
     app.add_domain(OSIntDomain)
     app.connect('doctree-resolved', OSIntProcessor)
     app.connect('build-finished', OSIntBuildDone)
+    app.connect('env-updated', OSIntEnvFetchSources, priority=400)
     app.connect('env-updated', OSIntEnvUpdated)
     app.connect('related-outdated', OSIntRelatedOutdated)
     app.connect('env-before-read-docs', OSIntEnvBeforeReadDocs)
@@ -4683,6 +4717,6 @@ def setup(app: Sphinx) -> ExtensionMetadata:
 
     return {
         'version': sphinx.__display_version__,
-        'env_version': 2,
+        'env_version': 11,
         'parallel_read_safe': True,
         'parallel_write_safe': True,    }
@@ -0,0 +1,372 @@
+# -*- encoding: utf-8 -*-
+"""
+The fetch stage
+------------------
+
+Sources are not fetched anymore while the directive is parsed : OSIntSource
+only queues its name in the quest. The queue is drained once per build, after
+all documents are read (and merged when using parallel read), by a bounded
+pool of workers with a per host concurrency limit.
+
+OSIntHostScheduler paces the requests sent to a same host and keeps
+the fetch methods that worked (or not) for each host between builds.
+
+"""
+from __future__ import annotations
+
+__author__ = 'bibi21000 aka Sébastien GALLET'
+__email__ = 'bibi21000@gmail.com'
+
+import os
+import time
+import queue
+import threading
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from sphinx.util import logging
+from sphinx.util.display import status_iterator
+
+from .osintlib import reify_classmethod
+
+log = logging.getLogger(__name__)
+
+
+class OSIntFetcher():
+
+    def __init__(self, env, plugins, workers=4, per_host=2, timeout=1800):
+        """Fetch queued sources with plugins
+
+        :param env: The sphinx env.
+        :type env: BuildEnvironment
+        :param plugins: The plugins to call init_source on.
+        :type plugins: list of Plugin
+        :param workers: The number of workers. 1 to fetch in the main thread.
+        :type workers: int
+        :param per_host: The max number of concurrent fetches on a same host.
+        :type per_host: int
+        :param timeout: The max number of seconds to fetch a source in a worker.
+            Signals only work in the main thread : a worker that exceeds it is
+            abandoned and replaced, its host slot is released and the other
+            sources of the host are skipped. 0 or None to wait forever.
+        :type timeout: int
+        """
+        self.env = env
+        self.plugins = plugins
+        self.workers = max(1, workers)
+        self.per_host = max(1, per_host)
+        self.timeout = timeout
+        # host -> names of the sources being fetched
+        self._host_slots = defaultdict(set)
+        # The hosts where a fetch timed out
+        self._host_timeouts = set()
+        self._hosts = threading.Condition()
+
+    @classmethod
+    def host(cls, source):
+        """Get the host a source will be fetched from.
+        Local sources share the same pseudo host."""
+        for attr in ('url', 'youtube', 'bsky'):
+            url = getattr(source, attr, None)
+            if url is not None:
+                try:
+                    hostname = urlsplit(url).hostname
+                except ValueError:
+                    hostname = None
+                return hostname if hostname is not None else url
+        return 'local'
+
+    def _host_acquire(self, host, name):
+        """Wait for a slot on host for the source name.
+
+        :returns: False if a fetch timed out on host
+        :rtype: bool
+        """
+        with self._hosts:
+            while host not in self._host_timeouts:
+                if len(self._host_slots[host]) < self.per_host:
+                    self._host_slots[host].add(name)
+                    return True
+                self._hosts.wait()
+            return False
+
+    def _host_release(self, host, name, timedout=False):
+        """Release the slot of the source name on host.
+        It is also released by the supervisor when the worker is abandoned."""
+        with self._hosts:
+            self._host_slots[host].discard(name)
+            if timedout is True:
+                self._host_timeouts.add(host)
+            self._hosts.notify_all()
+
+    def fetch_one(self, source):
+        """Call init_source of all plugins for source, limited by host
+
+        :returns: the name of the source or None if it was skipped
+        :rtype: str or None
+        """
+        host = self.host(source)
+        if self._host_acquire(host, source.name) is False:
+            log.warning('Skip fetching %s : a fetch timed out on %s' % (source.name, host))
+            return None
+        try:
+            for plg in self.plugins:
+                try:
+                    plg.init_source(self.env, source)
+                except Exception:
+                    log.exception('Exception fetching %s with plugin %s' % (source.name, plg.name))
+        finally:
+            self._host_release(host, source.name)
+        return source.name
+
+    def fetch(self, sources):
+        """Fetch sources and report progress
+
+        :param sources: The sources to fetch.
+        :type sources: list of OSIntSource
+        :returns: the names of the fetched sources
+        :rtype: list of str
+        """
+        if len(sources) == 0:
+            return []
+        verbosity = self.env.app.verbosity if self.env.app is not None else 0
+        summary = 'fetching sources... '
+        if self.workers == 1:
+            # In the main thread, plugins can still use signal based timeouts
+            try:
+                return [self.fetch_one(source) for source in status_iterator(sources,
+                    summary, 'darkgreen', len(sources), verbosity,
+                    stringify_func=lambda s: s.name)]
+            finally:
+                self._plugins_call('fetch_worker_done')
+        return [name for name in status_iterator(self._fetch_workers(sources),
+            summary, 'darkgreen', len(sources), verbosity,
+            stringify_func=lambda n: n if n is not None else 'skipped') if name is not None]
+
+    def _fetch_workers(self, sources):
+        """Fetch sources in daemon threads and yield their names when done.
+        None is yielded for the sources that timed out or were skipped : the
+        worker of a source that timed out is abandoned (a hung browser or pdfkit
+        can't be interrupted) and a new one takes its place. Being a daemon,
+        it won't block the end of the build."""
+        tasks = queue.Queue()
+        done = queue.Queue()
+        for source in sources:
+            tasks.put(source)
+        lock = threading.Lock()
+        running = {}
+        expired = set()
+
+        def worker():
+            try:
+                work()
+            finally:
+                # Close the browsers started by this thread
+                self._plugins_call('fetch_worker_done')
+
+        def work():
+            while True:
+                try:
+                    source = tasks.get_nowait()
+                except queue.Empty:
+                    return
+                with lock:
+                    running[source.name] = (time.monotonic(), source)
+                name = None
+                try:
+                    name = self.fetch_one(source)
+                except Exception:
+                    log.exception('Exception in fetch worker')
+                with lock:
+                    running.pop(source.name, None)
+                    if source.name in expired:
+                        continue
+                done.put(name)
+
+        def start():
+            threading.Thread(target=worker, name='osint-fetch', daemon=True).start()
+
+        for __ in range(min(self.workers, len(sources))):
+            start()
+        remaining = len(sources)
+        while remaining > 0:
+            try:
+                name = done.get(timeout=1)
+            except queue.Empty:
+                if not self.timeout:
+                    continue
+                limit = time.monotonic() - self.timeout
+                with lock:
+                    timedout = [source for started, source in running.values() if started < limit]
+                    for source in timedout:
+                        running.pop(source.name)
+                        expired.add(source.name)
+                for source in timedout:
+                    log.error('Timeout fetching %s after %ss : worker abandoned' % (source.name, self.timeout))
+                    # The hung worker keeps running : free its slot for the skips
+                    self._host_release(self.host(source), source.name, timedout=True)
+                    remaining -= 1
+                    start()
+                    yield None
+                continue
+            remaining -= 1
+            yield name
+
+    def process(self, quest):
+        """Drain the fetch queue of the quest"""
+        names = quest.pop_fetch()
+        sources = [quest.sources[name] for name in names if name in quest.sources]
+        try:
+            return self.fetch(sources)
+        finally:
+            self._plugins_call('fetch_done')
+
+    def _plugins_call(self, hook):
+        """Call a hook of the plugins that define it"""
+        for plg in self.plugins:
+            func = getattr(plg, hook, None)
+            if func is not None:
+                try:
+                    func(self.env)
+                except Exception:
+                    log.exception('Exception in %s of plugin %s' % (hook, plg.name))
+
+
+class OSIntHostScheduler():
+
+    def __init__(self, filename=None, delay=2, backoff=10, max_delay=120, ttl=30,
+            max_failures=3, dump_every=50):
+        """Pace requests per host and remember which fetch methods work for them
+
+        Stats are stored in a json file to be reused by next builds :
+        {host: {method: {'ok': 1, 'ko': 0, 'fails': 0, 'time': 1760000000.0}}}
+        where fails is the number of consecutive failures.
+
+        :param filename: The json file to store stats. None to keep them in memory.
+        :type filename: str or None
+        :param delay: The delay in seconds between 2 requests on a same host.
+        :type delay: int
+        :param backoff: The first delay in seconds after a failure on a host.
+            It is doubled on each failure until max_delay.
+        :type backoff: int
+        :param max_delay: The max delay in seconds between 2 requests on a same host.
+        :type max_delay: int
+        :param ttl: The number of days a failure is remembered.
+        :type ttl: int
+        :param max_failures: The number of consecutive failures before a method
+            that never worked on a host is not tried anymore.
+        :type max_failures: int
+        :param dump_every: The number of updates between 2 writes of the stats.
+            They are also written by dump() at the end of the fetch.
+        :type dump_every: int
+        """
+        self.filename = filename
+        self.delay = delay
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.ttl = ttl
+        self.max_failures = max(1, max_failures)
+        self.dump_every = dump_every
+        self._lock = threading.Lock()
+        self._dirty = 0
+        self._pace = {}
+        self._stats = self.load()
+
+    @reify_classmethod
+    def _imp_json(cls):
+        """Lazy loader for import json"""
+        import importlib
+        return importlib.import_module('json')
+
+    def load(self):
+        """Load stats from file and forget the old ones"""
+        if self.filename is None or os.path.isfile(self.filename) is False:
+            return {}
+        try:
+            with open(self.filename, 'r') as f:
+                stats = self._imp_json.load(f)
+        except Exception:
+            log.exception("Can't load hosts stats from %s" % self.filename)
+            return {}
+        limit = time.time() - self.ttl * 24 * 3600
+        for host in list(stats.keys()):
+            for method in list(stats[host].keys()):
+                if stats[host][method].get('time', 0) < limit:
+                    stats[host].pop(method)
+            if len(stats[host]) == 0:
+                stats.pop(host)
+        return stats
+
+    def dump(self):
+        """Write stats to file if they changed"""
+        if self.filename is None:
+            return
+        with self._lock:
+            if self._dirty == 0:
+                return
+            self._dirty = 0
+            tmpf = self.filename + '.tmp'
+            with open(tmpf, 'w') as f:
+                self._imp_json.dump(self._stats, f, indent=2)
+            os.replace(tmpf, self.filename)
+
+    def _is_bad(self, host, method):
+        stat = self._stats.get(host, {}).get(method)
+        return stat is not None and stat['ok'] == 0 and stat.get('fails', 0) >= self.max_failures
+
+    def order(self, host, methods):
+        """Sort methods for host : the ones that worked first, the ones that
+        never worked and failed max_failures times in a row removed
+
+        :param host: The host.
+        :type host: str
+        :param methods: The candidate methods in their default order.
+        :type methods: list of str
+        :returns: the methods to try
+        :rtype: list of str
+        """
+        stats = self._stats.get(host, {})
+        worked = [m for m in methods if stats.get(m, {}).get('ok', 0) > 0]
+        worked = sorted(worked, key=lambda m: stats[m]['ok'] / (stats[m]['ok'] + stats[m]['ko']), reverse=True)
+        others = [m for m in methods if m not in worked and self._is_bad(host, m) is False]
+        ret = worked + others
+        if len(ret) == 0 and len(methods) > 0:
+            # Last chance
+            ret = methods[-1:]
+        return ret
+
+    def wait(self, host):
+        """Sleep until a request on host is allowed"""
+        with self._lock:
+            now = time.monotonic()
+            pace = self._pace.setdefault(host, {'next': now, 'delay': 0})
+            start = max(now, pace['next'])
+            pace['next'] = start + pace['delay']
+        if start > now:
+            time.sleep(start - now)
+
+    def _update(self, host, method, ok):
+        with self._lock:
+            now = time.monotonic()
+            pace = self._pace.setdefault(host, {'next': now, 'delay': 0})
+            if ok is True:
+                pace['delay'] = self.delay
+            else:
+                pace['delay'] = min(max(pace['delay'] * 2, self.backoff), self.max_delay)
+            pace['next'] = max(pace['next'], now + pace['delay'])
+            stat = self._stats.setdefault(host, {}).setdefault(method, {'ok': 0, 'ko': 0})
+            stat['ok' if ok is True else 'ko'] += 1
+            stat['fails'] = 0 if ok is True else stat.get('fails', 0) + 1
+            stat['time'] = time.time()
+            self._dirty += 1
+            dump = self.dump_every > 0 and self._dirty >= self.dump_every
+        if dump is True:
+            self.dump()
+
+    def success(self, host, method):
+        """Record a successful fetch on host with method"""
+        self._update(host, method, True)
+
+    def failure(self, host, method):
+        """Record a failed fetch on host with method and backoff"""
+        self._update(host, method, False)
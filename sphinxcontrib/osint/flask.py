@@ -622,7 +622,7 @@ def flask_app_config(app):
     app.connect('builder-inited', add_quest_html)
 
 def create_flask_app():
-    from .scripts import parser_makefile, cli, get_app, load_quest, inject_quest_into_sphinx
+    from .scripts import parser_makefile, cli, get_app, load_quest_view, inject_quest_into_sphinx
 
     docdir = os.environ.get('OSINT_HOME', '/var/lib/osint')
     sourcedir, builddir = parser_makefile(docdir)
@@ -631,7 +631,8 @@ def create_flask_app():
 
     sphinx_app = get_app(sourcedir=sourcedir, builddir=builddir)
 
-    data = load_quest(os.path.realpath(builddir))
+    data = load_quest_view(os.path.realpath(builddir),
+        cache_size=sphinx_app.config.osint_flask_quest_cache)
     inject_quest_into_sphinx(sphinx_app, data)
 
     app.secret_key = sphinx_app.config.secret_key
@@ -10,7 +10,9 @@ __author__ = 'bibi21000 aka Sébastien GALLET'
 __email__ = 'bibi21000@gmail.com'
 
 import os
+import threading
 from . import reify_classmethod
+from .osintlib import time_left
 from sphinx.util import logging
 
 logger = logging.getLogger(__name__)
@@ -85,7 +87,6 @@ class NltkInterface():
 
 
 class SeleniumInterface():
-    _selenium_driver = None
 
     @reify_classmethod
     def _imp_selenium(cls):
@@ -161,53 +162,60 @@ class SeleniumInterface():
 
     @classmethod
     def selenium_fetch_url(cls, env, url):
-        """Fetch url using selenium"""
-        if cls._selenium_driver is None:
-            if env.config.osint_text_selenium == 'chrome':
-                selfopt = {
-                    'service': cls._imp_selenium_webdriver.chrome.service.Service(cls._imp_webdriver_manager_chrome.ChromeDriverManager().install())
-                }
-                if env.config.osint_http_proxy is not None:
-                    selfopt['options'] = cls._imp_selenium_webdriver.ChromeOptions()
-                    selfopt['options'].proxy = cls.get_proxy(env)
-
-                cls._selenium_driver = cls._imp_selenium_webdriver.Chrome(**selfopt)
-
-            elif env.config.osint_text_selenium == 'firefox':
-                selfopt = {
-                    'service': cls._imp_selenium_webdriver.firefox.service.Service(cls._imp_webdriver_manager_firefox.GeckoDriverManager().install())
-                }
-                if env.config.osint_http_proxy is not None:
-                    selfopt['options'] = cls._imp_selenium_webdriver.FirefoxOptions()
-                    selfopt['options'].proxy = cls.get_proxy(env)
-
-                cls._selenium_driver = cls._imp_selenium_webdriver.Firefox(**selfopt)
-
-            elif env.config.osint_text_selenium == 'opera':
-                webdriver_service = cls._imp_selenium_webdriver_chrome.service.Service(cls._imp_webdriver_manager_opera.OperaDriverManager().install())
-                webdriver_service.start()
-
-                options = cls._imp_selenium_webdriver.ChromeOptions()
-                options.add_experimental_option('w3c', True)
-                if env.config.osint_http_proxy is not None:
-                    options.proxy = cls.get_proxy(env)
-
-                cls._selenium_driver = cls._imp_selenium_webdriver.Remote(webdriver_service.service_url, options=options)
-
-        if cls._selenium_driver is None:
+        """Fetch url using selenium.
+        A new driver is started for each url, so fetch workers never share it :
+        the caller must quit it."""
+        driver = None
+        if env.config.osint_text_selenium == 'chrome':
+            selfopt = {
+                'service': cls._imp_selenium_webdriver.chrome.service.Service(cls._imp_webdriver_manager_chrome.ChromeDriverManager().install())
+            }
+            if env.config.osint_http_proxy is not None:
+                selfopt['options'] = cls._imp_selenium_webdriver.ChromeOptions()
+                selfopt['options'].proxy = cls.get_proxy(env)
+
+            driver = cls._imp_selenium_webdriver.Chrome(**selfopt)
+
+        elif env.config.osint_text_selenium == 'firefox':
+            selfopt = {
+                'service': cls._imp_selenium_webdriver.firefox.service.Service(cls._imp_webdriver_manager_firefox.GeckoDriverManager().install())
+            }
+            if env.config.osint_http_proxy is not None:
+                selfopt['options'] = cls._imp_selenium_webdriver.FirefoxOptions()
+                selfopt['options'].proxy = cls.get_proxy(env)
+
+            driver = cls._imp_selenium_webdriver.Firefox(**selfopt)
+
+        elif env.config.osint_text_selenium == 'opera':
+            webdriver_service = cls._imp_selenium_webdriver_chrome.service.Service(cls._imp_webdriver_manager_opera.OperaDriverManager().install())
+            webdriver_service.start()
+
+            options = cls._imp_selenium_webdriver.ChromeOptions()
+            options.add_experimental_option('w3c', True)
+            if env.config.osint_http_proxy is not None:
+                options.proxy = cls.get_proxy(env)
+
+            driver = cls._imp_selenium_webdriver.Remote(webdriver_service.service_url, options=options)
+
+        if driver is None:
             raise RuntimeError("Can't use selenium")
-        cls._selenium_driver.delete_all_cookies()
-        # ~ cls._selenium_driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-        cls._selenium_driver.get(url)
-        ret = cls._selenium_driver
-        # ~ cls._selenium_driver.quit()
-        cls._selenium_driver = None
-        return ret
+        try:
+            timeout = time_left()
+            if timeout is not None:
+                # The deadline of time_limit in a fetch worker
+                driver.set_page_load_timeout(timeout)
+            driver.delete_all_cookies()
+            # ~ driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+            driver.get(url)
+        except Exception:
+            driver.quit()
+            raise
+        return driver
 
 
 class PlaywrightInterface():
-    _playwright_api = None
-    _playwright_browser = None
+    #: The sync api only works in the thread that started it : one browser by thread
+    _playwright_local = threading.local()
 
     @reify_classmethod
     def _imp_playwright_sync_api(cls):
@@ -218,10 +226,33 @@ class PlaywrightInterface():
     @classmethod
     def playwright_fetch_url(cls, env, url):
         """Fetch url using playwright"""
-        if cls._playwright_api is None:
-            cls._playwright_api = cls._imp_playwright_sync_api.sync_playwright().start()
+        local = cls._playwright_local
+        if getattr(local, 'browser', None) is None:
+            local.api = cls._imp_playwright_sync_api.sync_playwright().start()
             # osint_text_playwright can be "chrome", "msedge", "chrome-beta", "msedge-beta" or "msedge-dev".
-            cls._playwright_browser = cls._playwright_api.chromium.launch(channel=env.config.osint_text_playwright)
-        page = cls._playwright_browser.new_page()
-        page.goto(url)
+            local.browser = local.api.chromium.launch(channel=env.config.osint_text_playwright)
+        page = local.browser.new_page()
+        try:
+            timeout = time_left()
+            if timeout is None:
+                page.goto(url)
+            else:
+                # The deadline of time_limit in a fetch worker, in ms
+                page.goto(url, timeout=timeout * 1000)
+        except Exception:
+            page.close()
+            raise
         return page
+
+    @classmethod
+    def playwright_close(cls):
+        """Close the browser and stop playwright started by this thread"""
+        local = cls._playwright_local
+        browser, api = getattr(local, 'browser', None), getattr(local, 'api', None)
+        local.browser = local.api = None
+        try:
+            if browser is not None:
+                browser.close()
+        finally:
+            if api is not None:
+                api.stop()
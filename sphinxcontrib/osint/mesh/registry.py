@@ -15,11 +15,13 @@ Trois responsabilités :
   3. aller chercher, en HTTP, les infos/mots-clés/pairs de chaque pair
      connu -- et apprendre au passage l'existence de nouveaux pairs via
      ce que chaque pair rapporte de son propre carnet d'adresses (un léger
-     auto-complètement, pas un vrai gossip).
+     auto-complètement, pas un vrai gossip). Un seul GET conditionnel
+     (/mesh/v1/sync + If-None-Match) par pair, tous les pairs en parallèle.
 """
 from __future__ import annotations
 
 import concurrent.futures
+import hashlib
 import json
 import logging
 import threading
@@ -52,7 +54,7 @@ class PeerRegistry:
                  timeout=5, keywords_ttl=3600, session=None,
                  translate_keywords=True, translate_fn=None,
                  translation_memory=None, entities_limit=500,
-                 local_search_fn=None):
+                 local_search_fn=None, sync_workers=8):
         if not self_id:
             raise ValueError('osint_mesh_peer_id doit être configuré pour activer le mesh')
 
@@ -85,10 +87,13 @@ class PeerRegistry:
         #: ça permet de tester tout le fan-out mesh_search()/aggregation
         #: sans base Xapian réelle.
         self.local_search_fn = local_search_fn
+        #: taille max du pool de threads de sync_all -- borne le nombre de
+        #: connexions ouvertes en même temps quel que soit le nombre de pairs.
+        self.sync_workers = sync_workers
 
         self._lock = threading.Lock()
         #: peer_id -> {'url', 'lang', 'keywords': set(), 'keywords_at',
-        #:              'entities': set(), 'entities_at', 'source'}
+        #:              'entities': set(), 'entities_at', 'source', 'etag'}
         self._peers = {}
         #: (keywords_list, generated_at) | None -- vocabulaire traduit
         self._local_keywords_cache = None
@@ -133,6 +138,9 @@ class PeerRegistry:
         with self._lock:
             existing = self._peers.get(peer_id)
             if existing is not None:
+                if existing['url'] != url:
+                    # autre serveur : son ETag ne vaut plus rien
+                    existing['etag'] = None
                 existing['url'] = url
                 if lang is not None:
                     existing['lang'] = lang
@@ -140,6 +148,7 @@ class PeerRegistry:
             self._peers[peer_id] = {
                 'url': url, 'lang': lang, 'keywords': set(), 'keywords_at': None,
                 'entities': set(), 'entities_at': None, 'source': source,
+                'etag': None,
             }
 
     def known_peers(self):
@@ -298,6 +307,40 @@ class PeerRegistry:
         with self._lock:
             self._local_entities_cache = (list(entities), generated_at or time.time())
 
+    # -- ce que CE serveur sert à ses pairs ---------------------------------
+
+    def keywords_payload(self):
+        """Payload de /mesh/v1/keywords : mots-clés + entités publiés."""
+        kws, generated_at = self.local_keywords()
+        entities, entities_generated_at = self.local_entities()
+        return {
+            'peer_id': self.self_id,
+            'keywords': kws,
+            'generated_at': generated_at,
+            'entities': entities,
+            'entities_generated_at': entities_generated_at,
+        }
+
+    def sync_payload(self):
+        """Payload de /mesh/v1/sync : /info, /keywords et /peers en une
+        seule réponse -- un aller-retour par pair au lieu de trois.
+        """
+        payload = self.keywords_payload()
+        payload['info'] = {'id': self.self_id, 'url': self.self_url, 'lang': self.lang}
+        payload['peers'] = self.known_peers_public()
+        return payload
+
+    @staticmethod
+    def payload_etag(payload):
+        """ETag d'un payload : empreinte de son contenu, horodatages
+        exclus -- une ré-extraction (fin de `keywords_ttl`) qui redonne
+        les mêmes mots-clés ne doit pas faire retélécharger le tout par
+        chaque pair : il reçoit un 304 et garde ce qu'il a.
+        """
+        content = {k: v for k, v in payload.items() if k not in ('generated_at', 'entities_generated_at')}
+        blob = json.dumps(content, sort_keys=True, ensure_ascii=False).encode('utf-8')
+        return hashlib.sha256(blob).hexdigest()
+
     # -- synchronisation avec les pairs -----------------------------------
 
     def _headers(self):
@@ -307,8 +350,14 @@ class PeerRegistry:
         return headers
 
     def sync_peer(self, peer_id):
-        """Va chercher /info, /keywords et /peers chez un pair connu et
-        met à jour notre vue locale de ce pair.
+        """Va chercher /sync (infos + mots-clés + pairs) chez un pair connu
+        et met à jour notre vue locale de ce pair.
+
+        La requête est conditionnelle (If-None-Match avec l'ETag de la
+        dernière synchro réussie) : un pair dont rien n'a changé répond
+        304 sans corps, et on garde ce qu'on avait. Un pair d'une version
+        précédente, sans /sync (404), est synchronisé à l'ancienne via
+        /info, /keywords et /peers.
 
         Ne lève jamais d'exception réseau : un pair injoignable est loggé
         et compté en échec, mais ne doit pas interrompre la synchro des
@@ -316,10 +365,33 @@ class PeerRegistry:
         """
         with self._lock:
             peer = self._peers.get(peer_id)
+            etag = peer.get('etag') if peer is not None else None
         if peer is None:
             logger.warning('sync_peer appelé pour un pair inconnu: %s', peer_id)
             return False
 
+        base = peer['url']
+        headers = self._headers()
+        if etag:
+            headers['If-None-Match'] = etag
+        try:
+            resp = self.session.get(f'{base}/mesh/v1/sync', headers=headers, timeout=self.timeout)
+            if resp.status_code == 404:
+                return self._sync_peer_legacy(peer_id, peer)
+            if resp.status_code == 304:
+                return True
+            resp.raise_for_status()
+            payload = resp.json()
+        except (requests.RequestException, ValueError) as exc:
+            logger.warning('Synchro mesh avec %s (%s) en échec: %s', peer_id, base, exc)
+            return False
+
+        self._update_peer(peer, payload.get('info', {}), payload, payload.get('peers', []),
+                          etag=resp.headers.get('ETag'))
+        return True
+
+    def _sync_peer_legacy(self, peer_id, peer):
+        """Synchro avec un pair sans /sync : trois GET, sans ETag."""
         base = peer['url']
         try:
             r_info = self.session.get(f'{base}/mesh/v1/info', headers=self._headers(), timeout=self.timeout)
@@ -337,6 +409,10 @@ class PeerRegistry:
             logger.warning('Synchro mesh avec %s (%s) en échec: %s', peer_id, base, exc)
             return False
 
+        self._update_peer(peer, info, kws, others.get('peers', []))
+        return True
+
+    def _update_peer(self, peer, info, kws, others, etag=None):
         with self._lock:
             peer['lang'] = info.get('lang', peer['lang'])
             peer['keywords'] = set(kws.get('keywords', []))
@@ -347,25 +423,47 @@ class PeerRegistry:
             # côté pair pour un matching insensible à la casse plus tard.
             peer['entities'] = {e.lower() for e in kws.get('entities', [])}
             peer['entities_at'] = kws.get('entities_generated_at')
+            peer['etag'] = etag
 
-        for entry in others.get('peers', []):
+        for entry in others:
             entry_id = entry.get('id')
-            if entry_id and entry_id != self.self_id:
+            # un pair sans self_url configuré s'annonce avec une URL vide :
+            # elle ne doit pas écraser celle qu'on utilise pour le joindre
+            if entry_id and entry_id != self.self_id and entry.get('url'):
                 self.add_peer(entry_id, entry.get('url'), entry.get('lang'), source='peer')
 
-        return True
+    def sync_all(self, max_workers=None):
+        """Synchronise tous les pairs connus EN PARALLÈLE, dans un pool de
+        `sync_workers` threads au plus (ou `max_workers`) : la durée d'une
+        synchro est bornée par les pairs les plus lents, pas par la somme
+        des timeouts de tous les pairs injoignables.
 
-    def sync_all(self):
-        """Synchronise tous les pairs connus, un par un.
+        Les pairs découverts pendant cette synchro (peers-of-peers) sont
+        ajoutés au carnet mais ne seront synchronisés qu'au prochain appel.
 
         Returns:
             {peer_id: True|False} -- pour que l'appelant (une commande CLI
             ou une tâche planifiée) puisse voir/logger ce qui a échoué.
         """
+        peer_ids = list(self.known_peers().keys())
+        if not peer_ids:
+            return {}
+
         results = {}
-        for peer_id in list(self.known_peers().keys()):
-            results[peer_id] = self.sync_peer(peer_id)
-        return results
+        pool_size = max_workers or min(self.sync_workers, len(peer_ids))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=pool_size) as executor:
+            future_to_peer = {executor.submit(self.sync_peer, peer_id): peer_id for peer_id in peer_ids}
+            for future in concurrent.futures.as_completed(future_to_peer):
+                peer_id = future_to_peer[future]
+                try:
+                    results[peer_id] = future.result()
+                except Exception:
+                    # sync_peer n'est pas censée lever, même filet de
+                    # sécurité que dans mesh_search
+                    logger.exception('Synchro mesh avec %s a levé une exception inattendue', peer_id)
+                    results[peer_id] = False
+        # dans l'ordre du carnet plutôt que dans l'ordre d'arrivée
+        return {peer_id: results[peer_id] for peer_id in peer_ids}
 
     # -- recherche locale ---------------------------------------------------
 
@@ -57,6 +57,7 @@ def _build_registry(cfg):
         timeout=cfg.osint_mesh_sync_timeout,
         translate_keywords=getattr(cfg, 'osint_mesh_keywords_translate', True),
         translation_memory=TranslationMemory(getattr(cfg, 'osint_mesh_translation_memory', '') or None),
+        sync_workers=getattr(cfg, 'osint_mesh_sync_workers', 8),
     )
     if cfg.osint_mesh_bootstrap:
         registry.load_bootstrap(cfg.osint_mesh_bootstrap)
@@ -175,6 +176,15 @@ def info():
     return jsonify(id=registry.self_id, url=registry.self_url, lang=registry.lang)
 
 
+def _conditional_json(payload):
+    """Réponse JSON avec un ETag (cf. PeerRegistry.payload_etag) : un pair
+    qui renvoie le même ETag dans If-None-Match reçoit un 304 sans corps.
+    """
+    resp = jsonify(payload)
+    resp.set_etag(PeerRegistry.payload_etag(payload))
+    return resp.make_conditional(request)
+
+
 @mesh_bp.route('/keywords')
 @_require_mesh_token
 def keywords():
@@ -183,15 +193,17 @@ def keywords():
     d'entités -- titres/altlabels, volontairement non traduits).
     """
     registry = _get_mesh_state()['registry']
-    kws, generated_at = registry.local_keywords()
-    entities, entities_generated_at = registry.local_entities()
-    return jsonify(
-        peer_id=registry.self_id,
-        keywords=kws,
-        generated_at=generated_at,
-        entities=entities,
-        entities_generated_at=entities_generated_at,
-    )
+    return _conditional_json(registry.keywords_payload())
+
+
+@mesh_bp.route('/sync')
+@_require_mesh_token
+def sync():
+    """/info + /keywords + /peers en une seule réponse conditionnelle --
+    ce qu'appelle PeerRegistry.sync_peer, un aller-retour par pair.
+    """
+    registry = _get_mesh_state()['registry']
+    return _conditional_json(registry.sync_payload())
 
 
 @mesh_bp.route('/peers')
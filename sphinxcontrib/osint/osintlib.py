@@ -13,17 +13,22 @@ __email__ = 'bibi21000@gmail.com'
 
 # Python
 import os
+import time
 from datetime import date
 import signal
 from contextlib import contextmanager
 from collections import defaultdict
 import itertools
 import copy
+import threading
+import uuid
+import hashlib
 
 from sphinx.domains import Index as _Index
 from sphinx.util import logging
 from docutils.parsers.rst.directives.admonitions import BaseAdmonition as _BaseAdmonition
 from docutils.statemachine import ViewList
+from docutils import nodes as _nodes
 
 log = logging.getLogger(__name__)
 
@@ -253,6 +258,38 @@ class TimeoutException(Exception):
     pass
 
 
+_deadlines = threading.local()
+
+@contextmanager
+def deadline(seconds):
+    """Set the deadline of the calls of the block in this thread.
+    The calls supporting a timeout (http, browsers, wkhtmltopdf) get it from time_left.
+
+    :param seconds: Number of seconds before timeout.
+    :type seconds: int
+    """
+    previous = getattr(_deadlines, 'deadline', None)
+    ret = time.monotonic() + seconds
+    _deadlines.deadline = ret if previous is None else min(previous, ret)
+    try:
+        yield
+    finally:
+        _deadlines.deadline = previous
+
+def time_left(default=None):
+    """Get the number of seconds left before the deadline of this thread
+
+    :param default: The value returned when no deadline is set.
+    :type default: int or None
+    :returns: the number of seconds (at least 1) or default
+    :rtype: float
+    """
+    ret = getattr(_deadlines, 'deadline', None)
+    if ret is None:
+        return default
+    return max(1, ret - time.monotonic())
+
+
 class OSIntBase():
 
     date_begin_min = date(1800,1,1)
@@ -367,9 +404,37 @@ class OSIntBase():
                 end = date.fromisoformat(end)
         return begin, end
 
+    @classmethod
+    def query_key(cls, *args):
+        """Normalize arguments of a query to use them as a cache key"""
+        return tuple(tuple(arg) if isinstance(arg, (list, tuple, set)) else arg for arg in args)
+
     def data_complete(self, data_countries, data_cities, data_orgs, data_idents, data_relations,
         data_events, data_links, data_quotes, data_sources,
         cats, orgs, begin, end, countries, idents, borders=True
+    ):
+        """Add missing links, relations ans quotes. Results are cached in the quest.
+
+        :param cats: cats to filter on.
+        :type cats: None or list
+        :param orgs: orgs to filter on.
+        :type orgs: None or list
+        :param years: years to filter on.
+        :type years: None or list
+        :param countries: countries to filter on.
+        :type countries: None or list
+        """
+        key = ('data_complete',) + self.query_key(data_countries, data_cities, data_orgs,
+            data_idents, data_relations, data_events, data_links, data_quotes, data_sources,
+            cats, orgs, begin, end, countries, idents, borders)
+        return self.quest.query_cached(key, lambda: self._data_complete(
+            list(data_countries), list(data_cities), list(data_orgs), list(data_idents),
+            list(data_relations), list(data_events), list(data_links), list(data_quotes),
+            list(data_sources), cats, orgs, begin, end, countries, idents, borders=borders))
+
+    def _data_complete(self, data_countries, data_cities, data_orgs, data_idents, data_relations,
+        data_events, data_links, data_quotes, data_sources,
+        cats, orgs, begin, end, countries, idents, borders=True
     ):
         """Add missing links, relations ans quotes
 
@@ -422,23 +487,25 @@ class OSIntBase():
                             more_data_idents.append(self.quest.relations[rel].rfrom)
 
         # ~ print(data_orgs, data_idents, data_relations, data_events, data_links, data_quotes, data_sources)
+        seen_idents = set(data_idents)
+        seen_events = set(data_events)
+
+        def _complete(data, seen, name):
+            if name not in seen:
+                seen.add(name)
+                data.append(name)
+
         for rel in data_relations:
-            if self.quest.relations[rel].rfrom not in data_idents:
-                data_idents.append(self.quest.relations[rel].rfrom)
-            if self.quest.relations[rel].rto not in data_idents:
-                data_idents.append(self.quest.relations[rel].rto)
+            _complete(data_idents, seen_idents, self.quest.relations[rel].rfrom)
+            _complete(data_idents, seen_idents, self.quest.relations[rel].rto)
         # ~ print(data_orgs, data_idents, data_relations, data_events, data_links, data_quotes, data_sources)
         for link in data_links:
-            if self.quest.links[link].lfrom not in data_idents:
-                data_idents.append(self.quest.links[link].lfrom)
-            if self.quest.links[link].lto not in data_events:
-                data_events.append(self.quest.links[link].lto)
+            _complete(data_idents, seen_idents, self.quest.links[link].lfrom)
+            _complete(data_events, seen_events, self.quest.links[link].lto)
         # ~ print(data_orgs, data_idents, data_relations, data_events, data_links, data_quotes, data_sources)
         for quote in data_quotes:
-            if self.quest.quotes[quote].qfrom not in data_events:
-                data_events.append(self.quest.quotes[quote].qfrom)
-            if self.quest.quotes[quote].qto not in data_events:
-                data_events.append(self.quest.quotes[quote].qto)
+            _complete(data_events, seen_events, self.quest.quotes[quote].qfrom)
+            _complete(data_events, seen_events, self.quest.quotes[quote].qto)
         # ~ print(data_orgs, data_idents, data_relations, data_events, data_links, data_quotes, data_sources)
 
         return data_countries, data_cities, data_orgs, data_idents + more_data_idents, data_relations + more_data_relations,\
@@ -461,10 +528,11 @@ class OSIntBase():
         """
         orgs = [self.quest.idents[ident].orgs[0] for ident in data_idents if self.quest.idents[ident].orgs != []]
         orgs += [self.quest.events[event].orgs[0] for event in data_events if self.quest.events[event].orgs != []]
+        sorgs = set(orgs)
         lonely_idents = [ident for ident in data_idents if self.quest.idents[ident].orgs == [] or \
-            self.quest.idents[ident].orgs[0] not in orgs]
+            self.quest.idents[ident].orgs[0] not in sorgs]
         lonely_events = [event for event in data_events if self.quest.events[event].orgs == [] or \
-            self.quest.events[event].orgs[0] not in orgs]
+            self.quest.events[event].orgs[0] not in sorgs]
         log.debug('all_idents %s', data_idents)
         all_orgs = list(set(data_orgs + orgs))
         # ~ print(orgs)
@@ -484,6 +552,22 @@ class OSIntBase():
         return data_countries, data_cities, all_orgs, all_idents, lonely_idents, all_relations, all_events, lonely_events, all_links, all_quotes, all_sources
 
     def data_filter(self, cats, orgs, begin, end, countries, idents, borders=True, exclude_cats=None):
+        """Filter data to report. Results are cached in the quest.
+
+        :param cats: cats to filter on.
+        :type cats: None or list
+        :param orgs: orgs to filter on.
+        :type orgs: None or list
+        :param years: years to filter on.
+        :type years: None or list
+        :param countries: countries to filter on.
+        :type countries: None or list
+        """
+        key = ('data_filter',) + self.query_key(cats, orgs, begin, end, countries, idents, borders, exclude_cats)
+        return self.quest.query_cached(key, lambda: self._data_filter(cats, orgs, begin, end,
+            countries, idents, borders=borders, exclude_cats=exclude_cats))
+
+    def _data_filter(self, cats, orgs, begin, end, countries, idents, borders=True, exclude_cats=None):
         """Filter data to report
         Need to be improved
 
@@ -520,7 +604,7 @@ class OSIntBase():
         events, quotes_events = self.quest.get_events_quotes(events, cats=cats, orgs=orgs, begin=begin, end=end, countries=countries, borders=borders, exclude_cats=exclude_cats)
         log.debug('quotes_events %s' % quotes_events)
 
-        all_idents = list(set(rel_idents + link_idents))
+        all_idents = list(dict.fromkeys(rel_idents + link_idents))
 
         filtered_sources = self.quest.get_sources(cats=cats, orgs=orgs, countries=countries, borders=borders,
             filtered_orgs=filtered_orgs, filtered_idents=all_idents, filtered_relations=relations,
@@ -535,14 +619,21 @@ class OSIntBase():
         :param seconds: Number of seconds before timeout.
         :type seconds: int
         """
-        def signal_handler(signum, frame):
-            raise TimeoutException("Timed out!")
-        signal.signal(signal.SIGALRM, signal_handler)
-        signal.alarm(seconds)
-        try:
-            yield
-        finally:
-            signal.alarm(0)
+        with deadline(seconds):
+            if threading.current_thread() is not threading.main_thread():
+                # Signals only work in main thread : the calls get the deadline
+                # from time_left and OSIntFetcher abandons the workers
+                # that exceed osint_fetch_timeout
+                yield
+                return
+            def signal_handler(signum, frame):
+                raise TimeoutException("Timed out!")
+            signal.signal(signal.SIGALRM, signal_handler)
+            signal.alarm(seconds)
+            try:
+                yield
+            finally:
+                signal.alarm(0)
 
     @classmethod
     def get_config(cls, key, value=None):
@@ -561,6 +652,21 @@ class OSIntBase():
 
 class OSIntQuest(OSIntBase):
 
+    # The kinds of items indexed by cats and countries
+    _index_kinds = ('countries', 'cities', 'orgs', 'idents', 'relations', 'events', 'links', 'quotes')
+    # Cats and country of these kinds can be inherited from other kinds
+    _index_depends = {
+        'idents': ('orgs',),
+        'relations': ('orgs', 'idents'),
+        'links': ('orgs', 'idents', 'events'),
+        'quotes': ('events',),
+    }
+    # The kinds of items linked to sources in reference indexes
+    _index_source_kinds = ('orgs', 'idents', 'relations', 'events', 'links')
+    _index_ref_names = ('org_idents', 'org_events', 'ident_relations',
+        'ident_links', 'event_links', 'event_quotes') + \
+        tuple(f'source_{kind}' for kind in _index_source_kinds)
+
     def __init__(self, default_cats=None,
         default_org_cats=None, default_ident_cats=None, default_event_cats=None,
         default_source_cats=None, default_relation_cats=None, default_link_cats=None,
@@ -632,6 +738,21 @@ class OSIntQuest(OSIntBase):
         # ~ self._csv_store = csv_store
         self._csv_store = csv_store
         self._source_download = source_download
+        self._fetch_queue = {}
+        self._index_reset()
+        self._generation = 0
+        self._query_cache = {}
+        self._query_generation = None
+        # Used by the quest store to write only the changed documents
+        self._store_id = uuid.uuid4().hex
+        self._store_serial = 0
+        self._store_dirty = set()
+        # The names of items added, modified or removed since the documents are read
+        self._changed = set()
+        # name -> fingerprint of the items removed since the documents are read
+        self._removed = {}
+        # The documents merged from parallel builds since the documents are read
+        self._merged_docnames = set()
 
     def get_data_dicts(self):
         """
@@ -755,6 +876,32 @@ class OSIntQuest(OSIntBase):
                 self._default_country = self.sphinx_env.config.osint_country
         return self._default_country
 
+    @property
+    def fetch_deferred(self):
+        """Sources are queued and fetched after reading docs
+        """
+        if self.sphinx_env is None:
+            return True
+        return self.sphinx_env.config.osint_fetch_deferred
+
+    def add_fetch(self, name):
+        """Queue a source to be fetched by the fetch stage
+
+        :param name: The name of the source.
+        :type name: str
+        """
+        self._fetch_queue[name] = None
+
+    def pop_fetch(self):
+        """Empty the fetch queue
+
+        :returns: the names of the queued sources
+        :rtype: list of str
+        """
+        names = list(self._fetch_queue.keys())
+        self._fetch_queue = {}
+        return names
+
     @property
     def csv_store(self):
         """
@@ -777,44 +924,315 @@ class OSIntQuest(OSIntBase):
                 os.makedirs(self._local_store, exist_ok=True)
         return self._local_store
 
+    def _index_kind(self, obj):
+        """Get the kind of the items of obj. None if it is not indexed"""
+        for kind in self._index_kinds:
+            if getattr(self, kind) is obj:
+                return kind
+        return None
+
+    @classmethod
+    def _index_item(cls, index, name, item, remove=False):
+        """Add (or remove) item to a cats and countries index"""
+        try:
+            cats = item.cats
+            country = item.country
+        except Exception:
+            # Item linked to a missing one : it can't be filtered
+            log.debug("Can't index %s", name, exc_info=True)
+            return
+        keys = [(index['cats'], cat) for cat in cats] + [(index['countries'], country)]
+        if cats == []:
+            keys.append((index, 'nocats'))
+        for data, key in keys:
+            if remove is True:
+                if key in data:
+                    data[key].discard(name)
+            else:
+                data.setdefault(key, set()).add(name)
+
+    @classmethod
+    def _index_build(cls, obj):
+        """Build the cats and countries index of items in obj"""
+        index = {'cats': {}, 'countries': {}, 'nocats': set()}
+        for name, item in obj.items():
+            cls._index_item(index, name, item)
+        return index
+
+    def _attr_index(self, obj):
+        """Get the cats and countries index of items in obj. Build it if needed"""
+        kind = self._index_kind(obj)
+        if kind is None:
+            return self._index_build(obj)
+        if kind not in self._index:
+            self._index[kind] = self._index_build(obj)
+        return self._index[kind]
+
+    @classmethod
+    def _index_refs_of(cls, kind, item):
+        """Get the (ref, key) couples pointing to item"""
+        ret = []
+        if kind in cls._index_source_kinds:
+            ret += [(f'source_{kind}', src) for src in item.sources]
+        if kind in ('idents', 'events'):
+            ret += [(f'org_{kind}', org) for org in (item.orgs or [None])]
+        elif kind == 'relations':
+            ret += [('ident_relations', item.rfrom), ('ident_relations', item.rto)]
+        elif kind == 'links':
+            ret += [('ident_links', item.lfrom), ('event_links', item.lto)]
+        elif kind == 'quotes':
+            ret += [('event_quotes', item.qfrom), ('event_quotes', item.qto)]
+        return ret
+
+    def _index_update(self, kind, item, remove=False):
+        """Update indexes when item is added or removed"""
+        if kind in self._index:
+            if kind in self._index_depends:
+                self._index.pop(kind)
+            else:
+                self._index_item(self._index[kind], item.name, item, remove=remove)
+        for dep, depends in self._index_depends.items():
+            if kind in depends:
+                self._index.pop(dep, None)
+        for ref, key in self._index_refs_of(kind, item):
+            refs = self._index_refs[ref]
+            if remove is True:
+                if key in refs:
+                    refs[key].discard(item.name)
+                    if len(refs[key]) == 0:
+                        del refs[key]
+            else:
+                refs.setdefault(key, set()).add(item.name)
+
+    def _index_reset(self):
+        """Empty indexes. Items must be added again with _index_set"""
+        self._index = {}
+        self._index_refs = {ref: {} for ref in self._index_ref_names}
+        self._index_pos = {kind: {} for kind in self._index_kinds}
+        self._index_count = 0
+        # docname -> {(kind, name): None} of all the collections
+        self._index_docs = {}
+
+    def _index_doc(self, kind, item, remove=False):
+        """Update the index of items by docname"""
+        docname = getattr(item, 'docname', None)
+        if remove is True:
+            names = self._index_docs.get(docname)
+            if names is not None:
+                names.pop((kind, item.name), None)
+                if len(names) == 0:
+                    del self._index_docs[docname]
+        else:
+            self._index_docs.setdefault(docname, {})[(kind, item.name)] = None
+
+    def _index_set(self, kind, item, warn=True):
+        """Store item in the quest and update indexes.
+        An item replacing the one of another document is reported.
+
+        :param kind: The kind of the item (ie 'idents').
+        :type kind: str
+        :param item: The item.
+        :type item: OSIntItem
+        :param warn: Log the duplicate.
+        :type warn: bool
+        :returns: the docname of the replaced item if it is another document
+        :rtype: str or None
+        """
+        data = getattr(self, kind)
+        self._generation += 1
+        conflict = None
+        if item.name in data:
+            docname = getattr(item, 'docname', None)
+            current = getattr(data[item.name], 'docname', None)
+            if docname is not None and current is not None and current != docname:
+                conflict = current
+                if warn is True:
+                    log.warning('Duplicate %s %s in %s and %s' % (kind, item.name, docname, current))
+        if getattr(item, '_fingerprint', None) is None:
+            # Computed when the item is added, before its lazy attributes are filled
+            item._fingerprint = self._index_fingerprint(item)
+        if item.name in data:
+            previous = getattr(data[item.name], '_fingerprint', None)
+        else:
+            previous = self._removed.pop(item.name, None)
+        if previous is None or previous != item._fingerprint:
+            self._changed.add(item.name)
+        if item.name in data:
+            self._index_doc(kind, data[item.name], remove=True)
+        self._index_doc(kind, item)
+        if kind not in self._index_kinds:
+            data[item.name] = item
+            return conflict
+        if item.name in data:
+            self._index_update(kind, data[item.name], remove=True)
+        else:
+            # Keep the order of the dict
+            self._index_pos[kind][item.name] = self._index_count
+            self._index_count += 1
+        data[item.name] = item
+        self._index_update(kind, item)
+        return conflict
+
+    def _index_pop(self, kind, name):
+        """Remove item from the quest and update indexes"""
+        item = getattr(self, kind).pop(name)
+        self._generation += 1
+        if name not in self._changed:
+            # Changed only if it is not added again with the same content
+            self._removed.setdefault(name, getattr(item, '_fingerprint', None))
+        self._index_doc(kind, item, remove=True)
+        if kind in self._index_kinds:
+            self._index_pos[kind].pop(name, None)
+            self._index_update(kind, item, remove=True)
+        return item
+
+    #: The attributes of the items not in their fingerprint : where they are
+    #: defined and the data computed later
+    _index_fingerprint_skip = frozenset(('quest', 'docname', 'lineno', 'line',
+        '_depends', '_fingerprint'))
+
+    def _index_fingerprint(self, item):
+        """Get a hash of the options and content of an item.
+        Where the item is defined (document, lines) is not part of it.
+        """
+        digest = hashlib.sha256()
+        seen = set()
+
+        def walk(value):
+            if value is self or id(value) in seen:
+                digest.update(b'@')
+            elif isinstance(value, (str, int, float, bool, date)) or value is None:
+                digest.update(repr(value).encode())
+            elif isinstance(value, ViewList):
+                # Only the lines, not their source and offset
+                walk(value.data)
+            elif isinstance(value, _nodes.Node):
+                digest.update(value.pformat().encode())
+            elif isinstance(value, dict):
+                seen.add(id(value))
+                digest.update(b'{')
+                for key in sorted(value, key=repr):
+                    walk(key)
+                    walk(value[key])
+                digest.update(b'}')
+            elif isinstance(value, (list, tuple)):
+                seen.add(id(value))
+                digest.update(b'[')
+                for val in value:
+                    walk(val)
+                digest.update(b']')
+            elif isinstance(value, (set, frozenset)):
+                digest.update(repr(sorted(value, key=repr)).encode())
+            elif hasattr(value, '__dict__'):
+                seen.add(id(value))
+                digest.update(type(value).__name__.encode())
+                walk({k: v for k, v in vars(value).items()
+                    if k not in self._index_fingerprint_skip})
+            else:
+                value = repr(value)
+                # The default repr is an address
+                digest.update(value.split(' at 0x')[0].encode())
+
+        walk(item)
+        return digest.hexdigest()
+
+    def reset_changed(self):
+        """Forget the changed items. Called before reading documents"""
+        self._changed = set()
+        self._removed = {}
+        self._merged_docnames = set()
+
+    def get_changed(self):
+        """Get the names of the items added, modified or removed since reset_changed.
+        An item removed then added again with the same content is not changed.
+
+        :returns: the names of the items
+        :rtype: set of str
+        """
+        return self._changed | set(self._removed)
+
+    def query_cached(self, key, func):
+        """Get the result of a query from the cache or compute it.
+        The cache is emptied when an item is added to or removed from the quest.
+
+        :param key: The normalized arguments of the query.
+        :type key: tuple
+        :param func: The function computing the query. Must return a tuple of lists.
+        :type func: callable
+        :returns: a new tuple of lists, that can be modified by caller
+        :rtype: tuple of lists
+        """
+        if self._query_generation != self._generation:
+            self._query_cache = {}
+            self._query_generation = self._generation
+        if key not in self._query_cache:
+            self._query_cache[key] = tuple(tuple(data) for data in func())
+        return tuple(list(data) for data in self._query_cache[key])
+
+    def __getstate__(self):
+        """Don't pickle the query cache"""
+        state = self.__dict__.copy()
+        state['_query_cache'] = {}
+        state['_query_generation'] = None
+        return state
+
+    def _index_sorted(self, kind, names):
+        """Sort names of items in the order of the quest"""
+        pos = self._index_pos[kind]
+        return sorted((name for name in names if name in pos), key=pos.__getitem__)
+
+    def get_linked(self, ref, name, only=None):
+        """Get the items linked to name in a reference index
+
+        :param ref: The reference index : source_orgs, source_idents, source_relations,
+            source_events, source_links, org_idents, org_events, ident_relations,
+            ident_links, event_links or event_quotes.
+        :type ref: str
+        :param name: The name of the item linked to.
+        :type name: str
+        :param only: Keep only these items. Use a set for large collections.
+        :type only: None or set or list of str
+        :returns: a list of names in the order of the quest
+        :rtype: list of str
+        """
+        names = self._index_refs[ref].get(name, ())
+        if only is not None:
+            if isinstance(only, (set, frozenset, dict)) is False:
+                only = set(only)
+            names = [data for data in names if data in only]
+        return self._index_sorted(ref.split('_', 1)[1], names)
+
+    @classmethod
+    def _index_union(cls, index, keys):
+        """Get the names indexed by any of keys"""
+        ret = set()
+        for key in keys:
+            if key in index:
+                ret |= index[key]
+        return ret
+
     def _filter_cats(self, cats, obj, initial_data, exclude_cats=None, null_ok=False):
         """"Filter by cats"""
         if cats is None or cats == []:
             ret_cats = initial_data
         else:
-            ret_cats = []
-            cats = self.split_cats(cats)
-            for data in initial_data:
-                try:
-                    if obj[data].cats == []:
-                        if null_ok:
-                            ret_cats.append(data)
-                    else:
-                        for cat in cats:
-                            if cat in obj[data].cats:
-                                ret_cats.append(data)
-                                break
-                except Exception:
-                    log.warning("Can't find %s in %s", data, obj[:20], exc_info=True)
+            index = self._attr_index(obj)
+            matched = self._index_union(index['cats'], self.split_cats(cats))
+            if null_ok:
+                matched |= index['nocats']
+            ret_cats = [data for data in initial_data if data in matched]
         if exclude_cats is not None and exclude_cats != []:
-            for data in list(ret_cats):
-                for cat in exclude_cats:
-                    if cat in obj[data].cats:
-                        ret_cats.remove(data)
-                        break
+            excluded = self._index_union(self._attr_index(obj)['cats'], exclude_cats)
+            ret_cats = [data for data in ret_cats if data not in excluded]
         return ret_cats
 
     def _filter_countries(self, countries, obj, initial_data):
         """"Filter by countries"""
-        # ~ print('_filter_countries initial_data', countries, initial_data)
         if countries is None or countries == []:
             ret_countries = initial_data
         else:
-            ret_countries = []
-            for data in initial_data:
-                # ~ print('_filter_countries', countries, obj[data].country, obj[data].label)
-                if obj[data].country in countries:
-                    ret_countries.append(data)
+            matched = self._index_union(self._attr_index(obj)['countries'], self.split_countries(countries))
+            ret_countries = [data for data in initial_data if data in matched]
         return ret_countries
 
     def _filter_dates(self, begin, end, obj, initial_data):
@@ -837,33 +1255,28 @@ class OSIntQuest(OSIntBase):
         if orgs is None or orgs == []:
             ret_orgs = initial_data
         else:
-            ret_orgs = []
-            for data in initial_data:
-                if obj[data].orgs == [] or obj[data].orgs == '':
-                    if null_ok:
-                        ret_orgs.append(data)
-                else:
-                    for org in orgs:
-                        oorg = f"{OSIntOrg.prefix}.{org}" if org.startswith(f"{OSIntOrg.prefix}.") is False else org
-                        # ~ print('oorg', oorg, obj[data].orgs)
-                        if oorg in obj[data].orgs:
-                            ret_orgs.append(data)
-                            # ~ print('ret_orgs', ret_orgs)
-                            break
-        # ~ print('ret_orgs final', ret_orgs)
+            kind = self._index_kind(obj)
+            if kind in ('idents', 'events'):
+                index = self._index_refs[f'org_{kind}']
+            else:
+                index = {}
+                for name, item in obj.items():
+                    for org in (item.orgs or [None]):
+                        index.setdefault(org, set()).add(name)
+            oorgs = [f"{OSIntOrg.prefix}.{org}" if org.startswith(f"{OSIntOrg.prefix}.") is False else org for org in orgs]
+            matched = self._index_union(index, oorgs)
+            if null_ok:
+                matched |= index.get(None, set())
+            ret_orgs = [data for data in initial_data if data in matched]
         return ret_orgs
 
     def _filter_idents(self, idents, obj, initial_data):
         """"Filter by idents"""
-        # ~ print('_filter_countries initial_data', countries, initial_data)
         if idents is None or idents == []:
             ret_idents = initial_data
         else:
-            ret_idents = []
-            for data in initial_data:
-                # ~ print('_filter_countries', countries, obj[data].country, obj[data].label)
-                if data in idents and data not in ret_idents:
-                    ret_idents.append(data)
+            idents = set(idents)
+            ret_idents = [data for data in dict.fromkeys(initial_data) if data in idents]
         return ret_idents
 
     def add_org(self, name, label, **kwargs):
@@ -877,7 +1290,7 @@ class OSIntQuest(OSIntBase):
         :type kwargs: kwargs
         """
         org = OSIntOrg(name, label, default_cats=self.default_org_cats, quest=self, **kwargs)
-        self.orgs[org.name] = org
+        self._index_set('orgs', org)
 
     def get_orgs(self, orgs=None, cats=None, countries=None, borders=True, exclude_cats=None):
         """Get orgs from the quest
@@ -911,7 +1324,7 @@ class OSIntQuest(OSIntBase):
         :type kwargs: kwargs
         """
         relation = OSIntRelation(label, rfrom, rto, default_cats=self.default_relation_cats, quest=self, **kwargs)
-        self.relations[relation.name] = relation
+        self._index_set('relations', relation)
 
     def get_relations(self, orgs=None, cats=None, countries=None, begin=None, end=None, borders=True, exclude_cats=None):
         """Get relations from the quest
@@ -943,7 +1356,7 @@ class OSIntQuest(OSIntBase):
         """
         # ~ print("add_ident", label)
         ident = OSIntIdent(name, label, default_cats=self.default_ident_cats, quest=self, **kwargs)
-        self.idents[ident.name] = ident
+        self._index_set('idents', ident)
 
     def get_idents(self, orgs=None, idents=None, cats=None, countries=None, borders=True, exclude_cats=None):
         """Get idents from the quest
@@ -979,7 +1392,7 @@ class OSIntQuest(OSIntBase):
         """
         # ~ print("add_ident", label)
         country = OSIntCountry(name, label, default_cats=self.default_country_cats, quest=self, **kwargs)
-        self.countries[country.name] = country
+        self._index_set('countries', country)
 
     def get_cities(self, cats=None, countries=None, exclude_cats=None):
         """Get idents from the quest
@@ -1008,7 +1421,7 @@ class OSIntQuest(OSIntBase):
         :type kwargs: kwargs
         """
         city = OSIntCity(name, label, default_cats=self.default_city_cats, quest=self, **kwargs)
-        self.cities[city.name] = city
+        self._index_set('cities', city)
 
     def get_countries(self, cats=None, exclude_cats=None, countries=None):
         """Get idents from the quest
@@ -1018,14 +1431,7 @@ class OSIntQuest(OSIntBase):
         :returns: a list of idents
         :rtype: list of str
         """
-        if cats is not None and len(cats) > 0:
-            ret = []
-            for c in self.countries.keys():
-                for cat in cats:
-                    if cat in self.countries[c].cats:
-                        ret.append(c)
-            return ret
-        return [ c for c in self.countries.keys()]
+        return self._filter_cats(cats, self.countries, list(self.countries.keys()))
 
     def get_events(self, orgs=None, cats=None, idents=None, countries=None, begin=None, end=None, borders=True, exclude_cats=None):
         """Get events from the quest
@@ -1067,23 +1473,24 @@ class OSIntQuest(OSIntBase):
         # ~ rels = self._filter_countries(countries, self.relations, rels)
         log.debug(f"get_idents_relations {cats} {orgs} {countries} : {rels}")
 
-        rels_idents = []
+        sidents = set(idents)
+        linked = self._index_union(self._index_refs['ident_relations'], sidents)
+        rels_idents = {}
         idents_rels = []
         for rel in rels:
-            # ~ print(self.relations[rel].rfrom, self.relations[rel].rfrom in idents, self.relations[rel].rto, self.relations[rel].rto not in idents)
-            if self.relations[rel].rfrom in idents or self.relations[rel].rto in idents:
-                if borders:
-                    if rel not in idents_rels:
-                        idents_rels.append(rel)
-                    if (self.relations[rel].rto not in idents and self.relations[rel].rto not in rels_idents):
-                        rels_idents.append(self.relations[rel].rto)
-                    if (self.relations[rel].rfrom not in idents and self.relations[rel].rfrom not in rels_idents):
-                        rels_idents.append(self.relations[rel].rfrom)
-                else:
-                    if self.relations[rel].rfrom in idents and self.relations[rel].rto in idents:
-                        idents_rels.append(rel)
-        # ~ print(rels_idents)
-        rels_idents += idents
+            if rel not in linked:
+                continue
+            rfrom = self.relations[rel].rfrom
+            rto = self.relations[rel].rto
+            if borders:
+                idents_rels.append(rel)
+                if rto not in sidents:
+                    rels_idents[rto] = None
+                if rfrom not in sidents:
+                    rels_idents[rfrom] = None
+            elif rfrom in sidents and rto in sidents:
+                idents_rels.append(rel)
+        rels_idents = list(rels_idents) + list(idents)
         log.debug(f"get_idents_relations {cats} : {rels_idents} {rels}")
         return rels_idents, idents_rels
 
@@ -1098,7 +1505,7 @@ class OSIntQuest(OSIntBase):
         :type kwargs: kwargs
         """
         event = OSIntEvent(name, label, default_cats=self.default_event_cats, quest=self, **kwargs)
-        self.events[event.name] = event
+        self._index_set('events', event)
 
     def add_link(self, label, lfrom, lto, **kwargs):
         """Add link to the quest
@@ -1109,7 +1516,7 @@ class OSIntQuest(OSIntBase):
         :type kwargs: kwargs
         """
         link = OSIntLink(label, lfrom, lto, default_cats=self.default_link_cats, quest=self, **kwargs)
-        self.links[link.name] = link
+        self._index_set('links', link)
 
     def get_links(self, orgs=None, cats=None, countries=None, begin=None, end=None, borders=True, exclude_cats=None):
         """Get links from the quest
@@ -1140,7 +1547,7 @@ class OSIntQuest(OSIntBase):
         :type kwargs: kwargs
         """
         quote = OSIntQuote(label, lfrom, lto, default_cats=self.default_quote_cats, quest=self, **kwargs)
-        self.quotes[quote.name] = quote
+        self._index_set('quotes', quote)
 
     def get_quotes(self, orgs=None, cats=None, countries=None, begin=None, end=None, borders=True, exclude_cats=None):
         """Get quotes from the quest
@@ -1187,22 +1594,28 @@ class OSIntQuest(OSIntBase):
         # ~ log.debug(f"get_idents_events {orgs} {cats} {countries} : {events}")
         # ~ events = list(set(ret_countries))
 
+        sidents = set(idents)
+        sevents = set(events)
+        linked = self._index_union(self._index_refs['ident_links'], sidents) | \
+            self._index_union(self._index_refs['event_links'], sevents)
         links_events = []
-        events_links = []
-        idents_links = []
+        events_links = {}
+        idents_links = {}
         for link in links:
-            if self.links[link].lfrom in idents or self.links[link].lto in events:
-                if borders:
-                    if self.links[link].lto not in events and self.links[link].lto not in events_links:
-                        events_links.append(self.links[link].lto)
-                    if self.links[link].lfrom not in idents and self.links[link].lto not in idents_links:
-                        idents_links.append(self.links[link].lfrom)
-                    links_events.append(self.links[link].name)
-                else:
-                    if self.links[link].lfrom in idents and self.links[link].lto in events:
-                        links_events.append(self.links[link].name)
-        events_links += events
-        idents_links += idents
+            if link not in linked:
+                continue
+            lfrom = self.links[link].lfrom
+            lto = self.links[link].lto
+            if borders:
+                if lto not in sevents:
+                    events_links[lto] = None
+                if lfrom not in sidents:
+                    idents_links[lfrom] = None
+                links_events.append(link)
+            elif lfrom in sidents and lto in sevents:
+                links_events.append(link)
+        events_links = list(events_links) + list(events)
+        idents_links = list(idents_links) + list(idents)
         log.debug(f"get_idents_events {cats}/{idents} : {idents_links} {events_links} {links_events}")
         return idents_links, events_links, links_events
 
@@ -1231,20 +1644,24 @@ class OSIntQuest(OSIntBase):
         # ~ log.debug(f"get_idents_events {orgs} {cats} {countries} : {events}")
         # ~ events = list(set(ret_countries))
 
+        sevents = set(events)
+        linked = self._index_union(self._index_refs['event_quotes'], sevents)
         quotes_events = []
-        events_quotes = []
+        events_quotes = {}
         for quote in quotes:
-            if self.quotes[quote].qfrom in events or self.quotes[quote].qto in events:
-                if borders:
-                    if self.quotes[quote].qto not in events and self.quotes[quote].qto not in events_quotes:
-                        events_quotes.append(self.quotes[quote].qto)
-                    if self.quotes[quote].qfrom not in events and self.quotes[quote].qto not in events_quotes:
-                        events_quotes.append(self.quotes[quote].qfrom)
-                    quotes_events.append(self.quotes[quote].name)
-                else:
-                    if self.quotes[quote].qfrom in events and self.quotes[quote].qto in events:
-                        quotes_events.append(self.quotes[quote].name)
-        events_quotes += events
+            if quote not in linked:
+                continue
+            qfrom = self.quotes[quote].qfrom
+            qto = self.quotes[quote].qto
+            if borders:
+                if qto not in sevents:
+                    events_quotes[qto] = None
+                if qfrom not in sevents:
+                    events_quotes[qfrom] = None
+                quotes_events.append(quote)
+            elif qfrom in sevents and qto in sevents:
+                quotes_events.append(quote)
+        events_quotes = list(events_quotes) + list(events)
         log.debug(f"get_events_quotes {cats}/{events} : {events_quotes} {quotes_events}")
         log.debug(f"get_events_quotes : {quotes_events}")
         return events_quotes, quotes_events
@@ -1261,7 +1678,7 @@ class OSIntQuest(OSIntBase):
         """
         # ~ print('heeeeeeeeeeeeeeeeeeeeeeeeere')
         graph = OSIntGraph(name, label, quest=self, **kwargs)
-        self.graphs[graph.name] = graph
+        self._index_set('graphs', graph)
 
     def get_graphs(self, orgs=None, cats=None, countries=None, years=None, exclude_cats=None):
         """Get graphs from the quest
@@ -1324,7 +1741,7 @@ class OSIntQuest(OSIntBase):
         """
         # ~ print('heeeeeeeeeeeeeeeeeeeeeeeeere')
         csv = OSIntCsv(name, label, quest=self, **kwargs)
-        self.csvs[csv.name] = csv
+        self._index_set('csvs', csv)
 
     def get_csvs(self, orgs=None, cats=None, countries=None, begin=None, end=None, exclude_cats=None):
         """Get csvs from the quest
@@ -1386,7 +1803,7 @@ class OSIntQuest(OSIntBase):
         :type kwargs: kwargs
         """
         report = OSIntReport(name, label, quest=self, **kwargs)
-        self.reports[report.name] = report
+        self._index_set('reports', report)
 
     def get_reports(self, orgs=None, cats=None, countries=None, begin=None, end=None, exclude_cats=None):
         """Get reports from the quest
@@ -1449,7 +1866,7 @@ class OSIntQuest(OSIntBase):
         """
         # ~ print('heeeeeeeeeeeeeeeeeeeeeeeeere')
         sourcelist = OSIntSourceList(name, label, quest=self, **kwargs)
-        self.sourcelists[sourcelist.name] = sourcelist
+        self._index_set('sourcelists', sourcelist)
 
     def get_sourcelists(self, orgs=None, cats=None, countries=None, begin=None, end=None, exclude_cats=None):
         """Get sourcelists from the quest
@@ -1511,7 +1928,7 @@ class OSIntQuest(OSIntBase):
         :type kwargs: kwargs
         """
         eventlist = OSIntEventList(name, label, quest=self, **kwargs)
-        self.eventlists[eventlist.name] = eventlist
+        self._index_set('eventlists', eventlist)
 
     def get_eventlists(self, orgs=None, cats=None, countries=None, begin=None, end=None, exclude_cats=None):
         """Get eventlists from the quest
@@ -1573,7 +1990,7 @@ class OSIntQuest(OSIntBase):
         :type kwargs: kwargs
         """
         identlist = OSIntIdentList(name, label, quest=self, **kwargs)
-        self.identlists[identlist.name] = identlist
+        self._index_set('identlists', identlist)
 
     def get_identlists(self, orgs=None, cats=None, countries=None, begin=None, end=None, exclude_cats=None):
         """Get identlists from the quest
@@ -1636,7 +2053,7 @@ class OSIntQuest(OSIntBase):
         """
         # ~ print('heeeeeeeeeeeeeeeeeeeeeeeeere')
         graph = OSIntGraph(name, label, quest=self, **kwargs)
-        self.graphs[graph.name] = graph
+        self._index_set('graphs', graph)
 
     def add_source(self, name, label, **kwargs):
         """Add source to the quest
@@ -1650,7 +2067,7 @@ class OSIntQuest(OSIntBase):
         """
         source = OSIntSource(name, label, default_cats=self.default_cats,
             quest=self, **kwargs)
-        self.sources[source.name] = source
+        self._index_set('sources', source)
 
     def get_sources(self, orgs=None, cats=None, countries=None, borders=True,
         filtered_orgs=None, filtered_idents=None, filtered_relations=None,
@@ -1667,78 +2084,121 @@ class OSIntQuest(OSIntBase):
         :returns: a list of sources
         :rtype: list of str
         """
-        ret = []
-        # ~ log.debug('self.quest.idents %s' % self.idents)
-        if filtered_orgs is None:
-            filtered_orgs = self.get_orgs(cats=cats, orgs=orgs, countries=countries, borders=borders)
-        for data in filtered_orgs:
-            for lsource in self.orgs[data].linked_sources():
-                if lsource not in ret:
-                    ret.append(lsource)
-
-        # ~ log.debug('orgs %s %s %s : %s' % (cats, orgs, countries, filtered_orgs))
-        if filtered_idents is None:
-            filtered_idents = self.get_idents(cats=cats, orgs=orgs, countries=countries, borders=borders)
-        for data in filtered_idents:
-            for lsource in self.idents[data].linked_sources():
-                if lsource not in ret:
-                    ret.append(lsource)
-
-        if filtered_relations is None:
-            filtered_relations = self.get_relations(cats=cats, orgs=orgs, countries=countries, borders=borders)
-        for data in filtered_relations:
-            for lsource in self.relations[data].linked_sources():
-                if lsource not in ret:
-                    ret.append(lsource)
-
-        if filtered_links is None:
-            filtered_links = self.get_links(cats=cats, orgs=orgs, countries=countries, borders=borders)
-        for data in filtered_links:
-            for lsource in self.links[data].linked_sources():
-                if lsource not in ret:
-                    ret.append(lsource)
-
-        if filtered_quotes is None:
-            filtered_quotes = self.get_quotes(cats=cats, orgs=orgs, countries=countries, borders=borders)
-        for data in filtered_quotes:
-            for lsource in self.quotes[data].linked_sources():
-                if lsource not in ret:
-                    ret.append(lsource)
-
-        if filtered_countries is None:
-            filtered_countries = self.get_countries(cats=cats)
-        for data in filtered_countries:
-            for lsource in self.countries[data].linked_sources():
-                if lsource not in ret:
-                    ret.append(lsource)
+        ret = list(self.iter_sources(orgs=orgs, cats=cats, countries=countries, borders=borders,
+            filtered_orgs=filtered_orgs, filtered_idents=filtered_idents,
+            filtered_relations=filtered_relations, filtered_events=filtered_events,
+            filtered_links=filtered_links, filtered_quotes=filtered_quotes,
+            filtered_countries=filtered_countries, exclude_cats=exclude_cats))
         log.debug(f"get_sources {orgs} {cats} {countries} : {ret}")
         return ret
 
-    def clean_docname(self, docname):
-        """Clean all items where item.docname = docname
+    def iter_sources(self, orgs=None, cats=None, countries=None, borders=True,
+        filtered_orgs=None, filtered_idents=None, filtered_relations=None,
+        filtered_events=None, filtered_links=None, filtered_quotes=None,
+        filtered_countries=None, exclude_cats=None):
+        """Iter over sources from the quest. Each source is yielded once.
+
+        The filtered_* lists (or sets) are used as is : the matching get_* are
+        only called for the missing ones, when they are needed.
+
+        :param orgs: The orgs for filtering sources.
+        :type orgs: list of str
+        :param cats: The cats for filtering sources.
+        :type cats: list of str
+        :param countries: The countries for filtering sources.
+        :type countries: list of str
+        :returns: the names of sources
+        :rtype: generator of str
+        """
+        seen = set()
+        for kind, filtered, getter in [
+            ('orgs', filtered_orgs, lambda: self.get_orgs(cats=cats, orgs=orgs, countries=countries, borders=borders)),
+            ('idents', filtered_idents, lambda: self.get_idents(cats=cats, orgs=orgs, countries=countries, borders=borders)),
+            ('relations', filtered_relations, lambda: self.get_relations(cats=cats, orgs=orgs, countries=countries, borders=borders)),
+            ('links', filtered_links, lambda: self.get_links(cats=cats, orgs=orgs, countries=countries, borders=borders)),
+            ('quotes', filtered_quotes, lambda: self.get_quotes(cats=cats, orgs=orgs, countries=countries, borders=borders)),
+            ('countries', filtered_countries, lambda: self.get_countries(cats=cats)),
+        ]:
+            if filtered is None:
+                filtered = getter()
+            elif isinstance(filtered, (set, frozenset)):
+                filtered = self._index_sorted(kind, filtered)
+            data = getattr(self, kind)
+            for name in filtered:
+                for lsource in data[name].linked_sources():
+                    if lsource not in seen:
+                        seen.add(lsource)
+                        yield lsource
+
+    def get_item_kinds(self):
+        """Get the names of the attributes holding items, the plugins ones included
+
+        :returns: the names of the attributes
+        :rtype: list of str
         """
-        def _clean(data):
-            for key, value in list(data.items()):
-                if value.docname == docname:
-                    data.pop(key)
+        ret = []
+        for name, value in self.__dict__.items():
+            if isinstance(value, dict) is False or len(value) == 0:
+                continue
+            if isinstance(next(iter(value.values())), OSIntBase):
+                ret.append(name)
+        return ret
+
+    def get_docname_items(self, docname):
+        """Get the items of a document in all the collections
 
-        for dd in [self.orgs, self.idents, self.relations, self.events,
-                self.links, self.sources, self.graphs, self.reports, self.csvs]:
-            _clean(dd)
+        :param docname: The docname.
+        :type docname: str
+        :returns: the (kind, name) of the items
+        :rtype: list of tuple
+        """
+        return list(self._index_docs.get(docname, ()))
 
-    def merge_quest(self, docname, quest):
-        """Merge quest from parallel build in main quest
+    def clean_docname(self, docname):
+        """Clean all items where item.docname = docname
         """
-        def _merge(quests):
-            for main, other in quests:
-                main.update(other)
+        self._store_dirty.add(docname)
+        for name in list(self._fetch_queue.keys()):
+            if name in self.sources and self.sources[name].docname == docname:
+                self._fetch_queue.pop(name)
+        for kind, name in self.get_docname_items(docname):
+            self._index_pop(kind, name)
 
-        for dd in [(self.orgs, quest.orgs), (self.idents, quest.idents),
-                   (self.relations, quest.relations), (self.events, quest.events),
-                   (self.links, quest.links), (self.sources, quest.sources),
-                   (self.graphs, quest.graphs), (self.reports, quest.reports),
-                   (self.csvs, quest.csvs)]:
-            _merge(dd)
+    def merge_quest(self, docnames, quest):
+        """Merge the items of docnames from a parallel build in main quest.
+        Only the items of docnames are looked at.
+
+        :param docnames: The docnames read by the parallel build.
+        :type docnames: str or list of str
+        :param quest: The quest of the parallel build.
+        :type quest: OSIntQuest
+        :returns: the conflicts (kind, name, docname, other docname) :
+            the items of docnames already defined in another document
+        :rtype: list of tuple
+        """
+        if isinstance(docnames, str):
+            docnames = [docnames]
+        docnames = sorted(docnames)
+        conflicts = []
+        for docname in docnames:
+            self._store_dirty.add(docname)
+            for kind, name in quest.get_docname_items(docname):
+                value = getattr(quest, kind)[name]
+                current = getattr(self, kind).get(name)
+                # The parallel build already reported the duplicates
+                # of the documents it did not read
+                warn = current is not None and current.docname in self._merged_docnames
+                # The item was pickled with the quest of the parallel build
+                value.quest = self
+                other = self._index_set(kind, value, warn=warn)
+                if other is not None:
+                    conflicts.append((kind, name, docname, other))
+        self._merged_docnames.update(docnames)
+        sdocnames = set(docnames)
+        for name in quest._fetch_queue:
+            if name in quest.sources and quest.sources[name].docname in sdocnames:
+                self._fetch_queue[name] = None
+        return conflicts
 
     def local_file(self, fname, ext='pdf'):
         """Get the full local filename to store the source
@@ -1756,8 +2216,7 @@ class OSIntQuest(OSIntBase):
         urls = []
         for src in linked_sources:
             if remove is True:
-                if src in sources:
-                    sources.remove(src)
+                sources.pop(src, None)
             obj_src = self.sources[src]
             srcname = obj_src.name.replace(OSIntSource.prefix+'.','')
             if obj_src.url is not None:
@@ -1817,7 +2276,8 @@ class OSIntQuest(OSIntBase):
             types.remove('sources')
         else:
             do_sources = False
-        sources = self.get_sources(cats=cats, countries=countries)
+        # Insertion ordered set of the sources not linked to an entity
+        sources = dict.fromkeys(self.iter_sources(cats=cats, countries=countries))
         for ttype in types:
             for objid in getattr(self, "get_%s" % ttype)(cats=cats, countries=countries):
                 obj = getattr(self, ttype)[objid]
@@ -1839,7 +2299,7 @@ class OSIntQuest(OSIntBase):
                 })
         if do_sources is True:
             ttype = "sources"
-            for objid in sources:
+            for objid in list(sources):
                 obj = self.sources[objid]
                 data_json, urls = self._search_sources(sources, obj.linked_sources())
                 res.append({
@@ -2108,7 +2568,7 @@ class OSIntOrg(OSIntItem):
     def linked_idents(self):
         """Get the idents of the object"""
         # ~ return [ idt.replace(f'{OSIntIdent.prefix}.', '') for idt in self.quest.get_idents(orgs=[self.name])]
-        return self.quest.get_idents(orgs=[self.name])
+        return self.quest.get_linked('org_idents', self.name)
 
     # ~ def linked_sources(self, sources=None, with_idents=False):
         # ~ """Get the links of the object"""
@@ -2282,9 +2742,6 @@ class OSIntIdent(OSIntItem):
         if '-' in name:
             raise RuntimeError('Invalid character in name : %s'%name)
         self.orgs = self.split_orgs(orgs)
-        self._linked_relations_from = None
-        self._linked_relations_to = None
-        self._linked_links_to = None
         self.birth = birth
         self.death = death
         self.altlabels = altlabels
@@ -2316,36 +2773,17 @@ class OSIntIdent(OSIntItem):
 
     def linked_relations_from(self, relations=None):
         """Get the relations of the object"""
-        # ~ if self._linked_relations_from is None:
-        if relations is None:
-            relations = self.quest.relations
-        self._linked_relations_from = []
-        for rel in relations:
-            if self.quest.relations[rel].rfrom == self.name:
-                self._linked_relations_from.append(rel)
-        return self._linked_relations_from
+        return [rel for rel in self.quest.get_linked('ident_relations', self.name, only=relations)
+            if self.quest.relations[rel].rfrom == self.name]
 
     def linked_relations_to(self, relations=None):
         """Get the relations of the object"""
-        # ~ if self._linked_relations_to is None:
-        if relations is None:
-            relations = self.quest.relations
-        self._linked_relations_to = []
-        for rel in relations:
-            if self.quest.relations[rel].rto == self.name:
-                self._linked_relations_to.append(rel)
-        return self._linked_relations_to
+        return [rel for rel in self.quest.get_linked('ident_relations', self.name, only=relations)
+            if self.quest.relations[rel].rto == self.name]
 
     def linked_links_to(self, links=None):
         """Get the links of the object"""
-        # ~ if self._linked_links_to is None:
-        if links is None:
-            links = self.quest.links
-        self._linked_links_to = []
-        for rel in links:
-            if self.quest.links[rel].lfrom == self.name:
-                self._linked_links_to.append(rel)
-        return self._linked_links_to
+        return self.quest.get_linked('ident_links', self.name, only=links)
 
     def graph(self, html_links=None):
         if self.fillcolor is not None:
@@ -2450,18 +2888,10 @@ class OSIntEvent(OSIntItem):
             raise RuntimeError('Invalid character in name : %s'%name)
         self.begin, self.end = self.parse_dates(begin, end)
         self.orgs = self.split_orgs(orgs)
-        self._linked_links_from = None
 
     def linked_links_from(self, link=None):
         """Get the links of the object"""
-        if self._linked_links_from is None:
-            if link is None:
-                link = self.quest.links
-            self._linked_links_from = []
-            for rel in link:
-                if self.quest.links[rel].lto == self.name:
-                    self._linked_links_from.append(rel)
-        return self._linked_links_from
+        return self.quest.get_linked('event_links', self.name, only=link)
 
     def graph(self, html_links=None):
         # ~ print('self.style', self.style)
@@ -2614,71 +3044,54 @@ class OSIntSource(OSIntItem):
         self.youtube = youtube
         self.bsky = bsky
         self.orgs = self.split_orgs(orgs)
-        self._linked_orgs = None
-        self._linked_idents = None
-        self._linked_relations = None
-        self._linked_events = None
-        self._linked_links = None
         # ~ print('uuuuuuuuuurl', self.url)
-        for plg in osint_plugins['source'] + osint_plugins['directive']:
-            plg.init_source(self.quest.sphinx_env, self)
+        if self.quest.fetch_deferred is True:
+            self.quest.add_fetch(self.name)
+        else:
+            for plg in osint_plugins['source'] + osint_plugins['directive']:
+                plg.init_source(self.quest.sphinx_env, self)
         # ~ if self.auto_download and self.url is not None:
             # ~ self.pdf(os.path.join(self.quest.sphinx_env.srcdir, self.quest.cache_file(self.name)), self.url)
 
     def linked_orgs(self, orgs=None):
-        """Get the orgs linked to the object"""
-        if self._linked_orgs is None:
-            self._linked_orgs = []
-            if orgs is None:
-                orgs = self.quest.orgs
-            for org in orgs:
-                if self.name in self.quest.orgs[org].sources:
-                    self._linked_orgs.append(org)
-        return self._linked_orgs
+        """Get the orgs linked to the object
+
+        :param orgs: Keep only these orgs.
+        :type orgs: None or set or list of str
+        """
+        return self.quest.get_linked('source_orgs', self.name, only=orgs)
 
     def linked_idents(self, idents=None):
-        """Get the idents linked to the object"""
-        if self._linked_idents is None:
-            self._linked_idents = []
-            if idents is None:
-                idents = self.quest.idents
-            for idt in idents:
-                if self.name in self.quest.idents[idt].sources:
-                    self._linked_idents.append(idt)
-        return self._linked_idents
+        """Get the idents linked to the object
+
+        :param idents: Keep only these idents.
+        :type idents: None or set or list of str
+        """
+        return self.quest.get_linked('source_idents', self.name, only=idents)
 
     def linked_relations(self, relations=None):
-        """Get the idents linked to the object"""
-        if self._linked_relations is None:
-            self._linked_relations = []
-            if relations is None:
-                relations = self.quest.relations
-            for idt in relations:
-                if self.name in self.quest.relations[idt].sources:
-                    self._linked_relations.append(idt)
-        return self._linked_relations
+        """Get the relations linked to the object
+
+        :param relations: Keep only these relations.
+        :type relations: None or set or list of str
+        """
+        return self.quest.get_linked('source_relations', self.name, only=relations)
 
     def linked_events(self, events=None):
-        """Get the events linked to the object"""
-        if self._linked_events is None:
-            self._linked_events = []
-            if events is None:
-                events = self.quest.events
-            for idt in events:
-                if self.name in self.quest.events[idt].sources:
-                    self._linked_events.append(idt)
-        return self._linked_events
+        """Get the events linked to the object
+
+        :param events: Keep only these events.
+        :type events: None or set or list of str
+        """
+        return self.quest.get_linked('source_events', self.name, only=events)
 
     def linked_links(self, links=None):
-        """Get the idents linked to the object"""
-        if self._linked_links is None:
-            self._linked_links = []
-            if links is None:
-                links = self.quest.links
-            for idt in links:
-                if self.name in self.quest.links[idt].sources:
-                    self._linked_links.append(idt)
-        return self._linked_links
+        """Get the links linked to the object
+
+        :param links: Keep only these links.
+        :type links: None or set or list of str
+        """
+        return self.quest.get_linked('source_links', self.name, only=links)
 
     @property
     def fetchmethod(self):
@@ -2780,6 +3193,33 @@ class OSIntRelated(OSIntBase):
         self.borders = borders
         self.types = types
         self.exclude_cats = exclude_cats
+        self._depends = None
+
+    def depends(self):
+        """Get the names of the items shown by the related
+
+        :returns: the names of the items or None if unknown
+        :rtype: frozenset of str or None
+        """
+        data = self.data_filter(self.cats, self.orgs, self.begin, self.end,
+            self.countries, self.idents, borders=self.borders)
+        data = self.data_complete(*data, self.cats, self.orgs, self.begin, self.end,
+            self.countries, self.idents, borders=self.borders)
+        return frozenset(itertools.chain.from_iterable(data))
+
+    def outdated(self, changed):
+        """Check if the related must be resolved again and remember its dependencies
+
+        :param changed: The names of the items changed since the last build.
+        :type changed: set of str
+        :returns: True if the items shown or one of them changed
+        :rtype: bool
+        """
+        previous = self._depends
+        self._depends = self.depends()
+        if previous is None or self._depends is None:
+            return True
+        return previous != self._depends or self._depends.isdisjoint(changed) is False
 
     @property
     def domain(self):
@@ -2920,6 +3360,10 @@ class OSIntIdentList(OSIntRelated):
         idents = self.quest.get_idents(cats=self.cats, idents=self.idents, orgs=self.orgs, countries=self.countries, borders=self.borders)
         return idents
 
+    def depends(self):
+        """Get the names of the idents shown by the list"""
+        return frozenset(self.report())
+
 
 class OSIntCsv(OSIntRelated):
 
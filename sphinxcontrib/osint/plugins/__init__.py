@@ -10,13 +10,14 @@ __author__ = 'bibi21000 aka Sébastien GALLET'
 __email__ = 'bibi21000@gmail.com'
 
 import signal
+import threading
 from contextlib import contextmanager
 from importlib import metadata  # noqa
 from importlib.metadata import EntryPoint  # noqa
 from sphinx.util.docutils import SphinxDirective as _SphinxDirective
 from sphinx.util import logging
 
-from ..osintlib import reify_classmethod
+from ..osintlib import reify_classmethod, deadline
 
 log = logging.getLogger(__name__)
 
@@ -64,6 +65,17 @@ class Plugin():
     def init(cls, env):
         pass
 
+    @classmethod
+    def fetch_done(cls, env):
+        """Called once the queued sources are fetched"""
+        pass
+
+    @classmethod
+    def fetch_worker_done(cls, env):
+        """Called in a fetch worker thread when it stops, to release
+        the resources of the thread"""
+        pass
+
     @classmethod
     def parse_options(cls, env, source_name, params, i, optlist, more_options, docname="fake0.rst"):
         pass
@@ -76,14 +88,21 @@ class Plugin():
         :param seconds: Number of seconds before timeout.
         :type seconds: int
         """
-        def signal_handler(signum, frame):
-            raise TimeoutException("Timed out!")
-        signal.signal(signal.SIGALRM, signal_handler)
-        signal.alarm(seconds)
-        try:
-            yield
-        finally:
-            signal.alarm(0)
+        with deadline(seconds):
+            if threading.current_thread() is not threading.main_thread():
+                # Signals only work in main thread : the calls get the deadline
+                # from time_left and OSIntFetcher abandons the workers
+                # that exceed osint_fetch_timeout
+                yield
+                return
+            def signal_handler(signum, frame):
+                raise TimeoutException("Timed out!")
+            signal.signal(signal.SIGALRM, signal_handler)
+            signal.alarm(seconds)
+            try:
+                yield
+            finally:
+                signal.alarm(0)
 
 
 class PluginSource(Plugin):
@@ -138,6 +157,52 @@ class PluginDirective(Plugin):
     def Indexes(cls):
         return []
 
+    @classmethod
+    def render_jobs(cls, app, jobs, render, initializer=None, workers=1, summary='rendering... '):
+        """Render images before writing docs, in a pool of processes if workers > 1.
+        A failed job is only logged in debug : it is rendered again, and reported
+        with its location, when its doc is written.
+
+        :param app: The sphinx app.
+        :type app: Sphinx
+        :param jobs: The jobs : (name, job).
+        :type jobs: list of tuple
+        :param render: The picklable function rendering a job.
+        :type render: callable
+        :param initializer: The function called when a worker process starts.
+        :type initializer: callable or None
+        :param workers: The number of processes. 1 to render in the main process.
+        :type workers: int
+        :param summary: The summary of the progress.
+        :type summary: str
+        """
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        from sphinx.util.display import status_iterator
+
+        if len(jobs) == 0:
+            return
+
+        def results():
+            if workers <= 1:
+                for name, job in jobs:
+                    try:
+                        render(job)
+                        yield name, None
+                    except Exception as e:
+                        yield name, e
+                return
+            with ProcessPoolExecutor(max_workers=min(workers, len(jobs)),
+                    initializer=initializer) as pool:
+                futures = {pool.submit(render, job): name for name, job in jobs}
+                for future in as_completed(futures):
+                    yield futures[future], future.exception()
+
+        verbosity = app.verbosity if app is not None else 0
+        for name, error in status_iterator(results(), summary,
+                'darkgreen', len(jobs), verbosity, stringify_func=lambda r: r[0]):
+            if error is not None:
+                log.debug("Can't render %s : %s", name, error)
+
     def add_nodes(cls, app):
         pass
 
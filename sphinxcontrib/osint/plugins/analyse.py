@@ -78,6 +78,8 @@ class Analyse(PluginDirective):
             ('osint_analyse_font', 'Noto Sans', 'html'),
             ('osint_analyse_day_month', day_month, ''),
             ('osint_analyse_words_max', 30, 'html'),
+            ('osint_analyse_workers', 1, 'html'),
+            ('osint_analyse_batch', 16, 'html'),
         ]
 
     @classmethod
@@ -104,6 +106,93 @@ class Analyse(PluginDirective):
     @classmethod
     def add_events(cls, app):
         app.add_event('analyse-defined')
+        # After the fetch stage
+        app.connect('env-updated', cls.analyse_sources, priority=450)
+        app.connect('build-finished', cls.build_finished)
+
+    @classmethod
+    def build_finished(cls, app, exception):
+        """Write the idents index updated while writing docs"""
+        quest = app.env.get_domain('osint').quest
+        if quest._analyse_idents_index is not None:
+            quest._analyse_idents_index.dump()
+
+    @classmethod
+    def analyse_sources(cls, app, env):
+        """Analyse the stale sources before writing docs.
+        Sources are analysed by batches, in a pool of processes
+        if osint_analyse_workers > 1."""
+        from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+        from sphinx.util.display import status_iterator
+        from ..osintlib import OSIntSource
+        from .analyselib import analyse_batch, analyse_worker_init, WORKER_CONFIG
+
+        domain = env.get_domain('osint')
+        quest = domain.quest
+        engines = env.config.osint_analyse_engines
+        stales = []
+        for name in list(quest.sources.keys()):
+            source = quest.sources[name]
+            if source.link is not None:
+                continue
+            source_name = name[len(OSIntSource.prefix) + 1:]
+            filename, filea, stale = domain.analyse_source_file(env, source_name)
+            if stale is True and filename is not None:
+                stales.append((source_name, filename, filea))
+        if len(stales) == 0:
+            return []
+
+        lexicon = quest.analyse_lexicon()
+        size = max(1, env.config.osint_analyse_batch)
+        batches = [stales[i:i + size] for i in range(0, len(stales), size)]
+        files = {source_name: filea for source_name, filename, filea in stales}
+
+        def tasks(batch):
+            # Texts are loaded only when the batch is submitted
+            ret = []
+            for source_name, filename, filea in batch:
+                text = domain.source_json_load(source_name, filename=filename)
+                if len(text) > 0:
+                    ret.append((source_name, text, engines,
+                        domain.analyse_source_kwargs(env, domain.get_source(source_name))))
+            return ret
+
+        def results():
+            workers = env.config.osint_analyse_workers
+            if workers <= 1:
+                for batch in batches:
+                    yield from analyse_batch(tasks(batch), quest=quest, lexicon=lexicon, batch_size=size)
+                return
+            config = {name: getattr(env.config, name) for name in WORKER_CONFIG}
+            with ProcessPoolExecutor(max_workers=min(workers, len(batches)),
+                    initializer=analyse_worker_init, initargs=(config, lexicon, engines)) as pool:
+                pending = set()
+                for batch in batches:
+                    # Keep the number of texts in memory bounded
+                    while len(pending) >= workers * 2:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            yield from future.result()
+                    pending.add(pool.submit(analyse_batch, tasks(batch), batch_size=size))
+                for future in pending:
+                    yield from future.result()
+
+        index = quest.analyse_idents_index()
+        verbosity = app.verbosity if app is not None else 0
+        try:
+            for source_name, ret, error in status_iterator(results(), 'analysing sources... ',
+                    'darkgreen', len(stales), verbosity, stringify_func=lambda r: r[0]):
+                if error is not None:
+                    logger.warning(__("Can't analyse source %s : %s"), source_name, error)
+                    continue
+                with open(files[source_name], 'w') as f:
+                    f.write(cls._imp_json.dumps(ret, indent=2))
+                index.update(source_name, os.path.getmtime(files[source_name]), ret)
+        except Exception:
+            # Sources not analysed here will be when their docs are written
+            logger.warning(__("Can't analyse sources"), exc_info=True)
+        index.dump()
+        return []
 
     @classmethod
     def add_nodes(cls, app):
@@ -245,6 +334,53 @@ class Analyse(PluginDirective):
             return ret
         domain.analyse_list_load = analyse_list_load
 
+        global analyse_source_file
+        def analyse_source_file(domain, env, source_name):
+            """Get the analyse file of a source and check if it must be computed again
+
+            :param source_name: The name of the source.
+            :type source_name: str
+            :returns: the text file, the analyse file and True if the analyse is stale
+            :rtype: tuple
+            """
+            filename, datesf = domain.source_json_file(source_name)
+            cachefull = os.path.join(env.srcdir, env.config.osint_analyse_cache, f'{source_name}.json')
+            storefull = os.path.join(env.srcdir, env.config.osint_analyse_store, f'{source_name}.json')
+
+            dateaf = None
+            filea = storefull
+            if os.path.isfile(filea) is True:
+                dateaf = os.path.getmtime(filea)
+            else:
+                filea = cachefull
+                if os.path.isfile(filea) is True:
+                    dateaf = os.path.getmtime(filea)
+
+            stale = (dateaf is None) or \
+              (datesf is not None and datesf > dateaf) or \
+              (env.config.osint_analyse_ttl > 0 and time.time() > dateaf + env.config.osint_analyse_ttl)
+            return filename, filea, stale
+        domain.analyse_source_file = analyse_source_file
+
+        global analyse_source_kwargs
+        def analyse_source_kwargs(domain, env, osintobj):
+            """Get the lists of words used by the engines to analyse a source
+
+            :param osintobj: The source.
+            :type osintobj: OSIntSource
+            :returns: the keyword arguments for the engines
+            :rtype: dict
+            """
+            return {
+                'day_month': domain.analyse_list_day_month(env, orgs=osintobj.orgs, cats=osintobj.cats),
+                'words': domain.analyse_list_load(env, name='__all__', cats=osintobj.cats),
+                'badwords': domain.analyse_list_load(env, name='__badwords__', cats=osintobj.cats),
+                'badpeoples': domain.analyse_list_load(env, name='__badpeoples__', cats=osintobj.cats),
+                'badcountries': domain.analyse_list_load(env, name='__badcountries__', cats=osintobj.cats),
+                'words_max': env.config.osint_analyse_words_max,
+            }
+        domain.analyse_source_kwargs = analyse_source_kwargs
+
     @classmethod
     def extend_processor(cls, processor):
 
@@ -312,64 +448,42 @@ class Analyse(PluginDirective):
             '''Process the node in source'''
             if 'link' in node.attributes:
                 return []
-            from . analyselib import ENGINES
-            filename,datesf = domain.source_json_file(node["osint_name"])
+            from . analyselib import analyse_text
+            filename, filea, stale = domain.analyse_source_file(env, node["osint_name"])
             cachef = os.path.join(env.config.osint_analyse_cache, f'{node["osint_name"]}.json')
             storef = os.path.join(env.config.osint_analyse_store, f'{node["osint_name"]}.json')
             cachefull = os.path.join(env.srcdir, cachef)
             storefull = os.path.join(env.srcdir, storef)
 
-            dateaf = None
-            filea = storefull
-            if os.path.isfile(filea) is True:
-                dateaf = os.path.getmtime(filea)
-            else:
-                filea = cachefull
-                if os.path.isfile(filea) is True:
-                    dateaf = os.path.getmtime(filea)
-
-            if (os.path.isfile(filea) is False) or \
-              (datesf is not None and datesf > os.path.getmtime(filea)) or \
-              (env.config.osint_analyse_ttl > 0 and dateaf is not None and time.time() > dateaf + env.config.osint_analyse_ttl):
+            if stale is True:
 
                 # ~ print("process_source_analyse %s" % node["osint_name"])
 
                 osintobj = domain.get_source(node["osint_name"])
                 text = domain.source_json_load(node["osint_name"], filename=filename)
-                list_day_month = domain.analyse_list_day_month(env, orgs=osintobj.orgs, cats=osintobj.cats)
-                list_words = domain.analyse_list_load(env, name='__all__', cats=osintobj.cats)
-                list_badwords = domain.analyse_list_load(env, name='__badwords__', cats=osintobj.cats)
-                list_badpeoples = domain.analyse_list_load(env, name='__badpeoples__', cats=osintobj.cats)
-                list_badcountries = domain.analyse_list_load(env, name='__badcountries__', cats=osintobj.cats)
-                list_idents = domain.quest.build_full_list(objs='idents')
-                list_orgs = domain.quest.build_full_list(objs='orgs')
-                list_cities = domain.quest.build_full_list(objs='cities')
-                list_countries = domain.quest.build_full_list(objs='countries')
+                kwargs = domain.analyse_source_kwargs(env, osintobj)
+                lexicon = domain.quest.analyse_lexicon()
+                list_idents = lexicon.get('idents')
+                list_orgs = lexicon.get('orgs')
+                list_cities = lexicon.get('cities')
+                list_countries = lexicon.get('countries')
                 # ~ list_orgs = domain.quest.analyse_list_orgs(cats=osintobj.cats)
                 # ~ list_cities = domain.quest.analyse_list_cities(cats=osintobj.cats)
                 # ~ list_countries = domain.quest.analyse_list_countries(cats=osintobj.cats)
                 ret = {}
                 if len(text) > 0:
-                    global ENGINES
                     if "engines" in node:
                         engines = node["engines"]
                     else:
                         engines = env.config.osint_analyse_engines
-                    for engine in engines:
-                        # ~ try:
-                        ret[engine] = ENGINES[engine]().analyse(domain.quest, text, day_month=list_day_month,
-                                countries=list_countries, badcountries=list_badcountries, cities=list_cities,
-                                badpeoples=list_badpeoples, badwords=list_badwords,
-                                words=list_words, idents=list_idents, orgs=list_orgs,
-                                words_max=env.config.osint_analyse_words_max
-                        )
-                        # ~ except Exception:
-                            # ~ logger.exception('Exception running analyse %s on %s' %(engine, node["osint_name"]))
-                            # ~ ret[engine] = {}
+                    ret = analyse_text(domain.quest, text, engines,
+                        countries=list_countries, cities=list_cities,
+                        idents=list_idents, orgs=list_orgs, lexicon=lexicon, **kwargs)
                 else:
                     logger.error("Can't get text for source %s" % node["osint_name"])
                 with open(filea, 'w') as f:
                     f.write(cls._imp_json.dumps(ret, indent=2))
+                domain.quest.analyse_idents_index().update(node["osint_name"], os.path.getmtime(filea), ret)
 
             if os.path.isfile(storefull) is True:
                 localf = storef
@@ -542,6 +656,8 @@ class Analyse(PluginDirective):
         quest._analyse_cache = None
         quest._analyse_store = None
         quest._analyse_json_cache = {}
+        quest._analyse_lexicon = None
+        quest._analyse_idents_index = None
 
         global analyses
         @property
@@ -565,7 +681,7 @@ class Analyse(PluginDirective):
             from .analyselib import OSIntAnalyse
 
             analyse = OSIntAnalyse(name, label, quest=quest, **kwargs)
-            quest.analyses[analyse.name] = analyse
+            quest._index_set('analyses', analyse)
         quest.add_analyse = add_analyse
 
         global get_analyses
@@ -727,6 +843,45 @@ class Analyse(PluginDirective):
             return ret
         quest.analyse_list_orgs = analyse_list_orgs
 
+        global analyse_lexicon
+        def analyse_lexicon(quest):
+            """Get the lexicon of idents, orgs, cities and countries, updated
+            with the items of the quest and stored in the analyse cache"""
+            if quest._analyse_lexicon is None:
+                from .analyselib import OSIntLexicon
+                quest._analyse_lexicon = OSIntLexicon(os.path.join(quest.sphinx_env.srcdir,
+                    quest.get_config('osint_analyse_cache'), '__lexicon__.json'))
+            quest._analyse_lexicon.update(quest)
+            return quest._analyse_lexicon
+        quest.analyse_lexicon = analyse_lexicon
+
+        global analyse_idents_index
+        def analyse_idents_index(quest, srcdir=None):
+            """Get the index of the idents found in the analyses of the sources.
+            It is synchronized with the analyse files when the quest changed."""
+            from ..osintlib import OSIntSource
+            if srcdir is None:
+                srcdir = quest.sphinx_env.srcdir
+            osint_analyse_store = quest.get_config('osint_analyse_store')
+            osint_analyse_cache = quest.get_config('osint_analyse_cache')
+            if quest._analyse_idents_index is None:
+                from .analyselib import OSIntIdentsIndex
+                quest._analyse_idents_index = OSIntIdentsIndex(os.path.join(srcdir,
+                    osint_analyse_cache, '__idents__.json'))
+            index = quest._analyse_idents_index
+            if index.generation is None or index.generation != quest._generation:
+                files = {}
+                for source in quest.sources:
+                    source_name = source.replace(f"{OSIntSource.prefix}.", '')
+                    jfile = os.path.join(srcdir, osint_analyse_store, f"{source_name}.json")
+                    if os.path.isfile(jfile) is False:
+                        jfile = os.path.join(srcdir, osint_analyse_cache, f"{source_name}.json")
+                    files[source_name] = jfile
+                index.sync(files, generation=quest._generation)
+                index.dump()
+            return index
+        quest.analyse_idents_index = analyse_idents_index
+
         global load_json_analyse_source
         def load_json_analyse_source(quest, source, srcdir=None, osint_analyse_store=None, osint_analyse_cache=None):
             """Load json for an analyse from a source"""
@@ -759,31 +914,27 @@ class Analyse(PluginDirective):
                 ident = OSIntIdent.prefix + '.' + ident
             idents_found = []
             idents_sources_found = {}
-            for source in quest.sources:
-                data = quest.load_json_analyse_source(source.replace(f"{OSIntSource.prefix}.", ''), srcdir=sourcedir,
-                    osint_analyse_store=osint_analyse_store,
-                    osint_analyse_cache=osint_analyse_cache)
-                if 'ident' in data and 'idents' in data['ident']:
-                    for idt in data['ident']['idents']:
-                        if idt[0] in exclude_idents:
-                            continue
-                        if idt[0] == ident:
-                            for idtt in data['ident']['idents']:
-                                if idtt[0] != ident:
-                                    try:
-                                        qidtt = quest.idents[idtt[0]]
-                                        lencats = len(qidtt.cats)
-                                        addit = True
-                                        for cat in exclude_cats:
-                                            if lencats > 0 and cat == qidtt.cats[0]:
-                                                addit = False
-                                                break
-                                        if addit is True:
-                                            idents_found.append(idtt[0])
-                                            if idtt[0] not in idents_sources_found:
-                                                idents_sources_found[idtt[0]] = []
-                                            idents_sources_found[idtt[0]].append(source)
-                                    except Exception:
-                                        print("Can't find ident %s" % idtt[0])
+            if ident in exclude_idents:
+                return idents_found, idents_sources_found
+            index = quest.analyse_idents_index(srcdir=sourcedir)
+            for source_name in index.sources(ident):
+                source = f"{OSIntSource.prefix}.{source_name}"
+                for idtt in index.idents(source_name):
+                    if idtt != ident:
+                        try:
+                            qidtt = quest.idents[idtt]
+                            lencats = len(qidtt.cats)
+                            addit = True
+                            for cat in exclude_cats:
+                                if lencats > 0 and cat == qidtt.cats[0]:
+                                    addit = False
+                                    break
+                            if addit is True:
+                                idents_found.append(idtt)
+                                if idtt not in idents_sources_found:
+                                    idents_sources_found[idtt] = []
+                                idents_sources_found[idtt].append(source)
+                        except Exception:
+                            print("Can't find ident %s" % idtt)
             return idents_found, idents_sources_found
         quest.ident_network = ident_network
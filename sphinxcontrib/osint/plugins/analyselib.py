@@ -10,6 +10,10 @@ from __future__ import annotations
 __author__ = 'bibi21000 aka Sébastien GALLET'
 __email__ = 'bibi21000@gmail.com'
 import os
+import itertools
+import threading
+import traceback
+from types import SimpleNamespace
 from typing import TYPE_CHECKING, ClassVar, cast
 from collections import Counter
 
@@ -76,6 +80,43 @@ class OSIntAnalyse(OSIntRelated):
             cengines = [c for c in engines.split(',') if c != '']
         return cengines
 
+    def depends(self):
+        """Analyses also depend on the analysed texts : always resolve them"""
+        return None
+
+    @property
+    def partials_file(self):
+        """The file of the results of the sources, kept to update the analyse"""
+        return os.path.join(self.quest.sphinx_env.srcdir, self.quest.sphinx_env.config.osint_analyse_cache,
+            f'__{self.name.replace(self.prefix+".","")}__.json')
+
+    def load_partials(self, engines):
+        """Load the results of the sources used for the last analyse
+
+        :param engines: The engines of the analyse.
+        :type engines: list of str
+        :returns: the mtime of the file and the result for each source
+        :rtype: dict
+        """
+        if os.path.isfile(self.partials_file) is False:
+            return {}
+        try:
+            with open(self.partials_file, 'r') as f:
+                data = self._imp_json.load(f)
+        except Exception:
+            logger.exception("Can't load partials from %s" % self.partials_file)
+            return {}
+        if data.get('engines') != list(engines):
+            return {}
+        return data.get('sources', {})
+
+    def dump_partials(self, engines, partials):
+        """Write the results of the sources used for the analyse"""
+        tmpf = self.partials_file + '.tmp'
+        with open(tmpf, 'w') as f:
+            self._imp_json.dump({'engines': list(engines), 'sources': partials}, f)
+        os.replace(tmpf, self.partials_file)
+
     def analyse(self):
         """Analyse it
         """
@@ -88,40 +129,44 @@ class OSIntAnalyse(OSIntRelated):
         found_new = False
         countries, cities, orgs, all_idents, relations, events, links, quotes, sources = self.data_filter(self.cats, self.orgs, self.begin, self.end, self.countries, self.idents, borders=self.borders)
         countries, cities, orgs, all_idents, relations, events, links, quotes, sources = self.data_complete(countries, cities, orgs, all_idents, relations, events, links, quotes, sources, self.cats, self.orgs, self.begin, self.end, self.countries, self.idents, borders=self.borders)
+        mtimes = {}
         for source in sources:
             source_name = self.quest.sources[source].name.replace(OSIntSource.prefix+".","")
             stat_file = os.path.join(self.quest.sphinx_env.srcdir, self.quest.sphinx_env.config.osint_analyse_store, f'{source_name}.json')
             if os.path.isfile(stat_file) is False:
                 stat_file = os.path.join(self.quest.sphinx_env.srcdir, self.quest.sphinx_env.config.osint_analyse_cache, f'{source_name}.json')
             # ~ print(stat_file, os.path.getmtime(stat_file) if os.path.isfile(stat_file) else None)
-            if os.path.isfile(stat_file) is True and os.path.getmtime(stat_file) > mtime_filefull:
+            mtimes[source_name] = os.path.getmtime(stat_file) if os.path.isfile(stat_file) is True else None
+            if mtimes[source_name] is not None and mtimes[source_name] > mtime_filefull:
                 found_new = True
-                break
 
         # ~ print(found_new, mtime_filefull)
         if (os.path.isfile(ret_filefull) is False) or found_new:
-            stats = {}
-            for source in sources:
-                source_name = self.quest.sources[source].name.replace(OSIntSource.prefix+".","")
-                # ~ data = self.domain.load_json_analyse_source(source_name)
-
+            engines = self.quest.sphinx_env.config.osint_analyse_engines
+            partials = self.load_partials(engines)
+            new_partials = {}
+            accs = {engine: ENGINES[engine].begin() for engine in engines}
+            for source_name, mtime in mtimes.items():
                 try:
-                    # ~ stats1 = self._imp_json.loads(data)
-                    stats1 = self.quest.load_json_analyse_source(source_name)
-                    if stats == {}:
-                        stats = stats1
+                    cached = partials.get(source_name)
+                    if cached is not None and cached[0] == mtime:
+                        partial = cached[1]
                     else:
-                        _stats = {}
-
-                        for engine in self.quest.sphinx_env.config.osint_analyse_engines:
-                            _stats[engine] = ENGINES[engine].merge(stats, stats1)
-                        stats = _stats
+                        stats1 = self.quest.load_json_analyse_source(source_name)
+                        if isinstance(stats1, dict) is False:
+                            continue
+                        partial = {engine: stats1[engine] for engine in engines if engine in stats1}
+                    new_partials[source_name] = [mtime, partial]
+                    for engine in partial:
+                        ENGINES[engine].add(accs[engine], partial[engine])
 
                 except Exception:
                     logger.exception(f"Can't load analyse for {source_name}")
 
+            stats = {engine: ENGINES[engine].finalize(accs[engine]) for engine in engines}
             with open(ret_filefull, 'w') as f:
                 f.write(self._imp_json.dumps(stats, indent=2))
+            self.dump_partials(engines, new_partials)
 
         return ret_file, ret_filefull
 
@@ -150,6 +195,440 @@ def latex_depart_analyse_node(self: LaTeXTranslator, node: analyse_node) -> None
     self.no_latex_floats -= 1
 
 
+class OSIntMatcher():
+
+    def __init__(self, patterns):
+        """An Aho-Corasick automaton finding all the patterns present
+        in a text in a single pass over it.
+
+        :param patterns: The patterns and the value returned when they are found.
+        :type patterns: dict
+        """
+        self.values = list(patterns.values())
+        # node -> {char: node}
+        self._goto = [{}]
+        # node -> fallback node
+        self._fail = [0]
+        # node -> index of the pattern ending at it or None
+        self._out = [None]
+        # node -> next node on the fail chain with an output
+        self._link = [0]
+        self._empty = []
+        for idx, pattern in enumerate(patterns.keys()):
+            if len(pattern) == 0:
+                self._empty.append(idx)
+                continue
+            node = 0
+            for char in pattern:
+                nxt = self._goto[node].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(None)
+                    self._link.append(0)
+                node = nxt
+            self._out[node] = idx
+        self._build()
+
+    def _build(self):
+        """Compute fail and output links in breadth first order"""
+        goto, fail, out, link = self._goto, self._fail, self._out, self._link
+        queue = list(goto[0].values())
+        for node in queue:
+            for char, nxt in goto[node].items():
+                queue.append(nxt)
+                state = fail[node]
+                while state != 0 and char not in goto[state]:
+                    state = fail[state]
+                fback = goto[state].get(char, 0)
+                fail[nxt] = fback if fback != nxt else 0
+                link[nxt] = fail[nxt] if out[fail[nxt]] is not None else link[fail[nxt]]
+
+    def __len__(self):
+        return len(self.values)
+
+    def search(self, text):
+        """Find the patterns present in text
+
+        :param text: The text.
+        :type text: str
+        :returns: the indexes of the patterns found, sorted
+        :rtype: list of int
+        """
+        goto, fail, out, link = self._goto, self._fail, self._out, self._link
+        found = set(self._empty)
+        # Nodes whose outputs have already been collected
+        seen = set()
+        node = 0
+        for char in text:
+            while node != 0 and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            state = node
+            while state != 0 and state not in seen:
+                seen.add(state)
+                if out[state] is not None:
+                    found.add(out[state])
+                state = link[state]
+        return sorted(found)
+
+    def find(self, text):
+        """Get the values of the patterns present in text,
+        in the order of the patterns
+
+        :param text: The text.
+        :type text: str
+        :returns: the values, one for each pattern found
+        :rtype: list
+        """
+        return [self.values[idx] for idx in self.search(text)]
+
+
+class OSIntLexicon():
+
+    #: The kinds of items in the lexicon
+    kinds = ('idents', 'orgs', 'cities', 'countries')
+    #: Change it when the format of the file changes
+    version = 1
+
+    def __init__(self, filename=None):
+        """The labels and altlabels of the quest items used by the analyse engines.
+        Permutations are computed only for the items added or changed
+        and the lexicon is kept in a json file between builds.
+
+        :param filename: The json file. None to keep the lexicon in memory.
+        :type filename: str or None
+        """
+        self.filename = filename
+        self._lock = threading.Lock()
+        # kind -> {name: [label, altlabels, phrases]}
+        self._items = {kind: {} for kind in self.kinds}
+        # kind -> {phrase: name}
+        self._lists = {}
+        # (key, serial, kinds of the inputs) -> OSIntMatcher
+        self._matchers = {}
+        # Incremented when the lexicon changes
+        self._serial = 0
+        self._generation = None
+        self.load()
+
+    def __reduce__(self):
+        """Only pickle the filename : the lexicon is loaded again from it"""
+        return (self.__class__, (self.filename,))
+
+    @reify_classmethod
+    def _imp_json(cls):
+        """Lazy loader for import json"""
+        import importlib
+        return importlib.import_module('json')
+
+    @classmethod
+    def phrases(cls, label, altlabels=None):
+        """Get the phrases matching an item : its label and altlabels in any word order
+
+        :param label: The label of the item.
+        :type label: str
+        :param altlabels: The altlabels of the item separated by |.
+        :type altlabels: str or None
+        :returns: the lowered phrases
+        :rtype: list of str
+        """
+        combelts = label.split(' ')
+        if len(combelts) > 4:
+            return []
+        ret = [' '.join(idt).lower() for idt in itertools.permutations(combelts)]
+        if altlabels is not None:
+            for desc in [d.strip() for d in altlabels.split("|")]:
+                combelts = desc.split(' ')
+                if len(combelts) > 3:
+                    continue
+                ret += [' '.join(idt).lower() for idt in itertools.permutations(combelts)]
+        return ret
+
+    def load(self):
+        """Load the lexicon from file"""
+        if self.filename is None or os.path.isfile(self.filename) is False:
+            return
+        try:
+            with open(self.filename, 'r') as f:
+                data = self._imp_json.load(f)
+        except Exception:
+            logger.exception("Can't load lexicon from %s" % self.filename)
+            return
+        if data.get('version') != self.version:
+            return
+        for kind in self.kinds:
+            self._items[kind] = data.get(kind, {})
+
+    def dump(self):
+        """Write the lexicon to file"""
+        if self.filename is None:
+            return
+        data = {'version': self.version}
+        data.update(self._items)
+        tmpf = self.filename + '.tmp'
+        with open(tmpf, 'w') as f:
+            self._imp_json.dump(data, f)
+        os.replace(tmpf, self.filename)
+
+    def update(self, quest):
+        """Synchronize the lexicon with the items of the quest.
+        Nothing is done if the quest did not change since the last call.
+
+        :param quest: The quest.
+        :type quest: OSIntQuest
+        :returns: True if the lexicon changed
+        :rtype: bool
+        """
+        with self._lock:
+            if self._generation is not None and self._generation == quest._generation:
+                return False
+            changed = False
+            for kind in self.kinds:
+                objs = getattr(quest, kind)
+                names = getattr(quest, 'get_%s' % kind)()
+                previous = self._items[kind]
+                # Keep the order of the quest : first item wins for a phrase
+                kchanged = list(previous.keys()) != names
+                items = {}
+                for name in names:
+                    obj = objs[name]
+                    item = previous.get(name)
+                    if item is None or item[0] != obj.slabel or item[1] != obj.altlabels:
+                        item = [obj.slabel, obj.altlabels, self.phrases(obj.slabel, obj.altlabels)]
+                        kchanged = True
+                    items[name] = item
+                if kchanged:
+                    self._items[kind] = items
+                    self._lists.pop(kind, None)
+                    self._matchers = {}
+                    self._serial += 1
+                    changed = True
+            self._generation = quest._generation
+            if changed:
+                self.dump()
+            return changed
+
+    def matcher(self, key, patterns, inputs=()):
+        """Get a matcher built from the phrases of the lexicon.
+        It is cached by key, lexicon generation and the kinds of the inputs,
+        so the patterns are only computed when the matcher is built.
+        Inputs that don't come from get are not cached.
+
+        :param key: The key of the matcher in the cache.
+        :type key: str
+        :param patterns: A callable returning the patterns of the matcher.
+        :type patterns: callable
+        :param inputs: The lists (from get) the patterns are computed from.
+        :type inputs: tuple of dict
+        :returns: the matcher
+        :rtype: OSIntMatcher
+        """
+        with self._lock:
+            kinds = tuple(next((kind for kind, lst in self._lists.items() if lst is value), None)
+                for value in inputs)
+            cache_key = (key, self._serial, kinds)
+            ret = self._matchers.get(cache_key)
+        if ret is not None:
+            return ret
+        ret = OSIntMatcher(patterns())
+        if None in kinds:
+            return ret
+        with self._lock:
+            return self._matchers.setdefault(cache_key, ret)
+
+    def get(self, kind):
+        """Get the phrases of a kind of items
+
+        :param kind: The kind of items : idents, orgs, cities or countries.
+        :type kind: str
+        :returns: the phrases and the name of the item they match
+        :rtype: dict
+        """
+        with self._lock:
+            if kind not in self._lists:
+                ret = {}
+                for name, item in self._items[kind].items():
+                    for phrase in item[2]:
+                        if phrase not in ret:
+                            ret[phrase] = name
+                self._lists[kind] = ret
+            return self._lists[kind]
+
+
+class OSIntIdentsIndex():
+
+    #: Change it when the format of the file changes
+    version = 1
+
+    def __init__(self, filename=None):
+        """The idents found in the analyses of the sources.
+        Idents are co-occurring when they are found in a same source.
+        The index is updated when the analyse of a source is written
+        and kept in a json file between builds.
+
+        :param filename: The json file. None to keep the index in memory.
+        :type filename: str or None
+        """
+        self.filename = filename
+        self.generation = None
+        self._lock = threading.Lock()
+        self._dirty = False
+        # source -> [mtime, [idents]]
+        self._sources = {}
+        # ident -> {source: None}
+        self._idents = {}
+        self.load()
+
+    def __reduce__(self):
+        """Only pickle the filename : the index is loaded again from it"""
+        return (self.__class__, (self.filename,))
+
+    @reify_classmethod
+    def _imp_json(cls):
+        """Lazy loader for import json"""
+        import importlib
+        return importlib.import_module('json')
+
+    def load(self):
+        """Load the index from file"""
+        if self.filename is None or os.path.isfile(self.filename) is False:
+            return
+        try:
+            with open(self.filename, 'r') as f:
+                data = self._imp_json.load(f)
+        except Exception:
+            logger.exception("Can't load idents index from %s" % self.filename)
+            return
+        if data.get('version') != self.version:
+            return
+        for source, (mtime, idents) in data.get('sources', {}).items():
+            self._set(source, mtime, idents)
+
+    def dump(self):
+        """Write the index to file if it changed"""
+        if self.filename is None:
+            return
+        with self._lock:
+            if self._dirty is False:
+                return
+            tmpf = self.filename + '.tmp'
+            with open(tmpf, 'w') as f:
+                self._imp_json.dump({'version': self.version, 'sources': self._sources}, f)
+            os.replace(tmpf, self.filename)
+            self._dirty = False
+
+    def _set(self, source, mtime, idents):
+        self._remove(source)
+        self._sources[source] = [mtime, idents]
+        for ident in idents:
+            self._idents.setdefault(ident, {})[source] = None
+
+    def _remove(self, source):
+        old = self._sources.pop(source, None)
+        if old is None:
+            return
+        for ident in old[1]:
+            sources = self._idents.get(ident)
+            if sources is not None:
+                sources.pop(source, None)
+                if len(sources) == 0:
+                    del self._idents[ident]
+
+    def update(self, source, mtime, data):
+        """Update the idents of a source from its analyse
+
+        :param source: The name of the source.
+        :type source: str
+        :param mtime: The mtime of the analyse file.
+        :type mtime: float
+        :param data: The analyse of the source.
+        :type data: dict
+        """
+        idents = []
+        if isinstance(data, dict) and 'ident' in data and 'idents' in data['ident']:
+            idents = [idt[0] for idt in data['ident']['idents']]
+        with self._lock:
+            self._set(source, mtime, idents)
+            self._dirty = True
+
+    def sync(self, files, generation=None):
+        """Synchronize the index with the analyse files. Only the files
+        whose mtime changed are loaded.
+
+        :param files: The analyse file of each source.
+        :type files: dict
+        :param generation: The generation of the quest.
+        :type generation: int or None
+        :returns: True if the index changed
+        :rtype: bool
+        """
+        changed = False
+        for source in [s for s in self._sources if s not in files]:
+            with self._lock:
+                self._remove(source)
+            changed = True
+        for source, filename in files.items():
+            mtime = os.path.getmtime(filename) if os.path.isfile(filename) else None
+            if mtime is None:
+                if source in self._sources:
+                    with self._lock:
+                        self._remove(source)
+                    changed = True
+                continue
+            cached = self._sources.get(source)
+            if cached is not None and cached[0] == mtime:
+                continue
+            try:
+                with open(filename, 'r') as f:
+                    data = self._imp_json.load(f)
+            except Exception:
+                logger.exception("Can't load analyse from %s" % filename)
+                data = None
+            self.update(source, mtime, data)
+            changed = True
+        if changed:
+            self._dirty = True
+        self.generation = generation
+        return changed
+
+    def sources(self, ident):
+        """Get the sources where an ident is found
+
+        :param ident: The name of the ident.
+        :type ident: str
+        :rtype: list of str
+        """
+        return list(self._idents.get(ident, {}).keys())
+
+    def idents(self, source):
+        """Get the idents found in a source
+
+        :param source: The name of the source.
+        :type source: str
+        :rtype: list of str
+        """
+        cached = self._sources.get(source)
+        return [] if cached is None else list(cached[1])
+
+    def cooccurrences(self, ident):
+        """Get the idents found in the same sources as ident
+
+        :param ident: The name of the ident.
+        :type ident: str
+        :returns: the sources shared with each ident
+        :rtype: dict
+        """
+        ret = {}
+        for source in self.sources(ident):
+            for other in self._sources[source][1]:
+                if other != ident:
+                    ret.setdefault(other, []).append(source)
+        return ret
+
+
 class Engine():
     name = None
 
@@ -175,6 +654,61 @@ class Engine():
     def clean_text(self, text):
         return self._imp_re.sub(r'[^\w\s]', ' ', text.lower())
 
+    @classmethod
+    def matcher(cls, key, patterns, lexicon=None, inputs=()):
+        """Get a matcher from the lexicon cache or build it
+
+        :param key: The key of the matcher in the lexicon.
+        :type key: str
+        :param patterns: A callable returning the patterns of the matcher.
+        :type patterns: callable
+        :param lexicon: The lexicon the lists come from, if any.
+        :type lexicon: OSIntLexicon or None
+        :param inputs: The lists the patterns are computed from.
+        :type inputs: tuple of dict
+        :returns: the matcher
+        :rtype: OSIntMatcher
+        """
+        if lexicon is None:
+            return OSIntMatcher(patterns())
+        return lexicon.matcher(key, patterns, inputs=inputs)
+
+    @classmethod
+    def begin(cls):
+        """Begin to aggregate the results of the engine for many sources
+
+        :returns: the accumulator
+        :rtype: dict
+        """
+        return {}
+
+    @classmethod
+    def add(cls, acc, data):
+        """Add the result of the engine for a source to the accumulator.
+        The result is a dict of lists of (name, count).
+
+        :param acc: The accumulator.
+        :type acc: dict
+        :param data: The result of the engine for the source.
+        :type data: dict
+        """
+        for key, values in data.items():
+            counter = acc.get(key)
+            if counter is None:
+                counter = acc[key] = Counter()
+            counter.update({value[0]: value[1] for value in values})
+
+    @classmethod
+    def finalize(cls, acc):
+        """Get the aggregated results from the accumulator
+
+        :param acc: The accumulator.
+        :type acc: dict
+        :returns: the aggregated result, sorted by counts
+        :rtype: dict
+        """
+        return {key: counter.most_common() for key, counter in acc.items()}
+
     @classmethod
     def clean_badwords(self, words, badwords=None):
         if badwords is None or len(badwords) == 0:
@@ -507,6 +1041,21 @@ class MoodEngine(NltkEngine):
     def most_common(cls, data):
         return data
 
+    @classmethod
+    def add(cls, acc, data):
+        """Moods are not counted : keep the values of each source"""
+        for key, value in data.items():
+            if isinstance(value, dict):
+                dacc = acc.setdefault(key, {})
+                for kkey, kvalue in value.items():
+                    dacc.setdefault(kkey, []).append(kvalue)
+            else:
+                acc.setdefault(key, []).append(value)
+
+    @classmethod
+    def finalize(cls, acc):
+        return acc
+
 
 class WordsEngine(NltkEngine):
     name = 'words'
@@ -607,8 +1156,10 @@ class PeopleEngine(SpacyEngine, NltkEngine):
         countries = kwargs.pop('countries', [])
         personnes = Counter()
 
-        if self.nlp:
+        doc = kwargs.pop('doc', None)
+        if doc is None and self.nlp:
             doc = self.nlp(text)
+        if doc is not None:
             for ent in doc.ents:
                 if ent.label_ == "PER" or ent.label_ == "PERSON":
                     nom = ent.text.strip()
@@ -737,29 +1288,14 @@ class IdentEngine(SpacyEngine, NltkEngine):
             raise
         clean_text = " ".join(all_words)
 
-        # ~ print(orgs.keys(), idents.keys())
-        ident_list = [
-            idents[mot] for mot in idents.keys()
-            if mot not in orgs.keys() and \
-                mot not in countries.keys() and \
-                mot not in cities.keys() and \
-                f" {mot} " in clean_text
-        ]
-        # ~ ident_list = [
-            # ~ idents[mot] for mot in idents.keys()
-            # ~ if f" {mot} " in clean_text
-        # ~ ]
-        # ~ print('ident_list', ident_list)
-        # ~ org_list = [
-            # ~ orgs[mot] for mot in orgs.keys()
-            # ~ if mot not in countries.keys() and \
-            # ~ mot not in cities.keys() and \
-            # ~ f" {mot} " in clean_text
-        # ~ ]
-        org_list = [
-            orgs[mot] for mot in orgs.keys()
-            if f" {mot} " in clean_text
-        ]
+        lexicon = kwargs.get('lexicon')
+        ident_list = cls.matcher('ident.idents', lambda: {
+            f" {mot} ": idents[mot] for mot in idents
+            if mot not in orgs and mot not in countries and mot not in cities
+        }, lexicon=lexicon, inputs=(idents, orgs, countries, cities)).find(clean_text)
+        org_list = cls.matcher('ident.orgs', lambda: {
+            f" {mot} ": orgs[mot] for mot in orgs
+        }, lexicon=lexicon, inputs=(orgs,)).find(clean_text)
         # ~ print('org_list', org_list)
 
         compteur_ident = Counter(ident_list)
@@ -821,10 +1357,8 @@ class CountriesEngine(SpacyEngine, NltkEngine):
     @classmethod
     def analyse(cls, quest, text, countries=None, **kwargs):
         clean_text = cls.clean_text(text).lower()
-        countries_list = [
-            countries[mot] for mot in countries.keys()
-            if mot in clean_text
-        ]
+        countries_list = cls.matcher('countries.countries', lambda: countries,
+            lexicon=kwargs.get('lexicon'), inputs=(countries,)).find(clean_text)
 
         compteur_countries = Counter(countries_list)
 
@@ -890,10 +1424,9 @@ class CitiesEngine(SpacyEngine, NltkEngine):
         all_words = cls._imp_nltk_tokenize.word_tokenize(clean_text, language=langf.name.lower())
         clean_text = " ".join(all_words)
 
-        city_list = [
-            cities[mot] for mot in cities.keys()
-            if f" {mot} " in clean_text
-        ]
+        city_list = cls.matcher('cities.cities', lambda: {
+            f" {mot} ": cities[mot] for mot in cities
+        }, lexicon=kwargs.get('lexicon'), inputs=(cities,)).find(clean_text)
 
         compteur_city = Counter(city_list)
         return {
@@ -957,6 +1490,79 @@ for k in ENGINES.keys():
     option_engines['report-%s'%k] = directives.unchanged
     option_engines['caption-%s'%k] = directives.unchanged
 
+#: The config values needed by the engines in a worker process
+WORKER_CONFIG = ('osint_analyse_nltk_download', 'osint_text_translate')
+_worker = None
+
+def analyse_text(quest, text, engines, **kwargs):
+    """Run engines on a text
+
+    :param quest: The quest.
+    :type quest: OSIntQuest
+    :param text: The text to analyse.
+    :type text: str
+    :param engines: The names of the engines.
+    :type engines: list of str
+    :returns: the result of each engine
+    :rtype: dict
+    """
+    ret = {}
+    for engine in engines:
+        ret[engine] = ENGINES[engine]().analyse(quest, text, **kwargs)
+    return ret
+
+def analyse_worker_init(config, lexicon, engines):
+    """Load the models of the engines once in a worker process
+
+    :param config: The config values listed in WORKER_CONFIG.
+    :type config: dict
+    :param lexicon: The lexicon of the quest.
+    :type lexicon: OSIntLexicon
+    :param engines: The names of the engines.
+    :type engines: list of str
+    """
+    global _worker
+    env = SimpleNamespace(config=SimpleNamespace(**config))
+    for engine in engines:
+        ENGINES[engine].init(env)
+    # Engines only need the config from the quest
+    _worker = SimpleNamespace(quest=SimpleNamespace(sphinx_env=env), lexicon=lexicon)
+
+def analyse_batch(tasks, quest=None, lexicon=None, batch_size=16):
+    """Analyse a batch of sources. spaCy documents are built with nlp.pipe.
+    Called without quest, it uses the ones of analyse_worker_init.
+
+    :param tasks: The sources to analyse : (name, text, engines, kwargs).
+    :type tasks: list of tuple
+    :param quest: The quest.
+    :type quest: OSIntQuest or None
+    :param lexicon: The lexicon of the quest.
+    :type lexicon: OSIntLexicon or None
+    :param batch_size: The batch size for nlp.pipe.
+    :type batch_size: int
+    :returns: (name, result, None) or (name, None, traceback) for each source
+    :rtype: list of tuple
+    """
+    if quest is None:
+        quest = _worker.quest
+        lexicon = _worker.lexicon
+    lists = {kind: lexicon.get(kind) for kind in lexicon.kinds}
+    docs = [None] * len(tasks)
+    if PeopleEngine.nlp is not None and any(PeopleEngine.name in task[2] for task in tasks):
+        try:
+            docs = list(PeopleEngine.nlp.pipe([task[1] for task in tasks], batch_size=batch_size))
+        except Exception:
+            docs = [None] * len(tasks)
+    ret = []
+    for task, doc in zip(tasks, docs):
+        name, text, engines, kwargs = task
+        try:
+            ret.append((name, analyse_text(quest, text, engines, doc=doc,
+                lexicon=lexicon, **lists, **kwargs), None))
+        except Exception:
+            ret.append((name, None, traceback.format_exc()))
+    return ret
+
 class DirectiveAnalyse(SphinxDirective):
     """
     An OSInt Analyse.
@@ -49,6 +49,9 @@ class BSky(PluginDirective):
             ('osint_bsky_cache', 'bsky_cache', 'html'),
             ('osint_bsky_apikey', None, 'html'),
             ('osint_bsky_user', None, 'html'),
+            ('osint_bsky_base_url', None, 'html'),
+            ('osint_bsky_crawl_workers', 4, 'html'),
+            ('osint_bsky_crawl_rate', 5, 'html'),
             ('osint_bsky_ai', False, 'html'),
             ('osint_bsky_swearwords', [], 'html'),
             ('osint_bsky_top_words', 20, 'html'),
@@ -430,7 +433,7 @@ class BSky(PluginDirective):
             :type kwargs: kwargs
             """
             bskystory = OSIntBSkyStory(name, quest=quest, **kwargs)
-            quest.bskystories[bskystory.name] = bskystory
+            quest._index_set('bskystories', bskystory)
         quest.add_bskystory = add_bskystory
 
         global get_bskystories
@@ -496,7 +499,7 @@ class BSky(PluginDirective):
             :type kwargs: kwargs
             """
             bskypost = OSIntBSkyPost(name, label, quest=quest, **kwargs)
-            quest.bskyposts[bskypost.name] = bskypost
+            quest._index_set('bskyposts', bskypost)
         quest.add_bskypost = add_bskypost
 
         global get_bskyposts
@@ -562,7 +565,7 @@ class BSky(PluginDirective):
             :type kwargs: kwargs
             """
             bskyprofile = OSIntBSkyProfile(name, label, quest=quest, **kwargs)
-            quest.bskyprofiles[bskyprofile.name] = bskyprofile
+            quest._index_set('bskyprofiles', bskyprofile)
         quest.add_bskyprofile = add_bskyprofile
 
         global get_bskyprofiles
@@ -14,7 +14,14 @@ __email__ = 'bibi21000@gmail.com'
 import os
 import io
 import time
+import json
+import hashlib
+import sqlite3
+import datetime
+import itertools
+import threading
 import warnings
+from collections.abc import Mapping
 from typing import Optional, Tuple, List
 # ~ import copy
 # ~ from collections import Counter, defaultdict
@@ -28,6 +35,7 @@ from typing import Optional, Tuple, List
 from sphinx.util import logging
 
 from ..osintlib import OSIntItem, OSIntSource
+from ..storelib import _ItemsView, _ValuesView
 from ..interfaces import NltkInterface
 from .. import OsintFutureRole, get_external_src_data, get_link_data
 from . import reify_classmethod
@@ -63,6 +71,8 @@ class BSkyInterface(NltkInterface):
     osint_bsky_suspicious_cluster_ratio = None
     osint_bsky_user = None
     osint_bsky_apikey = None
+    osint_bsky_base_url = None
+    _client_lock = threading.Lock()
 
     @classmethod
     def normalize_did(cls, did):
@@ -119,6 +129,12 @@ class BSkyInterface(NltkInterface):
         import importlib
         return importlib.import_module('multiprocessing.pool')
 
+    @reify_classmethod
+    def _imp_concurrent_futures(cls):
+        """Lazy loader for import concurrent.futures"""
+        import importlib
+        return importlib.import_module('concurrent.futures')
+
     @reify_classmethod
     def _imp_transformers(cls):
         """Lazy loader for import transformers"""
@@ -217,22 +233,29 @@ class BSkyInterface(NltkInterface):
         return None
 
     @classmethod
-    def get_bsky_client(cls, user=None, apikey=None):
+    def get_bsky_client(cls, user=None, apikey=None, base_url=None):
         """ Get a bsky client. Give a user and an apikey to use it as a class method
         (outside of sphinx env). The client is cached and only re-logged-in when the
-        requested user changes, so an explicit user/apikey is never silently ignored.
+        requested user or server changes, so an explicit user/apikey is never silently ignored.
+        The client can be shared by threads.
+
+        :param base_url: The xrpc url of the server (ie http://localhost:2583/xrpc).
+            Defaults to the one of the atproto client.
+        :type base_url: str
         """
         if user is None:
             user = cls.get_config('osint_bsky_user', user)
             apikey = cls.get_config('osint_bsky_apikey', apikey)
+            base_url = cls.get_config('osint_bsky_base_url', base_url)
 
-        cached_user, cached_client = cls.bsky_tools.get('client', (None, None))
-        if cached_client is None or cached_user != user:
-            client = cls._imp_atproto.Client()
-            client.login(user, apikey)
-            cls.bsky_tools['client'] = (user, client)
-            return client
-        return cached_client
+        with cls._client_lock:
+            cached_key, cached_client = cls.bsky_tools.get('client', (None, None))
+            if cached_client is None or cached_key != (user, base_url):
+                client = cls._imp_atproto.Client(base_url=base_url)
+                client.login(user, apikey)
+                cls.bsky_tools['client'] = ((user, base_url), client)
+                return client
+            return cached_client
 
     @classmethod
     def get_language_tool(cls):
@@ -862,11 +885,258 @@ class OSIntBSkyPost(OSIntItem, BSkyInterface):
         return result
 
 
+class OSIntBSkyRecords(Mapping):
+
+    def __init__(self, store, collection):
+        """A read only dict of the records of a collection, read from the store
+        when accessed. Iterating on it streams the records.
+
+        :param store: The store.
+        :type store: OSIntBSkyStore
+        :param collection: The collection (ie 'feeds').
+        :type collection: str
+        """
+        self.store = store
+        self.collection = collection
+
+    def __getitem__(self, key):
+        ret = self.store.get(self.collection, key)
+        if ret is None:
+            raise KeyError(key)
+        return ret
+
+    def __contains__(self, key):
+        return self.store.has(self.collection, key)
+
+    def __iter__(self):
+        return self.store.keys(self.collection)
+
+    def __len__(self):
+        return self.store.count(self.collection)
+
+    def _iter_items(self):
+        return self.store.items(self.collection)
+
+    def items(self):
+        return _ItemsView(self)
+
+    def values(self):
+        return _ValuesView(self)
+
+
+class OSIntBSkyStore():
+
+    #: The collections of records and the field used as key
+    collections = {'feeds': 'cid', 'followers': 'did', 'follows': 'did'}
+
+    def __init__(self, path):
+        """The data of a bsky profile in a sqlite database.
+        Records of feeds, followers and follows are appended when collected,
+        the profile and the analyses are small headers and diffs are logged.
+        Only new or changed records are written.
+
+        :param path: The sqlite file.
+        :type path: str
+        """
+        self.path = path
+        self._con = None
+        self._lock = threading.RLock()
+
+    @property
+    def con(self):
+        """The connection, opened on first use"""
+        with self._lock:
+            if self._con is None:
+                self._con = sqlite3.connect(self.path, check_same_thread=False)
+                self._con.execute('PRAGMA journal_mode=WAL')
+                self._con.execute('CREATE TABLE IF NOT EXISTS header (name TEXT PRIMARY KEY, data TEXT NOT NULL)')
+                self._con.execute('CREATE TABLE IF NOT EXISTS records ('
+                    'id INTEGER PRIMARY KEY, collection TEXT NOT NULL, key TEXT NOT NULL, '
+                    'data TEXT NOT NULL, UNIQUE(collection, key))')
+                self._con.execute('CREATE TABLE IF NOT EXISTS diff (date TEXT PRIMARY KEY, data TEXT NOT NULL)')
+                self._con.execute('CREATE TABLE IF NOT EXISTS arrays (name TEXT PRIMARY KEY, '
+                    'version INTEGER NOT NULL, data BLOB NOT NULL)')
+                self._con.commit()
+            return self._con
+
+    def close(self):
+        """Close the connection"""
+        with self._lock:
+            if self._con is not None:
+                self._con.close()
+                self._con = None
+
+    def _query(self, sql, args=()):
+        with self._lock:
+            return self.con.execute(sql, args).fetchall()
+
+    def header(self, name, default=None):
+        """Get a header (ie 'profile')"""
+        rows = self._query('SELECT data FROM header WHERE name = ?', (name,))
+        return default if len(rows) == 0 else json.loads(rows[0][0])
+
+    def headers(self):
+        """Get all the headers"""
+        return {name: json.loads(data) for name, data in
+            self._query('SELECT name, data FROM header ORDER BY rowid')}
+
+    def set_header(self, name, value):
+        """Write a header"""
+        with self._lock:
+            self.con.execute('INSERT INTO header (name, data) VALUES (?, ?) '
+                'ON CONFLICT(name) DO UPDATE SET data = excluded.data', (name, json.dumps(value)))
+            self.con.commit()
+
+    def put(self, collection, records):
+        """Add or replace records. Replaced records keep their position.
+
+        :param collection: The collection.
+        :type collection: str
+        :param records: The records by key.
+        :type records: dict
+        """
+        if len(records) == 0:
+            return
+        with self._lock:
+            self.con.executemany('INSERT INTO records (collection, key, data) VALUES (?, ?, ?) '
+                'ON CONFLICT(collection, key) DO UPDATE SET data = excluded.data',
+                [(collection, key, json.dumps(record)) for key, record in records.items()])
+            self.con.commit()
+
+    def get(self, collection, key, default=None):
+        """Get a record"""
+        rows = self._query('SELECT data FROM records WHERE collection = ? AND key = ?', (collection, key))
+        return default if len(rows) == 0 else json.loads(rows[0][0])
+
+    def has(self, collection, key):
+        """Check if a record exists"""
+        return len(self._query('SELECT 1 FROM records WHERE collection = ? AND key = ?', (collection, key))) > 0
+
+    def count(self, collection):
+        """Get the number of records of a collection"""
+        return self._query('SELECT COUNT(*) FROM records WHERE collection = ?', (collection,))[0][0]
+
+    def keys(self, collection):
+        """Iterate on the keys of a collection in the order they were added"""
+        for row in self._query('SELECT key FROM records WHERE collection = ? ORDER BY id', (collection,)):
+            yield row[0]
+
+    def items(self, collection, page_size=1024):
+        """Stream the records of a collection in the order they were added"""
+        last = -1
+        while True:
+            rows = self._query('SELECT id, key, data FROM records WHERE collection = ? AND id > ? '
+                'ORDER BY id LIMIT ?', (collection, last, page_size))
+            for row in rows:
+                yield row[1], json.loads(row[2])
+            if len(rows) < page_size:
+                return
+            last = rows[-1][0]
+
+    def records(self, collection):
+        """Get a read only dict of the records of a collection"""
+        return OSIntBSkyRecords(self, collection)
+
+    def diffs(self):
+        """Get the diffs by date"""
+        return {date: json.loads(data) for date, data in
+            self._query('SELECT date, data FROM diff ORDER BY CAST(date AS REAL)')}
+
+    def add_diff(self, date, diff):
+        """Log a diff"""
+        with self._lock:
+            self.con.execute('INSERT OR REPLACE INTO diff (date, data) VALUES (?, ?)',
+                (str(date), json.dumps(diff)))
+            self.con.commit()
+
+    def clean_diffs(self):
+        """Remove the empty diffs"""
+        with self._lock:
+            self.con.execute("DELETE FROM diff WHERE data = '{}'")
+            self.con.commit()
+
+    def array(self, name, version):
+        """Get the bytes of a cached array if it is still at version"""
+        rows = self._query('SELECT data FROM arrays WHERE name = ? AND version = ?', (name, version))
+        return None if len(rows) == 0 else rows[0][0]
+
+    def set_array(self, name, version, data):
+        """Cache the bytes of an array computed from the records"""
+        with self._lock:
+            self.con.execute('INSERT OR REPLACE INTO arrays (name, version, data) VALUES (?, ?, ?)',
+                (name, version, data))
+            self.con.commit()
+
+    def view(self):
+        """Get the data as a dict like the one of the json file.
+        Collections are read only dicts, read from the store when accessed."""
+        ret = {'profile': {}}
+        ret.update(self.headers())
+        for collection in self.collections:
+            ret[collection] = self.records(collection)
+        ret['diff'] = self.diffs()
+        return ret
+
+    def load(self):
+        """Load all the data in a dict like the one of the json file"""
+        ret = self.view()
+        for collection in self.collections:
+            ret[collection] = dict(self.items(collection))
+        return ret
+
+    def dump(self, data):
+        """Replace all the data with the one of a dict like the one of the json file"""
+        with self._lock:
+            con = self.con
+            con.execute('DELETE FROM header')
+            con.execute('DELETE FROM records')
+            con.execute('DELETE FROM diff')
+            con.execute('DELETE FROM arrays')
+            con.executemany('INSERT INTO header (name, data) VALUES (?, ?)',
+                [(name, json.dumps(value)) for name, value in data.items()
+                    if name not in self.collections and name != 'diff'])
+            for collection in self.collections:
+                con.executemany('INSERT INTO records (collection, key, data) VALUES (?, ?, ?)',
+                    [(collection, key, json.dumps(record))
+                        for key, record in data.get(collection, {}).items()])
+            con.executemany('INSERT INTO diff (date, data) VALUES (?, ?)',
+                [(str(date), json.dumps(diff)) for date, diff in data.get('diff', {}).items()])
+            con.commit()
+
+
+class OSIntBSkyRateLimiter():
+
+    def __init__(self, rate):
+        """Space the requests of all the threads sharing it
+
+        :param rate: The max number of requests by second. 0 or None for no limit.
+        :type rate: float
+        """
+        self.delay = 1 / rate if rate else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Sleep until a request is allowed"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.delay
+        if start > now:
+            time.sleep(start - now)
+
+
 class OSIntBSkyProfile(OSIntItem, BSkyInterface):
 
     prefix = 'bskyprofile'
     min_text_for_ai = 30
     pool_processes = 9
+    #: The number of posts given to the AI classifier in one call
+    ai_batch_size = 32
+    #: Write the json after this number of posts classified
+    checkpoint_posts = 512
+    #: The fields of the posts set by analyse_account
+    account_post_fields = ('mood', 'insults', 'profanity_flag', 'toxicity', 'toxicity_flag')
 
     #: Small built-in bilingual base list used by :meth:`analyse_account` to
     #: count insults/swearwords. Extend it per-project with the
@@ -900,42 +1170,70 @@ class OSIntBSkyProfile(OSIntItem, BSkyInterface):
         return self._cats
 
     @classmethod
-    def analyse_one(cls, data, key, classifier, spell, bsky_lang):
-        # ~ tool = cls._imp_language_tool_python.LanguageTool('%s-%s' % (bsky_lang, bsky_lang.upper()))
-        # ~ spell = cls._imp_spellchecker.SpellChecker(language=bsky_lang)
-        # ~ classifier = cls._imp_transformers.pipeline("text-classification",
-                     # ~ model="roberta-base-openai-detector")
-
-        if 'created_at' in data['feeds'][key] and 'reply_created_at' in data['feeds'][key] and \
-          data['feeds'][key]['created_at'] is not None and data['feeds'][key]['reply_created_at'] is not None and \
-          'response_time' not in data['feeds'][key]:
-            created_at = cls._imp_dateutil_parser.parse(data['feeds'][key]['created_at'])
-            reply_created_at = cls._imp_dateutil_parser.parse(data['feeds'][key]['reply_created_at'])
-            result = (created_at - reply_created_at).total_seconds()
-            data['feeds'][key]['response_time'] = result
-
-        if 'text' in data['feeds'][key] and data['feeds'][key]['text'] is not None and \
-          'ai_result' not in data['feeds'][key]:
-            if len(data['feeds'][key]['text']) > cls.min_text_for_ai:
-                result = classifier(data['feeds'][key]['text'])
-            else:
-                result = {
-                    'label': 'Too short',
-                    'score': 0,
-                }
-            data['feeds'][key]['ai_result'] = result
-
-        if 'text' in data['feeds'][key] and data['feeds'][key]['text'] is not None and \
-                'spell' not in data['feeds'][key]:
-            data['feeds'][key]['spell'] = []
+    def analyse_post(cls, post, spell):
+        """Compute the response time and the spelling errors of a post
+
+        :param post: The post from the feeds of the json.
+        :type post: dict
+        :param spell: The spellchecker.
+        :type spell: SpellChecker
+        :returns: the fields to update in the post
+        :rtype: dict
+        """
+        ret = {}
+        if 'created_at' in post and 'reply_created_at' in post and \
+          post['created_at'] is not None and post['reply_created_at'] is not None and \
+          'response_time' not in post:
+            created_at = cls._imp_dateutil_parser.parse(post['created_at'])
+            reply_created_at = cls._imp_dateutil_parser.parse(post['reply_created_at'])
+            ret['response_time'] = (created_at - reply_created_at).total_seconds()
+
+        if 'text' in post and post['text'] is not None and 'spell' not in post:
+            ret['spell'] = []
             try:
-                # ~ lang = cls._imp_langdetect.detect(data['feeds'][key]['text'])
-                # ~ spell = cls._imp_spellchecker.SpellChecker(language=lang)
-                words = cls._imp_re.findall(r'\b[a-zA-ZàâäéèêëïîôöùûüÿñçÀÂÄÉÈÊËÏÎÔÖÙÛÜŸÑÇ]+\b', data['feeds'][key]['text'].lower())
+                words = cls._imp_re.findall(r'\b[a-zA-ZàâäéèêëïîôöùûüÿñçÀÂÄÉÈÊËÏÎÔÖÙÛÜŸÑÇ]+\b', post['text'].lower())
                 failed = spell.unknown(words)
-                data['feeds'][key]['spell'] = [w for w in failed if len(w) > 3]
+                ret['spell'] = [w for w in failed if len(w) > 3]
             except cls._imp_langdetect.lang_detect_exception.LangDetectException:
                 log.exception("Problem spelling text")
+        return ret
+
+    @classmethod
+    def classify_texts(cls, classifier, texts):
+        """Classify texts as generated by AI or not in one call of the classifier
+
+        :param classifier: The text-classification pipeline.
+        :type classifier: Pipeline
+        :param texts: The texts.
+        :type texts: list of str
+        :returns: a dict with label and score for each text
+        :rtype: list of dict
+        """
+        ret = []
+        idxs = []
+        for i, text in enumerate(texts):
+            if len(text) > cls.min_text_for_ai:
+                idxs.append(i)
+                ret.append(None)
+            else:
+                ret.append({
+                    'label': 'Too short',
+                    'score': 0,
+                })
+        if len(idxs) > 0:
+            results = classifier([texts[i] for i in idxs], batch_size=len(idxs), truncation=True)
+            for i, result in zip(idxs, results):
+                ret[i] = result
+        return ret
+
+    @classmethod
+    def analyse_one(cls, data, key, classifier, spell, bsky_lang):
+        """Analyse a post of the json"""
+        post = data['feeds'][key]
+        post.update(cls.analyse_post(post, spell))
+        if 'text' in post and post['text'] is not None and 'ai_result' not in post:
+            post['ai_result'] = cls.classify_texts(classifier, [post['text']])[0]
+
             # ~ try:
                 # ~ ## ~ lang = cls._imp_langdetect.detect(data['feeds'][key]['text'])
                 # ~ ## ~ spell = cls._imp_spellchecker.SpellChecker(language=lang)
@@ -967,17 +1265,22 @@ class OSIntBSkyProfile(OSIntItem, BSkyInterface):
         Runs the AI-generated-text classifier and the spellchecker over every
         post in the account's stored feed (skipping ones already analysed),
         writes the per-post ``ai_result``/``spell``/``response_time`` fields
-        back into the account's json file, and returns a short summary dict
+        back into the account's store, and returns a short summary dict
         (it used to always return ``None``, the summary was computed but
         thrown away).
 
+        The feeds are read from the store by batches of :attr:`checkpoint_posts`
+        posts, classified by batches of :attr:`ai_batch_size` and the changed
+        posts of a batch are written before the next one is read, so an
+        interrupted analyse resumes where it stopped.
+
         :returns: ``{'did', 'posts_analysed', 'ai_generated': {...},
             'spelling': {...}, 'response_time': {...}}``.
         :rtype: dict
         """
         if did is None:
             did = cls.name
-        path, data = cls.load_json(did=did, osint_bsky_store=osint_bsky_store, osint_bsky_cache=osint_bsky_cache)
+        store = cls.open_store(did=did, osint_bsky_store=osint_bsky_store, osint_bsky_cache=osint_bsky_cache)
         bsky_lang = cls.get_config('osint_text_translate', osint_text_translate)
         spell = cls._imp_spellchecker.SpellChecker(language=bsky_lang)
         # ~ rouge = cls._imp_rouge.Rouge()
@@ -985,61 +1288,8 @@ class OSIntBSkyProfile(OSIntItem, BSkyInterface):
         # ~ bsky_ai = cls.get_config('osint_bsky_ai', osint_bsky_ai)
         # ~ feeds_response_time = []
         # ~ feeds_ia = []
-        classifier = cls._imp_transformers.pipeline("text-classification",
-                     model="roberta-base-openai-detector")
-        with cls._imp_multiprocessing_pool.ThreadPool(processes=cls.pool_processes) as pool:
-            for key in data['feeds']:
-                pool.apply(cls.analyse_one, [data, key, classifier, spell, bsky_lang])
-            # ~ analyse_one(cls, data, key, bsky_lang)
-            # ~ if 'created_at' in data['feeds'][key] and 'reply_created_at' in data['feeds'][key] and \
-              # ~ data['feeds'][key]['created_at'] is not None and data['feeds'][key]['reply_created_at'] is not None and \
-              # ~ 'response_time' not in data['feeds'][key]:
-                # ~ created_at = cls._imp_dateutil_parser.parse(data['feeds'][key]['created_at'])
-                # ~ reply_created_at = cls._imp_dateutil_parser.parse(data['feeds'][key]['reply_created_at'])
-                # ~ result = (created_at - reply_created_at).total_seconds()
-                # ~ data['feeds'][key]['response_time'] = result
-
-            # ~ if 'text' in data['feeds'][key] and data['feeds'][key]['text'] is not None and \
-              # ~ 'ai_result' not in data['feeds'][key]:
-                # ~ if len(data['feeds'][key]['text']) > cls.min_text_for_ai:
-                    # ~ result = classifier(data['feeds'][key]['text'])
-                # ~ else:
-                    # ~ result = {
-                        # ~ 'label': 'Too short',
-                        # ~ 'score': 0,
-                    # ~ }
-                # ~ data['feeds'][key]['ai_result'] = result
-
-            # ~ if 'text' in data['feeds'][key] and data['feeds'][key]['text'] is not None and \
-                    # ~ 'spell_result' not in data['feeds'][key]:
-                # ~ data['feeds'][key]['spell_result'] = {
-                    # ~ 'speller': [],
-                    # ~ 'tool': [],
-                # ~ }
-                # ~ try:
-                    # ~ ## ~ lang = cls._imp_langdetect.detect(data['feeds'][key]['text'])
-                    # ~ ## ~ spell = cls._imp_spellchecker.SpellChecker(language=lang)
-                    # ~ words = cls._imp_re.findall(r'\b[a-zA-ZàâäéèêëïîôöùûüÿñçÀÂÄÉÈÊËÏÎÔÖÙÛÜŸÑÇ]+\b', data['feeds'][key]['text'].lower())
-                    # ~ failed = spell.unknown(words)
-                    # ~ data['feeds'][key]['spell_result']['speller'] = [w for w in failed if len(w) > 3]
-                # ~ except cls._imp_langdetect.lang_detect_exception.LangDetectException:
-                    # ~ logger.exception("Problem spelling text")
-                # ~ try:
-                    # ~ ## ~ lang = cls._imp_langdetect.detect(data['feeds'][key]['text'])
-                    # ~ ## ~ spell = cls._imp_spellchecker.SpellChecker(language=lang)
-                    # ~ text = data['feeds'][key]['text'].lower()
-                    # ~ matches = tool.check(text)
-                    # ~ failed = []
-                    # ~ for match in matches:
-                        # ~ failed += [(text[match.offset:match.offset + match.errorLength], match.category)]
-                    # ~ data['feeds'][key]['spell_result']['tool'] = failed
-                # ~ except cls._imp_langdetect.lang_detect_exception.LangDetectException:
-                    # ~ logger.exception("Problem spelling text")
-
-        # ~ feeds_response_variance = cls._imp_numpy.var(feeds_response_time)
-        # ~ pool.join()
-        cls.dump_json(data, filename=path)
-
+        classifier = None
+        n_posts = 0
         ai_labels = cls._imp_collections.Counter()
         ai_scored = 0
         ai_too_short = 0
@@ -1047,27 +1297,63 @@ class OSIntBSkyProfile(OSIntItem, BSkyInterface):
         posts_with_spell_errors = 0
         response_times = []
 
-        for post in data['feeds'].values():
-            ai_result = post.get('ai_result')
-            if isinstance(ai_result, dict) and 'label' in ai_result:
-                ai_labels[ai_result['label']] += 1
-                if ai_result['label'] == 'Too short':
-                    ai_too_short += 1
-                else:
-                    ai_scored += 1
-
-            spell = post.get('spell')
-            if spell:
-                spell_errors_total += len(spell)
-                posts_with_spell_errors += 1
-
-            response_time = post.get('response_time')
-            if response_time is not None:
-                response_times.append(response_time)
+        records = store.items('feeds')
+        with cls._imp_multiprocessing_pool.ThreadPool(processes=cls.pool_processes) as pool:
+            while True:
+                feeds = dict(itertools.islice(records, cls.checkpoint_posts))
+                if len(feeds) == 0:
+                    break
+                n_posts += len(feeds)
+                # Only the changed posts are written back to the store
+                changed = set()
+                for key, update in pool.imap_unordered(
+                        lambda key: (key, cls.analyse_post(feeds[key], spell)),
+                        list(feeds.keys()), chunksize=64):
+                    if len(update) > 0:
+                        feeds[key].update(update)
+                        changed.add(key)
+
+                for key, post in feeds.items():
+                    # Old classifications were stored in a list
+                    if isinstance(post.get('ai_result'), list) and len(post['ai_result']) == 1:
+                        post['ai_result'] = post['ai_result'][0]
+                        changed.add(key)
+                # Posts already classified are skipped : an interrupted analyse resumes
+                keys = [key for key in feeds if 'text' in feeds[key] and feeds[key]['text'] is not None and
+                    'ai_result' not in feeds[key]]
+                if len(keys) > 0 and classifier is None:
+                    classifier = cls._imp_transformers.pipeline("text-classification",
+                                 model="roberta-base-openai-detector")
+                for i in range(0, len(keys), cls.ai_batch_size):
+                    batch = keys[i:i + cls.ai_batch_size]
+                    results = cls.classify_texts(classifier, [feeds[key]['text'] for key in batch])
+                    for key, result in zip(batch, results):
+                        feeds[key]['ai_result'] = result
+                        changed.add(key)
+                store.put('feeds', {key: feeds[key] for key in changed})
+
+                for post in feeds.values():
+                    ai_result = post.get('ai_result')
+                    if isinstance(ai_result, dict) and 'label' in ai_result:
+                        ai_labels[ai_result['label']] += 1
+                        if ai_result['label'] == 'Too short':
+                            ai_too_short += 1
+                        else:
+                            ai_scored += 1
+
+                    post_spell = post.get('spell')
+                    if post_spell:
+                        spell_errors_total += len(post_spell)
+                        posts_with_spell_errors += 1
+
+                    response_time = post.get('response_time')
+                    if response_time is not None:
+                        response_times.append(response_time)
+        store.close()
 
         return {
             'did': did,
-            'posts_analysed': len(data['feeds']),
+            'posts_analysed': n_posts,
             'ai_generated': {
                 # actually classified (label 'Real' or 'Fake')
                 'posts_scored': ai_scored,
@@ -1136,7 +1422,8 @@ class OSIntBSkyProfile(OSIntItem, BSkyInterface):
         """
         if did is None:
             did = cls.name
-        _, data = cls.load_json(did=did, osint_bsky_store=osint_bsky_store, osint_bsky_cache=osint_bsky_cache)
+        store = cls.open_store(did=did, osint_bsky_store=osint_bsky_store, osint_bsky_cache=osint_bsky_cache)
+        data = store.view()
 
         cls.init_nltk()
         stopwords = set()
@@ -1156,9 +1443,65 @@ class OSIntBSkyProfile(OSIntItem, BSkyInterface):
             for word in word_re.findall(text.lower()):
                 if len(word) >= min_word_len and word not in stopwords:
                     counter[word] += 1
+        store.close()
 
         return counter.most_common(top_words)
 
+    @classmethod
+    def parse_date(cls, value):
+        """Parse a date of the api. iso dates don't need dateutil."""
+        try:
+            return datetime.datetime.fromisoformat(value)
+        except ValueError:
+            return cls._imp_dateutil_parser.parse(value)
+
+    @classmethod
+    def local_seconds(cls, date):
+        """Get the seconds since epoch of a date in its own timezone,
+        so hours and days are the ones of the date."""
+        return (date.replace(tzinfo=None) - datetime.datetime(1970, 1, 1)).total_seconds()
+
+    @classmethod
+    def did_id(cls, did):
+        """Get a 63 bits integer for a did, to compare networks as arrays"""
+        return int.from_bytes(hashlib.blake2b(did.encode(), digest_size=8).digest(), 'little') >> 1
+
+    @classmethod
+    def network_ids(cls, store, collection):
+        """Get the sorted ids (see :meth:`did_id`) of the followers or the follows of a profile.
+        The array is cached in the store until new records are collected.
+
+        :param store: The store of the profile.
+        :type store: OSIntBSkyStore
+        :param collection: followers or follows.
+        :type collection: str
+        :rtype: numpy.ndarray
+        """
+        np = cls._imp_numpy
+        count = store.count(collection)
+        data = store.array(f'ids.{collection}', count)
+        if data is not None:
+            return np.frombuffer(data, dtype=np.int64)
+        ids = np.unique(np.fromiter((cls.did_id(did) for did in store.keys(collection)), dtype=np.int64))
+        store.set_array(f'ids.{collection}', count, ids.tobytes())
+        return ids
+
+    @classmethod
+    def has_store(cls, did, osint_bsky_store=None, osint_bsky_cache=None):
+        """Check that data were collected for a profile"""
+        return any(os.path.isfile(cls.store_path(did, osint_bsky_store=osint_bsky_store,
+            osint_bsky_cache=osint_bsky_cache, ext=ext)) for ext in ('sqlite', 'json'))
+
+    @classmethod
+    def quest_dids(cls, quest):
+        """Get the dids of the bsky profiles tracked in a quest
+
+        :returns: the names of the profiles by did
+        :rtype: dict
+        """
+        return {cls.normalize_did(name.replace(f'{cls.prefix}.', '', 1)): name
+            for name in quest.bskyprofiles}
+
     @classmethod
     def common_network(cls, quest, did=None, osint_bsky_store=None, osint_bsky_cache=None):
         """Find, among the other bsky accounts already tracked in the quest,
@@ -1166,9 +1509,10 @@ class OSIntBSkyProfile(OSIntItem, BSkyInterface):
 
         Compares this account's stored followers/follows (collected by
         :meth:`update`) against every other :class:`OSIntBSkyProfile` already
-        present in the quest, also read from their own stored json. Useful
-        for a quick network map: shared followers/follows across several
-        tracked accounts often points to a coordinated group.
+        present in the quest, as the sorted arrays of :meth:`network_ids`
+        cached in their stores. Useful for a quick network map: shared
+        followers/follows across several tracked accounts often points to a
+        coordinated group. See :meth:`coordination_matrix` for all the pairs.
 
         :param quest: the :class:`~sphinxcontrib.osint.osintlib.OSIntQuest`
             holding the other tracked bsky profiles (``quest.bskyprofiles``).
@@ -1190,40 +1534,126 @@ class OSIntBSkyProfile(OSIntItem, BSkyInterface):
             raise RuntimeError("A quest is required to enumerate the other tracked bsky profiles")
         if did is None:
             did = cls.name
+        np = cls._imp_numpy
+        collections = ('followers', 'follows')
 
-        _, data = cls.load_json(did=did, osint_bsky_store=osint_bsky_store, osint_bsky_cache=osint_bsky_cache)
-        my_followers = set(data.get('followers', {}).keys())
-        my_follows = set(data.get('follows', {}).keys())
+        store = cls.open_store(did=did, osint_bsky_store=osint_bsky_store, osint_bsky_cache=osint_bsky_cache)
+        mine = {collection: cls.network_ids(store, collection) for collection in collections}
 
-        results = []
-        for name, other in quest.bskyprofiles.items():
-            other_did = other.name
-            if other_did == did:
+        commons = []
+        for other_did, name in cls.quest_dids(quest).items():
+            if other_did == did or cls.has_store(other_did, osint_bsky_store=osint_bsky_store,
+                    osint_bsky_cache=osint_bsky_cache) is False:
                 continue
             try:
-                _, odata = cls.load_json(did=other_did, osint_bsky_store=osint_bsky_store,
+                ostore = cls.open_store(did=other_did, osint_bsky_store=osint_bsky_store,
                     osint_bsky_cache=osint_bsky_cache)
+                common = {collection: np.intersect1d(mine[collection], cls.network_ids(ostore, collection),
+                    assume_unique=True) for collection in collections}
+                ostore.close()
             except Exception:
                 log.warning("Can't load stored data for %s, skipping", other_did)
                 continue
-
-            common_followers = my_followers & set(odata.get('followers', {}).keys())
-            common_follows = my_follows & set(odata.get('follows', {}).keys())
-            if not common_followers and not common_follows:
+            if all(len(ids) == 0 for ids in common.values()):
                 continue
+            commons.append((other_did, name, common))
+
+        # Get back the dids of the ids in common only
+        dids = {}
+        for collection in collections:
+            wanted = set()
+            for _, _, common in commons:
+                wanted.update(common[collection].tolist())
+            dids[collection] = {}
+            if len(wanted) > 0:
+                for key in store.keys(collection):
+                    key_id = cls.did_id(key)
+                    if key_id in wanted:
+                        dids[collection][key_id] = key
+        store.close()
 
+        results = []
+        for other_did, name, common in commons:
+            common_followers = sorted(dids['followers'][i] for i in common['followers'].tolist())
+            common_follows = sorted(dids['follows'][i] for i in common['follows'].tolist())
             results.append({
                 'did': other_did,
                 'name': name,
-                'common_followers': sorted(common_followers),
+                'common_followers': common_followers,
                 'common_followers_count': len(common_followers),
-                'common_follows': sorted(common_follows),
+                'common_follows': common_follows,
                 'common_follows_count': len(common_follows),
             })
 
         results.sort(key=lambda r: r['common_followers_count'] + r['common_follows_count'], reverse=True)
         return results
 
+    @classmethod
+    def overlap_matrix(cls, arrays, chunk_size=65536):
+        """Count the values shared by each pair of arrays in one pass.
+
+        :param arrays: Arrays of unique values.
+        :type arrays: list of numpy.ndarray
+        :param chunk_size: The number of shared values multiplied at once.
+        :type chunk_size: int
+        :returns: a square matrix, its diagonal holds the sizes of the arrays
+        :rtype: numpy.ndarray
+        """
+        np = cls._imp_numpy
+        n = len(arrays)
+        sizes = [len(array) for array in arrays]
+        ret = np.zeros((n, n), dtype=np.int64)
+        if sum(sizes) > 0:
+            values = np.concatenate(arrays)
+            owners = np.repeat(np.arange(n), sizes)
+            _, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+            inverse = inverse.reshape(-1)
+            # Only the values of several arrays are counted outside of the diagonal
+            shared = counts[inverse] > 1
+            rows = np.unique(inverse[shared], return_inverse=True)[1].reshape(-1)
+            owners = owners[shared]
+            n_rows = int(rows.max()) + 1 if len(rows) > 0 else 0
+            for start in range(0, n_rows, chunk_size):
+                mask = (rows >= start) & (rows < start + chunk_size)
+                incidence = np.zeros((min(chunk_size, n_rows - start), n), dtype=np.float32)
+                incidence[rows[mask] - start, owners[mask]] = 1
+                ret += np.rint(incidence.T @ incidence).astype(np.int64)
+        ret[np.diag_indices(n)] = sizes
+        return ret
+
+    @classmethod
+    def coordination_matrix(cls, dids, osint_bsky_store=None, osint_bsky_cache=None):
+        """Count the followers and the follows shared by all the pairs of profiles.
+        A group of profiles sharing a large part of their network may be coordinated.
+
+        :param dids: The dids of the profiles.
+        :type dids: list of str
+        :param osint_bsky_store: override for the store dir.
+        :param osint_bsky_cache: override for the cache dir.
+        :returns: ``{'dids': [...], 'followers': {'common': matrix, 'jaccard': matrix},
+            'follows': {...}}``. The diagonal of ``common`` holds the size of the network
+            of each profile.
+        :rtype: dict
+        """
+        np = cls._imp_numpy
+        ret = {'dids': list(dids)}
+        ids = {'followers': [], 'follows': []}
+        for did in dids:
+            store = cls.open_store(did=did, osint_bsky_store=osint_bsky_store, osint_bsky_cache=osint_bsky_cache)
+            for collection in ids:
+                ids[collection].append(cls.network_ids(store, collection))
+            store.close()
+        for collection in ids:
+            common = cls.overlap_matrix(ids[collection])
+            sizes = np.diag(common)
+            union = sizes[:, None] + sizes[None, :] - common
+            jaccard = np.divide(common, union, out=np.zeros(common.shape), where=union > 0)
+            ret[collection] = {
+                'common': common.tolist(),
+                'jaccard': jaccard.round(4).tolist(),
+            }
+        return ret
+
     @classmethod
     def analyse_account(cls, did=None, osint_bsky_store=None, osint_bsky_cache=None,
             osint_bsky_swearwords=None, top_words=None, min_word_len=3,
@@ -1276,7 +1706,7 @@ class OSIntBSkyProfile(OSIntItem, BSkyInterface):
           account has in common with other bsky accounts already tracked in
           the quest (see :meth:`common_network`).
 
-        The result is written back into the account's json file under the
+        The result is written back into the account's store under the
         ``account_analysis`` key (so it also shows up next to ``update``'s
         ``diff`` output), and is returned as a plain dict, which makes this
         method usable both from the ``osint_bscript`` CLI and directly from
@@ -1327,8 +1757,9 @@ class OSIntBSkyProfile(OSIntItem, BSkyInterface):
         if did is None:
             did = cls.name
 
-        path, data = cls.load_json(did=did, osint_bsky_store=osint_bsky_store,
+        store = cls.open_store(did=did, osint_bsky_store=osint_bsky_store,
             osint_bsky_cache=osint_bsky_cache)
+        data = store.view()
 
         if not data.get('feeds'):
             log.warning("No feeds found for %s, run 'update' first", did)
@@ -1368,22 +1799,27 @@ class OSIntBSkyProfile(OSIntItem, BSkyInterface):
         toxicity_label_totals = cls._imp_collections.Counter()
         posts_flagged_toxic = 0
         n_toxicity_scored = 0
-        timestamps = []
-        moods = []
         n_posts = 0
 
-        moods_by_kind = {'post': [], 'reply': []}
-        n_by_kind = {'post': 0, 'reply': 0}
+        # The per post values are collected in columns, aggregated with numpy
+        np = cls._imp_numpy
+        moods = []
+        replies = []
+        insulted = []
+        timestamps = []
+        latencies = []
         toxicity_by_kind = {
             'post': {'scored': 0, 'flagged': 0},
             'reply': {'scored': 0, 'flagged': 0},
         }
+        changed = {}
 
         for key, post in data.get('feeds', {}).items():
             text = post.get('text')
             if not text:
                 continue
             n_posts += 1
+            previous = [post.get(field) for field in cls.account_post_fields]
 
             # 'is_reply' is set by update() for feeds collected after this
             # was added; fall back to the presence of 'reply_did' for data
@@ -1392,12 +1828,11 @@ class OSIntBSkyProfile(OSIntItem, BSkyInterface):
             if is_reply is None:
                 is_reply = bool(post.get('reply_did'))
             kind = 'reply' if is_reply else 'post'
-            n_by_kind[kind] += 1
+            replies.append(is_reply)
 
             score = analyzer.polarity_scores(text)
             post['mood'] = score
             moods.append(score['compound'])
-            moods_by_kind[kind].append(score['compound'])
 
             words = [w.lower() for w in word_re.findall(text)]
             post_insults = sorted({w for w in words if w in swearwords})
@@ -1406,6 +1841,9 @@ class OSIntBSkyProfile(OSIntItem, BSkyInterface):
                 insult_counter[w] += 1
             if profanity.contains_profanity(text):
                 post['profanity_flag'] = True
+            # a post "has insults" either because it matched our explicit list,
+            # or because the profanity heuristic flagged it
+            insulted.append(bool(post.get('insults') or post.get('profanity_flag')))
 
             if include_toxicity:
                 try:
@@ -1449,39 +1887,36 @@ class OSIntBSkyProfile(OSIntItem, BSkyInterface):
             created_at = post.get('created_at')
             if created_at:
                 try:
-                    timestamps.append(cls._imp_dateutil_parser.parse(created_at))
+                    timestamps.append(cls.local_seconds(cls.parse_date(created_at)))
                 except Exception:
                     log.warning("Can't parse created_at %r for %s", created_at, did)
-
-        # a post "has insults" either because it matched our explicit list,
-        # or because the profanity heuristic flagged it
-        posts_with_insults = sum(
-            1 for post in data['feeds'].values()
-            if post.get('insults') or post.get('profanity_flag')
-        )
-
-        posts_with_insults_by_kind = {'post': 0, 'reply': 0}
-        for post in data['feeds'].values():
-            if not post.get('text'):
-                continue
-            is_reply = post.get('is_reply')
-            if is_reply is None:
-                is_reply = bool(post.get('reply_did'))
-            kind = 'reply' if is_reply else 'post'
-            if post.get('insults') or post.get('profanity_flag'):
-                posts_with_insults_by_kind[kind] += 1
+            if is_reply and post.get('response_time') is not None:
+                latencies.append(post['response_time'])
+
+            # The posts are read from the store : write back the changed ones
+            if previous != [post.get(field) for field in cls.account_post_fields]:
+                changed[key] = post
+            if len(changed) >= cls.checkpoint_posts:
+                store.put('feeds', changed)
+                changed = {}
+        store.put('feeds', changed)
+
+        moods = np.array(moods, dtype=np.float64)
+        replies = np.array(replies, dtype=bool)
+        insulted = np.array(insulted, dtype=bool)
+        posts_with_insults = int(insulted.sum())
 
         by_kind = {}
-        for kind in ('post', 'reply'):
-            n_kind = n_by_kind[kind]
-            kind_moods = moods_by_kind[kind]
-            kind_avg_mood = sum(kind_moods) / len(kind_moods) if kind_moods else 0.0
+        for kind, mask in (('post', ~replies), ('reply', replies)):
+            n_kind = int(mask.sum())
+            kind_avg_mood = float(moods[mask].mean()) if n_kind else 0.0
             if kind_avg_mood >= 0.2:
                 kind_mood_label = 'positive'
             elif kind_avg_mood <= -0.2:
                 kind_mood_label = 'negative'
             else:
                 kind_mood_label = 'neutral'
+            kind_insults = int(insulted[mask].sum())
 
             by_kind[kind] = {
                 'count': n_kind,
@@ -1490,8 +1925,8 @@ class OSIntBSkyProfile(OSIntItem, BSkyInterface):
                     'label': kind_mood_label,
                 },
                 'insults': {
-                    'posts_with_insults': posts_with_insults_by_kind[kind],
-                    'ratio': (posts_with_insults_by_kind[kind] / n_kind) if n_kind else 0.0,
+                    'posts_with_insults': kind_insults,
+                    'ratio': (kind_insults / n_kind) if n_kind else 0.0,
                 },
             }
             if include_toxicity:
@@ -1503,7 +1938,7 @@ class OSIntBSkyProfile(OSIntItem, BSkyInterface):
                     'ratio_flagged': (flagged / scored) if scored else 0.0,
                 }
 
-        avg_mood = sum(moods) / len(moods) if moods else 0.0
+        avg_mood = float(moods.mean()) if len(moods) else 0.0
         if avg_mood >= 0.2:
             mood_label = 'positive'
         elif avg_mood <= -0.2:
@@ -1522,12 +1957,20 @@ class OSIntBSkyProfile(OSIntItem, BSkyInterface):
 
         rhythm = None
         if include_rhythm:
-            by_hour = cls._imp_collections.Counter(ts.hour for ts in timestamps)
-            by_weekday = cls._imp_collections.Counter(ts.weekday() for ts in timestamps)
+            timestamps = np.array(timestamps, dtype=np.float64)
+            by_hour = np.bincount((timestamps // 3600 % 24).astype(np.int64), minlength=24)
+            # 1970-01-01 was a thursday
+            by_weekday = np.bincount(((timestamps // 86400 + 3) % 7).astype(np.int64), minlength=7)
+            latencies = np.array(latencies, dtype=np.float64)
             rhythm = {
                 'posts_with_timestamp': len(timestamps),
-                'by_hour': {h: by_hour.get(h, 0) for h in range(24)},
-                'by_weekday': {cls.weekday_names[d]: by_weekday.get(d, 0) for d in range(7)},
+                'by_hour': {h: int(by_hour[h]) for h in range(24)},
+                'by_weekday': {cls.weekday_names[d]: int(by_weekday[d]) for d in range(7)},
+                'reply_latency': {
+                    'replies_with_timing': len(latencies),
+                    'median_seconds': float(np.median(latencies)) if len(latencies) else None,
+                    'p90_seconds': float(np.percentile(latencies, 90)) if len(latencies) else None,
+                },
             }
 
         toxicity_report = None
@@ -1590,25 +2033,27 @@ class OSIntBSkyProfile(OSIntItem, BSkyInterface):
                 cluster_ratio = 0.02
 
             n_followers = len(data.get('followers', {}))
-            creation_days = cls._imp_collections.Counter()
+            creation_days = []
             for follower in data.get('followers', {}).values():
                 created_at = follower.get('created_at')
                 if not created_at:
                     continue
                 try:
-                    day = cls._imp_dateutil_parser.parse(created_at).date().isoformat()
-                    creation_days[day] += 1
+                    creation_days.append(cls.parse_date(created_at).toordinal())
                 except Exception:
                     log.warning("Can't parse follower created_at %r for %s", created_at, did)
+            days, counts = np.unique(np.array(creation_days, dtype=np.int64), return_counts=True)
+            mask = counts >= cluster_size
+            if n_followers != 0:
+                mask &= counts / n_followers >= cluster_ratio
 
             suspicious_clusters = sorted((
                 {
-                    'date': day,
-                    'accounts_created': count,
-                    'ratio_of_followers': (count / n_followers) if n_followers else 0.0,
+                    'date': datetime.date.fromordinal(int(day)).isoformat(),
+                    'accounts_created': int(count),
+                    'ratio_of_followers': (int(count) / n_followers) if n_followers else 0.0,
                 }
-                for day, count in creation_days.items()
-                if count >= cluster_size and (n_followers == 0 or count / n_followers >= cluster_ratio)
+                for day, count in zip(days[mask], counts[mask])
             ), key=lambda c: c['accounts_created'], reverse=True)
 
             network = {
@@ -1655,8 +2100,8 @@ class OSIntBSkyProfile(OSIntItem, BSkyInterface):
             'rhythm': rhythm,
         }
 
-        data['account_analysis'] = analysis
-        cls.dump_json(data, filename=path)
+        store.set_header('account_analysis', analysis)
+        store.close()
 
         return analysis
 
@@ -1677,7 +2122,7 @@ class OSIntBSkyProfile(OSIntItem, BSkyInterface):
 
     @classmethod
     def get_feeds(cls, user=None, apikey=None, did=None, url=None, cursor=None, limit=None,
-            feed_filter='posts_with_replies'):
+            feed_filter='posts_with_replies', client=None):
         """Get an account's feed.
 
         :param feed_filter: which posts to fetch, forwarded as-is to the
@@ -1688,7 +2133,8 @@ class OSIntBSkyProfile(OSIntItem, BSkyInterface):
             ``posts_and_author_threads``. Made explicit here rather than
             relying on whatever the atproto client's own default is.
         """
-        client = cls.get_bsky_client(user=user, apikey=apikey)
+        if client is None:
+            client = cls.get_bsky_client(user=user, apikey=apikey)
 
         if did is None:
             handle = cls.handle
@@ -1698,10 +2144,11 @@ class OSIntBSkyProfile(OSIntItem, BSkyInterface):
         return res
 
     @classmethod
-    def get_followers(cls, user=None, apikey=None, did=None, cursor=None):
+    def get_followers(cls, user=None, apikey=None, did=None, cursor=None, client=None):
         """
         """
-        client = cls.get_bsky_client(user=user, apikey=apikey)
+        if client is None:
+            client = cls.get_bsky_client(user=user, apikey=apikey)
 
         if did is None:
             handle = cls.handle
@@ -1711,10 +2158,11 @@ class OSIntBSkyProfile(OSIntItem, BSkyInterface):
         return res
 
     @classmethod
-    def get_follows(cls, user=None, apikey=None, did=None, cursor=None):
+    def get_follows(cls, user=None, apikey=None, did=None, cursor=None, client=None):
         """
         """
-        client = cls.get_bsky_client(user=user, apikey=apikey)
+        if client is None:
+            client = cls.get_bsky_client(user=user, apikey=apikey)
 
         if did is None:
             handle = cls.handle
@@ -1724,10 +2172,11 @@ class OSIntBSkyProfile(OSIntItem, BSkyInterface):
         return res
 
     @classmethod
-    def get_likes(cls, user=None, apikey=None, did=None, cursor=None):
+    def get_likes(cls, user=None, apikey=None, did=None, cursor=None, client=None):
         """
         """
-        client = cls.get_bsky_client(user=user, apikey=apikey)
+        if client is None:
+            client = cls.get_bsky_client(user=user, apikey=apikey)
 
         if did is None:
             handle = cls.handle
@@ -1737,50 +2186,70 @@ class OSIntBSkyProfile(OSIntItem, BSkyInterface):
         return res
 
     @classmethod
-    def load_json(cls, did=None, osint_bsky_store=None, osint_bsky_cache=None):
+    def store_path(cls, did, osint_bsky_store=None, osint_bsky_cache=None, ext='sqlite'):
+        """Get the file of a profile in the store or in the cache"""
         bsky_store = cls.get_config('osint_bsky_store', osint_bsky_store)
         bsky_cache = cls.get_config('osint_bsky_cache', osint_bsky_cache)
         filename = did.replace("did:plc:", "profile_")
-        path = os.path.join(bsky_store, f"{filename}.json")
+        path = os.path.join(bsky_store, f"{filename}.{ext}")
         if os.path.isfile(path) is False:
-            path = os.path.join(bsky_cache, f"{filename}.json")
-        elif os.path.isfile(os.path.join(bsky_cache, f"{filename}.json")):
+            path = os.path.join(bsky_cache, f"{filename}.{ext}")
+        elif os.path.isfile(os.path.join(bsky_cache, f"{filename}.{ext}")):
             log.error('Source %s has both cache and store files. Remove one of them' % (did))
-        if os.path.isfile(path) :
-            with open(path, 'r') as f:
-                 data = cls._imp_json.load(f)
-        else:
-            data = {
-                'profile': {},
-                'feeds': {},
-                'follows': {},
-                'followers': {},
-                "diff": {}
-            }
-        return path, data
+        return path
+
+    @classmethod
+    def open_store(cls, did=None, osint_bsky_store=None, osint_bsky_cache=None):
+        """Open the store of a profile. A json file of an older version
+        is moved to the store.
+
+        :returns: the store
+        :rtype: OSIntBSkyStore
+        """
+        path = cls.store_path(did, osint_bsky_store=osint_bsky_store, osint_bsky_cache=osint_bsky_cache)
+        if os.path.isfile(path) is False:
+            jpath = cls.store_path(did, osint_bsky_store=osint_bsky_store,
+                osint_bsky_cache=osint_bsky_cache, ext='json')
+            if os.path.isfile(jpath):
+                with open(jpath, 'r') as f:
+                    data = cls._imp_json.load(f)
+                path = jpath[:-len('json')] + 'sqlite'
+                OSIntBSkyStore(path).dump(data)
+                os.remove(jpath)
+        return OSIntBSkyStore(path)
+
+    @classmethod
+    def load_json(cls, did=None, osint_bsky_store=None, osint_bsky_cache=None):
+        """Load all the data of a profile. Use open_store to read or
+        update only a part of it."""
+        store = cls.open_store(did=did, osint_bsky_store=osint_bsky_store, osint_bsky_cache=osint_bsky_cache)
+        data = store.load()
+        store.close()
+        return store.path, data
 
     @classmethod
     def dump_json(cls, data, did=None, osint_bsky_store=None,
             osint_bsky_cache=None, filename = None):
-        bsky_store = cls.get_config('osint_bsky_store', osint_bsky_store)
-        bsky_cache = cls.get_config('osint_bsky_cache', osint_bsky_cache)
-        if filename is not None:
-            path = filename
-        else:
-            filename = did.replace("did:plc:", "profile_")
-            path = os.path.join(bsky_store, f"{filename}.json")
-            if os.path.isfile(path) is False:
-                path = os.path.join(bsky_cache, f"{filename}.json")
-            elif os.path.isfile(os.path.join(bsky_cache, f"{filename}.json")):
-                log.error('Source %s has both cache and store files. Remove one of them' % (did))
-        with open(path, 'w') as f:
+        """Replace all the data of a profile. filename can be a store
+        returned by load_json or a json file."""
+        if filename is None:
+            filename = cls.store_path(did, osint_bsky_store=osint_bsky_store, osint_bsky_cache=osint_bsky_cache)
+        if filename.endswith('.json') is False:
+            store = OSIntBSkyStore(filename)
+            store.dump(data)
+            store.close()
+            return
+        # Don't leave a truncated file if interrupted
+        tmpf = filename + '.tmp'
+        with open(tmpf, 'w') as f:
             cls._imp_json.dump(data, f, indent=2)
+        os.replace(tmpf, filename)
 
     @classmethod
     def update(cls, did=None, user=None, apikey=None,
             osint_bsky_store=None, osint_bsky_cache=None,
             followers=True, follows_count=True, posts_count=True,
-            feed_filter='posts_with_replies'):
+            feed_filter='posts_with_replies', client=None, limiter=None):
         """Update json
 
         :param feed_filter: forwarded to :meth:`get_feeds`, see its
@@ -1788,172 +2257,213 @@ class OSIntBSkyProfile(OSIntItem, BSkyInterface):
             ``posts_with_replies`` so replies are collected along with
             original posts (each entry keeps an explicit ``is_reply`` flag
             so callers/analyses can tell them apart).
+        :param client: the client to use, shared with other updates.
+            Defaults to :meth:`get_bsky_client`.
+        :param limiter: spaces the requests, shared with other updates.
+        :type limiter: OSIntBSkyRateLimiter
         """
-        path, data = cls.load_json(did=did, osint_bsky_store=osint_bsky_store,
+        if client is None:
+            client = cls.get_bsky_client(user=user, apikey=apikey)
+        store = cls.open_store(did=did, osint_bsky_store=osint_bsky_store,
             osint_bsky_cache=osint_bsky_cache)
 
-        for diff in list(data['diff'].keys()):
-            if len(data['diff'][diff]) == 0:
-                del data['diff'][diff]
+        store.clean_diffs()
         diff_date = time.time()
-        data['diff'][diff_date] = {}
+        diff = {}
+        data_profile = store.header('profile', {})
+        cursors = store.header('cursors', {})
 
-        profile = cls.get_profile(did=did, user=user, apikey=apikey)
+        if limiter is not None:
+            limiter.wait()
+        profile = cls.get_profile(client=client, did=did)
 
         if profile is not None:
-            data['profile']["did"] = did
-            if 'handle' in data['profile'] and data['profile']["handle"] != profile.handle:
-                data['diff'][diff_date]['handle'] = data['profile']["handle"]
-                data['profile']["handle"] = profile.handle
-            else:
-                data['profile']["handle"] = profile.handle
+            data_profile["did"] = did
+            for field in ["handle", "display_name", "description", "created_at",
+                    "followers_count", "follows_count", "indexed_at", "posts_count"]:
+                if field not in ["created_at", "indexed_at"] and field in data_profile \
+                        and data_profile[field] != getattr(profile, field):
+                    diff[field] = data_profile[field]
+                data_profile[field] = getattr(profile, field)
+            store.set_header('profile', data_profile)
+
+        def followers_page(cursor):
+            page = OSIntBSkyProfile.get_followers(did=did, cursor=cursor, client=client)
+            if page is None:
+                return None
+            return page.cursor, [(follower.did, cls.profile_record(follower)) for follower in page.followers]
+
+        def follows_page(cursor):
+            page = OSIntBSkyProfile.get_follows(did=did, cursor=cursor, client=client)
+            if page is None:
+                return None
+            return page.cursor, [(follow.did, cls.profile_record(follow)) for follow in page.follows]
+
+        def feeds_page(cursor):
+            page = OSIntBSkyProfile.get_feeds(did=did, cursor=cursor, feed_filter=feed_filter, client=client)
+            if page is None:
+                return None
+            return page.cursor, [(feed.post.cid, cls.feed_record(feed)) for feed in page.feed]
+
+        if followers is True and ('followers' in cursors or 'followers_count' in diff or store.count('followers') == 0):
+            cls.update_collection(store, 'followers', followers_page, limiter=limiter)
+
+        if follows_count is True and ('follows' in cursors or 'follows_count' in diff or store.count('follows') == 0):
+            cls.update_collection(store, 'follows', follows_page, limiter=limiter)
+
+        if posts_count is True and ('feeds' in cursors or 'posts_count' in diff or store.count('feeds') == 0):
+            cls.update_collection(store, 'feeds', feeds_page, limiter=limiter)
+
+        store.add_diff(diff_date, diff)
+
+        if store.count('feeds') == 0 and data_profile["posts_count"] != 0:
+            diff["posts_count"] = data_profile["posts_count"]
+        if store.count('followers') == 0 and data_profile["followers_count"] != 0:
+            diff["followers"] = data_profile["followers_count"]
+        if store.count('follows') == 0 and data_profile["follows_count"] != 0:
+            diff["follows"] = data_profile["follows_count"]
+        store.close()
+        return diff
 
-            if 'display_name' in data['profile'] and data['profile']["display_name"] != profile.display_name:
-                data['diff'][diff_date]['display_name'] = data['profile']["display_name"]
-                data['profile']["display_name"] = profile.display_name
-            else:
-                data['profile']["display_name"] = profile.display_name
-
-            if 'description' in data['profile'] and data['profile']["description"] != profile.description:
-                data['diff'][diff_date]['description'] = data['profile']["description"]
-                data['profile']["description"] = profile.description
+    @classmethod
+    def update_collection(cls, store, collection, get_page, limiter=None):
+        """Collect the records of a collection from the newest one to the
+        first one already in the store. The cursor is checkpointed in the
+        store after each page : an interrupted collect resumes from it, then
+        looks for the records added since.
+
+        :param store: The store of the profile.
+        :type store: OSIntBSkyStore
+        :param collection: The collection (ie 'feeds').
+        :type collection: str
+        :param get_page: Get the page of a cursor as a tuple (next cursor, list of (key, record))
+            or None.
+        :type get_page: callable
+        :param limiter: spaces the requests.
+        :type limiter: OSIntBSkyRateLimiter
+        :returns: the number of new records
+        :rtype: int
+        """
+        cursor = store.header('cursors', {}).get(collection)
+        resume = cursor is not None
+        count = 0
+        while True:
+            if limiter is not None:
+                limiter.wait()
+            page = get_page(cursor)
+            if page is None:
+                # Keep the checkpoint for the next update
+                break
+            next_cursor, page_records = page
+            records = {}
+            for key, record in page_records:
+                if key in records or store.has(collection, key):
+                    next_cursor = None
+                    break
+                records[key] = record
+            store.put(collection, records)
+            count += len(records)
+            cursors = store.header('cursors', {})
+            if next_cursor is None:
+                cursors.pop(collection, None)
             else:
-                data['profile']["description"] = profile.description
-
-            data['profile']["created_at"] = profile.created_at
+                cursors[collection] = next_cursor
+            store.set_header('cursors', cursors)
+            if next_cursor is None:
+                if resume is False:
+                    break
+                resume = False
+            cursor = next_cursor
+        return count
 
-            if 'followers_count' in data['profile'] and data['profile']["followers_count"] != profile.followers_count:
-                data['diff'][diff_date]['followers_count'] = data['profile']["followers_count"]
-                data['profile']["followers_count"] = profile.followers_count
-            else:
-                data['profile']["followers_count"] = profile.followers_count
+    @classmethod
+    def crawl(cls, dids, user=None, apikey=None, osint_bsky_store=None, osint_bsky_cache=None,
+            osint_bsky_base_url=None, workers=4, rate=5, feed_filter='posts_with_replies', client=None):
+        """Update many profiles concurrently with one client and a global rate.
+        Cursors are checkpointed in the stores : an interrupted crawl resumes
+        where it stopped.
+
+        :param dids: The dids of the profiles.
+        :type dids: list of str
+        :param osint_bsky_base_url: The xrpc url of the server.
+        :type osint_bsky_base_url: str
+        :param workers: The number of profiles updated at the same time.
+        :type workers: int
+        :param rate: The max number of requests by second for all the workers.
+        :type rate: float
+        :param client: The client to use. Defaults to :meth:`get_bsky_client`.
+        :returns: the diff of each did, or the exception that stopped its update
+        :rtype: dict
+        """
+        if len(dids) == 0:
+            return {}
+        if client is None:
+            client = cls.get_bsky_client(user=user, apikey=apikey, base_url=osint_bsky_base_url)
+        limiter = OSIntBSkyRateLimiter(rate)
+        ret = {}
+        with cls._imp_concurrent_futures.ThreadPoolExecutor(max_workers=max(1, min(workers, len(dids)))) as pool:
+            futures = {pool.submit(cls.update, did=did, client=client, limiter=limiter,
+                osint_bsky_store=osint_bsky_store, osint_bsky_cache=osint_bsky_cache,
+                feed_filter=feed_filter): did for did in dids}
+            for future in cls._imp_concurrent_futures.as_completed(futures):
+                did = futures[future]
+                try:
+                    ret[did] = future.result()
+                except Exception as exc:
+                    log.warning("Can't update %s : %s", did, exc)
+                    ret[did] = exc
+        return ret
 
-            if 'follows_count' in data['profile'] and data['profile']["follows_count"] != profile.follows_count:
-                data['diff'][diff_date]['follows_count'] = data['profile']["follows_count"]
-                data['profile']["follows_count"] = profile.follows_count
-            else:
-                data['profile']["follows_count"] = profile.follows_count
+    @classmethod
+    def profile_record(cls, profile):
+        """Get the record of a follower or a follow"""
+        return {
+            'did': profile.did,
+            'handle': profile.handle,
+            'display_name': profile.display_name,
+            'created_at': profile.created_at,
+            'indexed_at': profile.indexed_at,
+        }
 
-            data['profile']["indexed_at"] = profile.indexed_at
+    @classmethod
+    def feed_record(cls, feed):
+        """Get the record of a post of a feed"""
+        record = {
+            'cid': feed.post.cid,
+            'created_at': feed.post.record.created_at,
+            'text': feed.post.record.text,
+            'is_reply': feed.reply is not None,
+        }
+        if feed.reply is not None and feed.reply.parent is not None and hasattr(feed.reply.parent, 'author'):
 
-            if 'posts_count' in data['profile'] and data['profile']["posts_count"] != profile.posts_count:
-                data['diff'][diff_date]['posts_count'] = data['profile']["posts_count"]
-                data['profile']["posts_count"] = profile.posts_count
+            record['reply_did'] = feed.reply.parent.author.did
+            if hasattr(feed.reply.parent, 'cid'):
+                record['reply_cid'] = feed.reply.parent.cid
+                record['reply_created_at'] = feed.reply.parent.record.created_at
+                record['reply_text'] = feed.reply.parent.record.text
             else:
-                data['profile']["posts_count"] = profile.posts_count
-
-        if followers is True and ('followers_count' in data['diff'][diff_date] or len(data['followers']) == 0):
-            more = True
-            cursor = None
-            while more is True:
-                followers = OSIntBSkyProfile.get_followers(did=did, cursor=cursor, user=user, apikey=apikey)
-                if followers is not None:
-                    for follower in followers.followers:
-                        if follower.did in data['followers']:
-                            followers.cursor = None
-                            break
-                        if follower.did not in data['followers']:
-                            data['followers'][follower.did] = {}
-                        data['followers'][follower.did]['did'] = follower.did
-                        data['followers'][follower.did]['handle'] = follower.handle
-                        data['followers'][follower.did]['display_name'] = follower.display_name
-                        data['followers'][follower.did]['created_at'] = follower.created_at
-                        data['followers'][follower.did]['indexed_at'] = follower.indexed_at
-                    if followers.cursor is None:
-                        more = False
-                    else:
-                        cursor = followers.cursor
-                else:
-                    more = False
-
-        if follows_count is True and ('follows_count' in data['diff'][diff_date] or len(data['follows']) == 0):
-            more = True
-            cursor = None
-            while more is True:
-                follows = OSIntBSkyProfile.get_follows(did=did, cursor=cursor, user=user, apikey=apikey)
-                if follows is not None:
-                    for follow in follows.follows:
-                        if follow.did in data['follows']:
-                            follows.cursor = None
-                            break
-                        if follow.did not in data['follows']:
-                            data['follows'][follow.did] = {}
-                        data['follows'][follow.did]['did'] = follow.did
-                        data['follows'][follow.did]['handle'] = follow.handle
-                        data['follows'][follow.did]['display_name'] = follow.display_name
-                        data['follows'][follow.did]['created_at'] = follow.created_at
-                        data['follows'][follow.did]['indexed_at'] = follow.indexed_at
-                    if follows.cursor is None:
-                        more = False
-                    else:
-                        cursor = follows.cursor
+                record['reply_cid'] = None
+                record['reply_created_at'] = None
+                record['reply_text'] = None
+
+            if hasattr(feed.reply.root, 'cid'):
+                if hasattr(feed.reply.root, 'author'):
+                    record['root_did'] = feed.reply.root.author.did
+                    record['root_cid'] = feed.reply.root.cid
+                    record['root_created_at'] = feed.reply.root.record.created_at
+                    record['root_text'] = feed.reply.root.record.text
                 else:
-                    more = False
-
-        if posts_count is True and ('posts_count' in data['diff'][diff_date] or len(data['feeds']) == 0):
-            more = True
-            cursor = None
-            while more is True:
-                # ~ print(cursor)
-                feeds = OSIntBSkyProfile.get_feeds(did=did, cursor=cursor, feed_filter=feed_filter, user=user, apikey=apikey)
-                if feeds is not None:
-                    for feed in feeds.feed:
-                        if feed.post.cid in data['feeds']:
-                            feeds.cursor = None
-                            break
-                        if feed.post.cid not in data['feeds']:
-                            data['feeds'][feed.post.cid] = {}
-                        data['feeds'][feed.post.cid]['cid'] = feed.post.cid
-                        data['feeds'][feed.post.cid]['created_at'] = feed.post.record.created_at
-                        data['feeds'][feed.post.cid]['text'] = feed.post.record.text
-                        data['feeds'][feed.post.cid]['is_reply'] = feed.reply is not None
-
-                        if feed.reply is not None and feed.reply.parent is not None and hasattr(feed.reply.parent, 'author'):
-
-                            data['feeds'][feed.post.cid]['reply_did'] = feed.reply.parent.author.did
-                            if hasattr(feed.reply.parent, 'cid'):
-                                data['feeds'][feed.post.cid]['reply_cid'] = feed.reply.parent.cid
-                                data['feeds'][feed.post.cid]['reply_created_at'] = feed.reply.parent.record.created_at
-                                data['feeds'][feed.post.cid]['reply_text'] = feed.reply.parent.record.text
-                            else:
-                                data['feeds'][feed.post.cid]['reply_cid'] = None
-                                data['feeds'][feed.post.cid]['reply_created_at'] = None
-                                data['feeds'][feed.post.cid]['reply_text'] = None
-
-                            if hasattr(feed.reply.root, 'cid'):
-                                if hasattr(feed.reply.root, 'author'):
-                                    data['feeds'][feed.post.cid]['root_did'] = feed.reply.root.author.did
-                                    data['feeds'][feed.post.cid]['root_cid'] = feed.reply.root.cid
-                                    data['feeds'][feed.post.cid]['root_created_at'] = feed.reply.root.record.created_at
-                                    data['feeds'][feed.post.cid]['root_text'] = feed.reply.root.record.text
-                                else:
-                                    data['feeds'][feed.post.cid]['root_did'] = None
-                                    data['feeds'][feed.post.cid]['root_cid'] = None
-                                    data['feeds'][feed.post.cid]['root_created_at'] = None
-                                    data['feeds'][feed.post.cid]['root_text'] = None
-                            else:
-                                if hasattr(feed.reply.root, 'author'):
-                                    data['feeds'][feed.post.cid]['root_did'] = feed.reply.root.author.did
-                                else:
-                                    data['feeds'][feed.post.cid]['root_did'] = None
-                                data['feeds'][feed.post.cid]['root_cid'] = None
-                                data['feeds'][feed.post.cid]['root_created_at'] = None
-                                data['feeds'][feed.post.cid]['root_text'] = None
-
-                    if feeds.cursor is None:
-                        more = False
-                    else:
-                        cursor = feeds.cursor
+                    record['root_did'] = None
+                    record['root_cid'] = None
+                    record['root_created_at'] = None
+                    record['root_text'] = None
+            else:
+                if hasattr(feed.reply.root, 'author'):
+                    record['root_did'] = feed.reply.root.author.did
                 else:
-                    more = False
-
-        cls.dump_json(data, filename=path)
-
-        if len(data['feeds']) == 0 and data['profile']["posts_count"] != 0:
-            data['diff'][diff_date]["posts_count"] = data['profile']["posts_count"]
-        if len(data['followers']) == 0 and data['profile']["followers_count"] != 0:
-            data['diff'][diff_date]["followers"] = data['profile']["followers_count"]
-        if len(data['follows']) == 0 and data['profile']["follows_count"] != 0:
-            data['diff'][diff_date]["follows"] = data['profile']["follows_count"]
-        return data['diff'][diff_date]
+                    record['root_did'] = None
+                record['root_cid'] = None
+                record['root_created_at'] = None
+                record['root_text'] = None
+        return record
 
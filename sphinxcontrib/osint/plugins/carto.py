@@ -26,6 +26,7 @@ from sphinx.writers.latex import LaTeXTranslator
 from .. import option_main, option_reports, yesno
 from ..osintlib import Index, OSIntOrg, OSIntRelated
 from . import reify_classmethod, PluginDirective, SphinxDirective
+from .cartolib import OSIntGeocoder, OSIntBasemaps, render_carto
 
 logger = logging.getLogger(__name__)
 
@@ -39,6 +40,33 @@ class Carto(PluginDirective):
     @classmethod
     def add_events(cls, app):
         app.add_event('carto-defined')
+        # After the fetch stage
+        app.connect('env-updated', cls.render_cartos, priority=500)
+
+    @classmethod
+    def render_cartos(cls, app, env):
+        """Render the cartos before writing docs.
+        Maps are rendered in a pool of processes if osint_carto_workers > 1.
+        Workers keep their basemaps between jobs, so cartos sharing one are
+        submitted together."""
+        from .cartolib import carto_worker_init
+
+        quest = env.get_domain('osint').quest
+        output_dir = os.path.join(app.outdir, '_images')
+        jobs = {}
+        for name in list(quest.cartos.keys()):
+            try:
+                filename, job = quest.cartos[name].render_job(output_dir)
+            except Exception:
+                # It will be reported with its location when the doc is written
+                logger.debug("Can't prepare carto %s", name, exc_info=True)
+                continue
+            if job is not None and filename not in jobs:
+                jobs[filename] = (name, job)
+        jobs = sorted(jobs.values(), key=lambda job: str(sorted(job[1]['basemap'].items())))
+        cls.render_jobs(app, jobs, render_carto, initializer=carto_worker_init,
+            workers=env.config.osint_carto_workers, summary='rendering cartos... ')
+        return []
 
     @classmethod
     def add_nodes(cls, app):
@@ -54,6 +82,10 @@ class Carto(PluginDirective):
         """ """
         return [
             ('osint_carto_cache', 'carto_cache', 'html'),
+            ('osint_carto_geocoder_url', None, 'html'),
+            ('osint_carto_geocoder_workers', 2, 'html'),
+            ('osint_carto_geocoder_rate', 1, 'html'),
+            ('osint_carto_workers', 4, 'html'),
         ]
 
     @classmethod
@@ -216,7 +248,7 @@ class Carto(PluginDirective):
             :type kwargs: kwargs
             """
             carto = OSIntCarto(name, label, quest=quest, **kwargs)
-            quest.cartos[carto.name] = carto
+            quest._index_set('cartos', carto)
         quest.add_carto = add_carto
 
         global get_cartos
@@ -312,17 +344,7 @@ class OSIntCarto(OSIntRelated):
 
     prefix = 'carto'
 
-    regions = {
-        'africa': [-20, 60, -40, 40],
-        'europe': [-20, 40, 35, 70],
-        'arctic': [-12, 90, 50, 90],
-    }
-
-    @reify_classmethod
-    def _imp_matplotlib_pyplot(cls):
-        """Lazy loader for import matplotlib.pyplot"""
-        import importlib
-        return importlib.import_module('matplotlib.pyplot')
+    regions = OSIntBasemaps.regions
 
     @reify_classmethod
     def _imp_matplotlib_colors(cls):
@@ -330,48 +352,12 @@ class OSIntCarto(OSIntRelated):
         import importlib
         return importlib.import_module('matplotlib.colors')
 
-    @reify_classmethod
-    def _imp_matplotlib_path(cls):
-        """Lazy loader for import matplotlib.path"""
-        import importlib
-        return importlib.import_module('matplotlib.path')
-
-    @reify_classmethod
-    def _imp_cartopy_crs(cls):
-        """Lazy loader for import cartopy.crs"""
-        import importlib
-        return importlib.import_module('cartopy.crs')
-
-    @reify_classmethod
-    def _imp_cartopy_feature(cls):
-        """Lazy loader for import cartopy.feature"""
-        import importlib
-        return importlib.import_module('cartopy.feature')
-
-    @reify_classmethod
-    def _imp_numpy(cls):
-        """Lazy loader for import numpy"""
-        import importlib
-        return importlib.import_module('numpy')
-
     @reify_classmethod
     def _imp_hashlib(cls):
         """Lazy loader for import hashlib"""
         import importlib
         return importlib.import_module('hashlib')
 
-    @reify_classmethod
-    def _imp_geopy_geocoders(cls):
-        """Lazy loader for import geopy.geocoders"""
-        import importlib
-        return importlib.import_module('geopy.geocoders')
-
-    @reify_classmethod
-    def _imp_pycountry(cls):
-        """Lazy loader for import pycountry"""
-        import importlib
-        return importlib.import_module('pycountry')
-
     def __init__(self, name, label, width=900, height=450,
             data_countries=None, data_object=None, data_coordinates=None,
             dpi=300, fontsize=9, color='black', region=None, projection='Robinson',
@@ -400,8 +386,19 @@ class OSIntCarto(OSIntRelated):
         self.fontsize = fontsize
         self.filepath = None
 
-    def graph(self, output_dir):
-        """Graph it
+    def depends(self):
+        """Get the names of the items shown on the map"""
+        if self.data_object is not None:
+            return frozenset(getattr(self.quest, "get_%s"%self.data_object)(orgs=self.orgs,
+                cats=self.cats, countries=self.countries, idents=self.idents))
+        # Countries and coordinates are given in the directive
+        return frozenset()
+
+    def graph_data(self):
+        """Get the values to show on the map
+
+        :returns: {code: {'value': 1, 'color': 'red'}}, with latitude and longitude for coordinates
+        :rtype: dict
         """
         country_data = {}
         if self.data_object is not None:
@@ -465,120 +462,66 @@ class OSIntCarto(OSIntRelated):
                     color = ds[2].strip()
                 country_data[code] = {'value': value, 'color':color}
 
-        # ~ filename = f'{self.prefix}_{hash(self.name)}_{self.width}x{self.height}.jpg'
-        filename = f'{self.prefix}_{self._imp_hashlib.md5(str(country_data).encode()).hexdigest()}_{self.width}x{self.height}.jpg'
+        return country_data
+
+    def render_job(self, output_dir):
+        """Locate the places and get the job to render the map.
+        The name of the image is a md5 of the data and of the basemap.
+
+        :param output_dir: The directory of the image.
+        :type output_dir: str
+        :returns: the filename and the job for render_carto, None if the image already exists
+        :rtype: tuple
+        """
+        country_data = self.graph_data()
+        basemap = {'width': self.width, 'height': self.height, 'dpi': self.dpi,
+            'projection': self.projection, 'region': self.region}
+        sizes = (self.marker, self.marker_min_size, self.marker_max_size)
+        digest = self._imp_hashlib.md5(str((country_data, basemap, sizes)).encode()).hexdigest()
+        filename = f'{self.prefix}_{digest}_{self.width}x{self.height}.jpg'
         filepath = os.path.join(output_dir, filename)
 
         if os.path.isfile(filepath):
-            self.filepath = filename
-            return filename
+            return filename, None
 
-        geolocator = self._imp_geopy_geocoders.Nominatim(user_agent="sphinx_osint")
+        config = self.quest.sphinx_env.config
+        geocoder = OSIntGeocoder.get_geocoder(
+            filename=os.path.join(self.quest.sphinx_env.srcdir, config.osint_carto_cache, 'geolocator.jsonl'),
+            url=config.osint_carto_geocoder_url,
+            workers=config.osint_carto_geocoder_workers,
+            rate=config.osint_carto_geocoder_rate)
 
         coordinates = {}
-        values = []
-
-        geolocatorf = os.path.join(self.quest.sphinx_env.config.osint_carto_cache, 'geolocator.json')
-        if os.path.isfile(geolocatorf):
-            with open(geolocatorf, 'r') as f:
-                geocache = self._imp_json.loads(f.read())
-        else:
-            geocache = {}
-
+        locations = geocoder.locate([code for code, value in country_data.items() if 'latitude' not in value])
         for code, value in country_data.items():
             if 'latitude' in value:
                 coordinates[code] = (value['longitude'], value['latitude'])
-                values.append(value['value'])
-            else:
-                if code in geocache:
-                    coordinates[code] = (geocache[code]['longitude'], geocache[code]['latitude'])
-                    values.append(value['value'])
-                else:
-                    try:
-                        country = self._imp_pycountry.countries.get(alpha_2=code)
-                        if country:
-                            try:
-                                location = geolocator.geocode(country.official_name, timeout=10)
-                                if location:
-                                    coordinates[code] = (location.longitude, location.latitude)
-                                    geocache[code] = {'longitude': location.longitude, 'latitude': location.latitude}
-                                    values.append(value['value'])
-                            except AttributeError:
-                                try:
-                                    location = geolocator.geocode(country.common_name, timeout=10)
-                                    if location:
-                                        coordinates[code] = (location.longitude, location.latitude)
-                                        geocache[code] = {'longitude': location.longitude, 'latitude': location.latitude}
-                                        values.append(value['value'])
-                                except AttributeError:
-                                    location = geolocator.geocode(country.name, timeout=10)
-                                    if location:
-                                        coordinates[code] = (location.longitude, location.latitude)
-                                        geocache[code] = {'longitude': location.longitude, 'latitude': location.latitude}
-                                        values.append(value['value'])
-                            with open(geolocatorf, 'w') as f:
-                                f.write(self._imp_json.dumps(geocache, indent=2, default=str))
-                    except Exception:
-                        logger.exception(f"Error for {code}")
-                        continue
+            elif code in locations:
+                coordinates[code] = locations[code]
 
         if not coordinates:
             raise ValueError("No coordinates for countries")
 
-        self._imp_matplotlib_pyplot.figure(figsize=(self.width / self.dpi, self.height / self.dpi))
-        # ~ ax = self._imp_matplotlib_pyplot.axes(projection=self._imp_cartopy_crs.Robinson())
-        ax = self._imp_matplotlib_pyplot.axes(projection=getattr(self._imp_cartopy_crs, self.projection)())
-        ax.add_feature(self._imp_cartopy_feature.LAND, facecolor='lightgray')
-        ax.add_feature(self._imp_cartopy_feature.OCEAN, facecolor='lightblue')
-        ax.add_feature(self._imp_cartopy_feature.COASTLINE, linewidth=0.3)
-        ax.add_feature(self._imp_cartopy_feature.BORDERS, linewidth=0.2, alpha=0.5)
-        if self.region is None:
-            ax.set_global()
-        elif self.region in self.regions:
-            ax.set_extent(self.regions[self.region])
-        else:
-            try:
-                x1,x2,x3,x4 = self.region.split(',')
-                ax.set_extent([x1,x2,x3,x4], self._imp_cartopy_crs.PlateCarree())
-            except ValueError:
-                logger.exception("Error in %s carto. region must be x1,x2,x3,x4" %self.name)
-                raise
-
-        if self.projection in ['NorthPolarStereo', 'SouthPolarStereo']:
-            theta = self._imp_numpy.linspace(0, 2*self._imp_numpy.pi, 200)
-            center, radius = [0.5, 0.5], 0.5
-            verts = self._imp_numpy.vstack([self._imp_numpy.sin(theta), self._imp_numpy.cos(theta)]).T
-            circle = self._imp_matplotlib_path.Path(verts * radius + center)
-
-            ax.set_boundary(circle, transform=ax.transAxes)
-
+        values = [country_data[code]['value'] for code in coordinates]
         min_val = min(values)
         max_val = max(values)
         val_range = max_val - min_val if max_val != min_val else 1
+        markers = []
         for code, (lon, lat) in coordinates.items():
-            value = country_data[code]['value']
-            color = country_data[code]['color']
-
-            normalized = (value - min_val) / val_range
+            normalized = (country_data[code]['value'] - min_val) / val_range
             marker_size = self.marker_min_size + (self.marker_max_size - self.marker_min_size) * normalized
+            markers.append((lon, lat, country_data[code]['color'], marker_size**0.5))
 
-            ax.plot(lon, lat, color=color, marker=self.marker, markersize=marker_size**0.5,
-                alpha=0.6, transform=self._imp_cartopy_crs.PlateCarree())
-
-            # ~ ax.text(lon, lat, f'{value:.0f}',
-                   # ~ fontsize=8, ha='center', va='center',
-                   # ~ transform=self._imp_cartopy_crs.PlateCarree(),
-                   # ~ fontweight='bold', color='white',
-                   # ~ bbox=dict(boxstyle='round,pad=0.3',
-                            # ~ facecolor='red', alpha=0.7, edgecolor='none'))
-
-        # ~ plt.title(title, fontsize=14, fontweight='bold', pad=20)
-        # ~ if self.projection in ['NorthPolarStereo', 'SouthPolarStereo']:
-            # ~ ax.imshow(data.T, origin='lower', extent=[-180,180,-90,90], transform=ccrs.PlateCarree(),cmap='jet',vmin=0, vmax=1.0)
-        self._imp_matplotlib_pyplot.savefig(filepath, format='jpg', dpi=self.dpi,
-                   bbox_inches='tight', facecolor='white')
-        self._imp_matplotlib_pyplot.close()
+        os.makedirs(output_dir, exist_ok=True)
+        return filename, {'filepath': filepath, 'basemap': basemap,
+            'marker': self.marker, 'markers': markers}
 
+    def graph(self, output_dir):
+        """Graph it
+        """
+        filename, job = self.render_job(output_dir)
+        if job is not None:
+            render_carto(job)
         self.filepath = filename
         return filename
 
@@ -48,4 +48,6 @@ class Flask(Plugin):
             ('osint_flask_redis_db', 0, ''),
             ('osint_flask_redis_password', None, ''),
             ('osint_flask_cache_redis_prefix', 'osint_cache:', ''),
+            # Max number of quest objects kept in memory by the web app
+            ('osint_flask_quest_cache', 1024, ''),
         ]
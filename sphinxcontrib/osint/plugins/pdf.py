@@ -12,8 +12,10 @@ __email__ = 'bibi21000@gmail.com'
 
 import os
 import base64
+import subprocess
 from sphinx.util import logging
 
+from ..osintlib import time_left
 from ..interfaces import SeleniumInterface
 from . import reify_classmethod, PluginSource
 
@@ -33,8 +35,14 @@ class Pdf(PluginSource, SeleniumInterface):
 
     @classmethod
     def pdfkit_fetch_pdf(cls, env, url, storef):
-        """Fetch url using selenium"""
-        cls._imp_pdfkit.from_url(url, storef)
+        """Fetch url using pdfkit"""
+        timeout = time_left()
+        if timeout is None:
+            cls._imp_pdfkit.from_url(url, storef)
+            return
+        # The deadline of time_limit in a fetch worker : wkhtmltopdf is killed
+        subprocess.run(cls._imp_pdfkit.PDFKit(url, 'url').command(storef),
+            timeout=timeout, check=True, capture_output=True)
 
     @classmethod
     def selenium_fetch_pdf(cls, env, url, storef):
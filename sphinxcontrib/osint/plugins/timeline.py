@@ -12,6 +12,7 @@ __email__ = 'bibi21000@gmail.com'
 
 import os
 import copy
+import html
 from docutils import nodes
 from docutils.parsers.rst import directives
 from sphinx.locale import __
@@ -26,6 +27,7 @@ from sphinx.writers.latex import LaTeXTranslator
 from .. import option_main, option_reports, yesno
 from ..osintlib import Index, OSIntOrg, OSIntRelated
 from . import reify_classmethod, PluginDirective, SphinxDirective
+from .timelinelib import render_timeline
 
 logger = logging.getLogger(__name__)
 
@@ -34,9 +36,41 @@ class Timeline(PluginDirective):
     name = 'timeline'
     order = 5
 
+    @classmethod
+    def config_values(cls):
+        """ """
+        return [
+            ('osint_timeline_workers', 4, 'html'),
+        ]
+
     @classmethod
     def add_events(cls, app):
         app.add_event('timeline-defined')
+        # After the fetch stage
+        app.connect('env-updated', cls.render_timelines, priority=500)
+
+    @classmethod
+    def render_timelines(cls, app, env):
+        """Render the timelines before writing docs.
+        Timelines are rendered in a pool of processes if osint_timeline_workers > 1.
+        Timelines with the same image name are rendered once."""
+        from .timelinelib import timeline_worker_init
+
+        quest = env.get_domain('osint').quest
+        output_dir = os.path.join(app.outdir, '_images')
+        jobs = {}
+        for name in list(quest.timelines.keys()):
+            try:
+                filename, job = quest.timelines[name].render_job(output_dir)
+            except Exception:
+                # It will be reported with its location when the doc is written
+                logger.debug("Can't prepare timeline %s", name, exc_info=True)
+                continue
+            if job is not None and filename not in jobs:
+                jobs[filename] = (name, job)
+        cls.render_jobs(app, list(jobs.values()), render_timeline, initializer=timeline_worker_init,
+            workers=env.config.osint_timeline_workers, summary='rendering timelines... ')
+        return []
 
     @classmethod
     def add_nodes(cls, app):
@@ -159,11 +193,16 @@ class Timeline(PluginDirective):
 
                     paragraph = nodes.paragraph('', '')
 
-                    image_node = nodes.image()
-                    image_node['uri'] = f'/_images/{filename}'
-                    image_node['candidates'] = '?'
-                    image_node['alt'] = alttext
-                    paragraph += image_node
+                    if filename.endswith('.svg'):
+                        # An object keeps the tooltips of the svg
+                        paragraph += nodes.raw('', '<object data="/_images/%s" type="image/svg+xml">%s</object>'
+                            % (filename, html.escape(alttext)), format='html')
+                    else:
+                        image_node = nodes.image()
+                        image_node['uri'] = f'/_images/{filename}'
+                        image_node['candidates'] = '?'
+                        image_node['alt'] = alttext
+                        paragraph += image_node
 
                     container.append(paragraph)
 
@@ -199,7 +238,7 @@ class Timeline(PluginDirective):
             :type kwargs: kwargs
             """
             timeline = OSIntTimeline(name, label, quest=quest, **kwargs)
-            quest.timelines[timeline.name] = timeline
+            quest._index_set('timelines', timeline)
         quest.add_timeline = add_timeline
 
         global get_timelines
@@ -296,30 +335,19 @@ class OSIntTimeline(OSIntRelated):
 
     prefix = 'timeline'
 
-    @reify_classmethod
-    def _imp_matplotlib_pyplot(cls):
-        """Lazy loader for import matplotlib.pyplot"""
-        import importlib
-        return importlib.import_module('matplotlib.pyplot')
-
     @reify_classmethod
     def _imp_hashlib(cls):
         """Lazy loader for import hashlib"""
         import importlib
         return importlib.import_module('hashlib')
 
-    @reify_classmethod
-    def _imp_matplotlib_dates(cls):
-        """Lazy loader for import matplotlib.dates"""
-        import importlib
-        return importlib.import_module('matplotlib.dates')
-
     def __init__(self, name, label, width=400, height=200, dpi=100, fontsize=9,
-            color='#2E86AB', marker='o', **kwargs
+            color='#2E86AB', marker='o', format='jpg', **kwargs
         ):
         """A timeline in the OSIntQuest
         """
         super().__init__(name, label, **kwargs)
+        self.format = format
         self.width = width
         self.height = height
         self.dpi = dpi
@@ -328,8 +356,11 @@ class OSIntTimeline(OSIntRelated):
         self.fontsize = fontsize
         self.filepath = None
 
-    def graph(self, output_dir):
-        """Graph it
+    def graph_data(self):
+        """Get the events to show on the timeline
+
+        :returns: {begin: label}
+        :rtype: dict
         """
         countries, cities, orgs, all_idents, relations, events, links, quotes, sources = self.data_filter(self.cats, self.orgs, self.begin, self.end, self.countries, self.idents, borders=self.borders)
         countries, cities, orgs, all_idents, relations, events, links, quotes, sources = self.data_complete(countries, cities, orgs, all_idents, relations, events, links, quotes, sources, self.cats, self.orgs, self.begin, self.end, self.countries, self.idents, borders=self.borders)
@@ -338,64 +369,46 @@ class OSIntTimeline(OSIntRelated):
         for event in events:
             if self.quest.events[event].begin is not None:
                 data_dict[self.quest.events[event].begin] = self.quest.events[event].sshort
-        dates = []
-        labels = []
+        return data_dict
 
-        # ~ filename = f'{self.prefix}_{hash(self.name)}_{self.width}x{self.height}.jpg'
-        filename = f'{self.prefix}_{self._imp_hashlib.md5(str(data_dict).encode()).hexdigest()}_{self.width}x{self.height}.jpg'
-        filepath = os.path.join(output_dir, filename)
+    def render_job(self, output_dir):
+        """Get the job to render the timeline.
+        The name of the image is a md5 of the events.
 
-        if os.path.isfile(filepath):
-            self.filepath = filename
-            return filename
-
-        for date, label in sorted(data_dict.items()):
-            # ~ date = datetime.strptime(date_str, '%Y-%m-%d')
-            dates.append(date)
-            labels.append(label)
-
-        fig, ax = self._imp_matplotlib_pyplot.subplots(figsize=(self.width / self.dpi, self.height / self.dpi))
-
-        y_pos = [0] * len(dates)
-        ax.plot(dates, y_pos, color=self.color, linewidth=2, marker=self.marker,
-               markersize=10, markerfacecolor=self.color, markeredgecolor='white',
-               markeredgewidth=2)
-
-        for i, (date, label) in enumerate(zip(dates, labels)):
-            y_text = 0.15 if i % 2 == 0 else -0.15
-            va = 'bottom' if i % 2 == 0 else 'top'
-            ha = 'left' if i % 2 == 0 else 'right'
-            # ~ y_text = 0.15
-            # ~ va = 'bottom'
-
-            ax.text(date, y_text, label, ha=ha, va=va,
-                   fontsize=self.fontsize, rotation=45, bbox=dict(boxstyle='round,pad=0.3',
-                   facecolor='white', edgecolor=self.color, alpha=0.8))
-
-        ax.set_ylim(-0.5, 0.5)
-        ax.yaxis.set_visible(False)
-        ax.spines['left'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-        ax.spines['top'].set_visible(False)
-
-        ax.xaxis.set_major_formatter(self._imp_matplotlib_dates.DateFormatter('%Y-%m-%d'))
-        ax.xaxis.set_major_locator(self._imp_matplotlib_dates.AutoDateLocator())
-        self._imp_matplotlib_pyplot.xticks(rotation=90, ha='right', fontsize=self.fontsize + 2)
-
-        # ~ ax.set_title(self.label, fontsize=14, fontweight='bold', pad=20)
+        :param output_dir: The directory of the image.
+        :type output_dir: str
+        :returns: the filename and the job for render_timeline, None if the image already exists
+        :rtype: tuple
+        """
+        data_dict = self.graph_data()
 
-        ax.grid(True, axis='x', alpha=0.3, linestyle='--')
+        filename = f'{self.prefix}_{self._imp_hashlib.md5(str(data_dict).encode()).hexdigest()}_{self.width}x{self.height}.{self.format}'
+        filepath = os.path.join(output_dir, filename)
 
-        # ~ self._imp_matplotlib_pyplot.tight_layout()
+        if os.path.isfile(filepath):
+            return filename, None
 
-        self._imp_matplotlib_pyplot.savefig(filepath, format='jpg', dpi=self.dpi, bbox_inches='tight',
-                   facecolor='white')
-        self._imp_matplotlib_pyplot.close()
+        dates = sorted(data_dict.keys())
+        os.makedirs(output_dir, exist_ok=True)
+        return filename, {'filepath': filepath, 'format': self.format,
+            'dates': [date.isoformat() for date in dates], 'labels': [data_dict[date] for date in dates],
+            'width': self.width, 'height': self.height, 'dpi': self.dpi, 'fontsize': self.fontsize,
+            'color': self.color, 'marker': self.marker}
 
+    def graph(self, output_dir):
+        """Graph it
+        """
+        filename, job = self.render_job(output_dir)
+        if job is not None:
+            render_timeline(job)
         self.filepath = filename
         return filename
 
 
+def image_format(argument):
+    return directives.choice(argument, ('jpg', 'svg'))
+
+
 class DirectiveTimeline(SphinxDirective):
     """
     An OSInt timeline.
@@ -413,6 +426,7 @@ class DirectiveTimeline(SphinxDirective):
         'height': directives.positive_int,
         'fontsize': directives.positive_int,
         'dpi': directives.positive_int,
+        'format': image_format,
     } | option_main | option_reports
 
     def run(self) -> list[Node]:
@@ -0,0 +1,174 @@
+# -*- encoding: utf-8 -*-
+"""
+The timeline lib plugins
+------------------------
+
+Timelines are rendered from sorted numpy arrays of dates : all the events
+are drawn with one line and one collection of stems, only the labels that
+have room are written. In svg, each event gets a tooltip with its label.
+
+"""
+from __future__ import annotations
+
+__author__ = 'bibi21000 aka Sébastien GALLET'
+__email__ = 'bibi21000@gmail.com'
+
+import os
+
+from sphinx.util import logging
+
+from . import reify_classmethod
+
+log = logging.getLogger(__name__)
+
+
+class OSIntTimelineRenderer():
+
+    #: The gid of the markers in svg
+    events_gid = 'osint_timeline_events'
+
+    @reify_classmethod
+    def _imp_matplotlib(cls):
+        """Lazy loader for import matplotlib"""
+        import importlib
+        return importlib.import_module('matplotlib')
+
+    @reify_classmethod
+    def _imp_matplotlib_pyplot(cls):
+        """Lazy loader for import matplotlib.pyplot"""
+        import importlib
+        return importlib.import_module('matplotlib.pyplot')
+
+    @reify_classmethod
+    def _imp_matplotlib_dates(cls):
+        """Lazy loader for import matplotlib.dates"""
+        import importlib
+        return importlib.import_module('matplotlib.dates')
+
+    @reify_classmethod
+    def _imp_numpy(cls):
+        """Lazy loader for import numpy"""
+        import importlib
+        return importlib.import_module('numpy')
+
+    @reify_classmethod
+    def _imp_xml_etree_elementtree(cls):
+        """Lazy loader for import xml.etree.ElementTree"""
+        import importlib
+        return importlib.import_module('xml.etree.ElementTree')
+
+    @classmethod
+    def thin(cls, positions, gap):
+        """Get the indexes of the labels to write : one by slot of gap.
+
+        :param positions: The sorted positions of the labels.
+        :type positions: numpy.ndarray
+        :param gap: The min distance between 2 labels, in the unit of positions.
+        :type gap: float
+        :returns: the sorted indexes of the labels to keep
+        :rtype: numpy.ndarray
+        """
+        np = cls._imp_numpy
+        positions = np.asarray(positions, dtype='float64')
+        if len(positions) == 0 or gap <= 0:
+            return np.arange(len(positions))
+        slots = np.floor((positions - positions[0]) / gap).astype('int64')
+        __, keep = np.unique(slots, return_index=True)
+        return keep
+
+    @classmethod
+    def render(cls, job):
+        """Draw a timeline and save it
+
+        :param job: The job built by OSIntTimeline.render_job.
+        :type job: dict
+        :returns: the path of the image
+        :rtype: str
+        """
+        np = cls._imp_numpy
+        plt = cls._imp_matplotlib_pyplot
+        mdates = cls._imp_matplotlib_dates
+        dates = np.asarray(job['dates'], dtype='datetime64[D]')
+        labels = job['labels']
+        color = job['color']
+        fontsize = job['fontsize']
+
+        fig, ax = plt.subplots(figsize=(job['width'] / job['dpi'], job['height'] / job['dpi']))
+        try:
+            ax.plot(dates, np.zeros(len(dates)), color=color, linewidth=2, zorder=4)
+            markers = ax.scatter(dates, np.zeros(len(dates)), s=100, marker=job['marker'],
+                color=color, edgecolors='white', linewidths=2, zorder=5)
+            markers.set_gid(cls.events_gid)
+
+            if len(dates) > 0:
+                # The room of a rotated label on the x axis, in days
+                xnum = mdates.date2num(dates)
+                span = max(xnum[-1] - xnum[0], 1)
+                label_px = fontsize * job['dpi'] / 72 * 2
+                keep = cls.thin(xnum, span * label_px / job['width'])
+                up = np.arange(len(keep)) % 2 == 0
+                y_text = np.where(up, 0.15, -0.15)
+                ax.vlines(dates[keep], 0, y_text * 0.8, color=color, alpha=0.3, linewidth=1)
+                bbox = dict(boxstyle='round,pad=0.3', facecolor='white', edgecolor=color, alpha=0.8)
+                for i, idx in enumerate(keep):
+                    ax.text(dates[idx], y_text[i], labels[idx],
+                        ha='left' if up[i] else 'right', va='bottom' if up[i] else 'top',
+                        fontsize=fontsize, rotation=45, bbox=bbox)
+
+            ax.set_ylim(-0.5, 0.5)
+            ax.yaxis.set_visible(False)
+            ax.spines['left'].set_visible(False)
+            ax.spines['right'].set_visible(False)
+            ax.spines['top'].set_visible(False)
+
+            ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
+            ax.xaxis.set_major_locator(mdates.AutoDateLocator())
+            plt.setp(ax.get_xticklabels(), rotation=90, ha='right', fontsize=fontsize + 2)
+
+            ax.grid(True, axis='x', alpha=0.3, linestyle='--')
+
+            tmpf = job['filepath'] + '.tmp'
+            fig.savefig(tmpf, format=job['format'], dpi=job['dpi'], bbox_inches='tight',
+                facecolor='white')
+            if job['format'] == 'svg':
+                cls.add_tooltips(tmpf, labels)
+            os.replace(tmpf, job['filepath'])
+        finally:
+            plt.close(fig)
+        return job['filepath']
+
+    @classmethod
+    def add_tooltips(cls, filepath, labels):
+        """Add the labels of the events as tooltips of their markers in a svg
+
+        :param filepath: The svg file.
+        :type filepath: str
+        :param labels: The labels of the events, in the order of the markers.
+        :type labels: list of str
+        """
+        et = cls._imp_xml_etree_elementtree
+        svgns = 'http://www.w3.org/2000/svg'
+        et.register_namespace('', svgns)
+        et.register_namespace('xlink', 'http://www.w3.org/1999/xlink')
+        tree = et.parse(filepath)
+        for group in tree.iter('{%s}g' % svgns):
+            if group.get('id') == cls.events_gid:
+                for use, label in zip(group.iter('{%s}use' % svgns), labels):
+                    title = et.SubElement(use, '{%s}title' % svgns)
+                    title.text = label
+                break
+        tree.write(filepath, xml_declaration=True, encoding='utf-8')
+
+def timeline_worker_init():
+    """Use a non interactive backend in a worker process"""
+    OSIntTimelineRenderer._imp_matplotlib.use('Agg')
+
+def render_timeline(job):
+    """Render a timeline job, in a worker process or not
+
+    :param job: The job built by OSIntTimeline.render_job.
+    :type job: dict
+    :returns: the path of the image
+    :rtype: str
+    """
+    return OSIntTimelineRenderer.render(job)
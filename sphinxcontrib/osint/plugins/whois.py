@@ -26,7 +26,7 @@ from sphinx.writers.latex import LaTeXTranslator
 
 from .. import option_main, option_filters
 from ..osintlib import BaseAdmonition, Index, OSIntItem, OSIntOrg, OSIntReport
-from . import reify_classmethod, PluginDirective, SphinxDirective
+from . import PluginDirective, SphinxDirective
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +40,10 @@ class Whois(PluginDirective):
         return [
             ('osint_whois_store', 'whois_store', 'html'),
             ('osint_whois_cache', 'whois_cache', 'html'),
+            ('osint_whois_ttl', 30, 'html'),
+            ('osint_whois_workers', 8, 'html'),
+            ('osint_whois_registry_delay', 2, 'html'),
+            ('osint_whois_server', None, 'html'),
         ]
 
     @classmethod
@@ -55,6 +59,35 @@ class Whois(PluginDirective):
     @classmethod
     def add_events(cls, app):
         app.add_event('whois-defined')
+        # After the fetch stage
+        app.connect('env-updated', cls.resolve_whoiss, priority=500)
+
+    @classmethod
+    def resolve_whoiss(cls, app, env):
+        """Resolve the domains of all the whois before writing docs.
+        Lookups run in a pool of threads, paced by registry.
+        Whois found in the store or resolved less than osint_whois_ttl days
+        ago are not resolved again."""
+        from sphinx.util.display import status_iterator
+        from .whoislib import OSIntWhoisResolver
+
+        quest = env.get_domain('osint').quest
+        tasks = {}
+        for name in list(quest.whoiss.keys()):
+            whois = quest.whoiss[name]
+            if os.path.isfile(whois.store_files()[1]):
+                continue
+            previous = whois.load_cache()
+            if OSIntWhoisResolver.is_stale(previous, env.config.osint_whois_ttl):
+                tasks[name] = (whois.domain, previous)
+        if len(tasks) == 0:
+            return []
+        resolver = OSIntWhois.resolver(env.config)
+        verbosity = app.verbosity if app is not None else 0
+        for name, result in status_iterator(resolver.resolve_all(tasks), 'resolving whois... ',
+                'darkgreen', len(tasks), verbosity, stringify_func=lambda r: r[0]):
+            quest.whoiss[name].dump_cache(result)
+        return []
 
     @classmethod
     def add_nodes(cls, app):
@@ -275,24 +308,27 @@ class Whois(PluginDirective):
 
                 bullet_list = nodes.bullet_list()
                 node += bullet_list
-                if 'domain_name' in result['whois']:
-                    list_item = nodes.list_item()
-                    paragraph = nodes.paragraph(f"Domain : {result['whois']['domain_name']}", f"Domain : {result['whois']['domain_name']}")
-                    list_item.append(paragraph)
-                    bullet_list.append(list_item)
-                if 'registrar' in result['whois']:
-                    list_item = nodes.list_item()
-                    paragraph = nodes.paragraph(f"Registrar : {result['whois']['registrar']}", f"Registrar : {result['whois']['registrar']}")
-                    list_item.append(paragraph)
-                    bullet_list.append(list_item)
-                if 'creation_date' in result['whois']:
-                    list_item = nodes.list_item()
-                    paragraph = nodes.paragraph(f"Creation date : {result['whois']['creation_date']}", f"Creation date : {result['whois']['creation_date']}")
-                    list_item.append(paragraph)
-                    bullet_list.append(list_item)
-                if 'expiration_date' in result['whois']:
+                whois = result['whois'] if result['whois'] is not None else {}
+                lines = []
+                if 'domain_name' in whois:
+                    lines.append(f"Domain : {whois['domain_name']}")
+                if 'registrar' in whois:
+                    lines.append(f"Registrar : {whois['registrar']}")
+                if 'creation_date' in whois:
+                    lines.append(f"Creation date : {whois['creation_date']}")
+                if 'updated_date' in whois:
+                    lines.append(f"Updated date : {whois['updated_date']}")
+                if 'expiration_date' in whois:
+                    lines.append(f"Expiration date : {whois['expiration_date']}")
+                record = result.get('record')
+                if record is not None and len(record['name_servers']) > 0:
+                    lines.append(f"Name servers : {', '.join(record['name_servers'])}")
+                for change in result.get('history', []):
+                    for field, (old, new) in change['changes'].items():
+                        lines.append(f"Changed {change['time'][:10]} : {field} {old} -> {new}")
+                for line in lines:
                     list_item = nodes.list_item()
-                    paragraph = nodes.paragraph(f"Updated date : {result['whois']['updated_date']}", f"Updated date : {result['whois']['updated_date']}")
+                    paragraph = nodes.paragraph(line, line)
                     list_item.append(paragraph)
                     bullet_list.append(list_item)
 
@@ -382,7 +418,7 @@ class Whois(PluginDirective):
             :type kwargs: kwargs
             """
             whois = OSIntWhois(name, label, quest=quest, **kwargs)
-            quest.whoiss[whois.name] = whois
+            quest._index_set('whoiss', whois)
         quest.add_whois = add_whois
 
         global get_whoiss
@@ -501,37 +537,66 @@ class OSIntWhois(OSIntItem):
             self._cats = self.quest.orgs[self.orgs[0]].cats
         return self._cats
 
-    @reify_classmethod
-    def _imp_whois(cls):
-        """Lazy loader for import whois"""
-        import importlib
-        return importlib.import_module('whois')
+    @property
+    def domain(self):
+        """The domain to lookup"""
+        return self.name.replace(self.prefix+".", "", 1)
+
+    def cache_files(self):
+        """Get the json file of the whois in cache, relative to srcdir and full"""
+        cachef = os.path.join(self.quest.sphinx_env.config.osint_whois_cache, f'{self.domain}.json')
+        return cachef, os.path.join(self.quest.sphinx_env.srcdir, cachef)
 
-    def analyse(self, timeout=30):
-        """Analyse it
+    def store_files(self):
+        """Get the json file of the whois in store, relative to srcdir and full"""
+        storef = os.path.join(self.quest.sphinx_env.config.osint_whois_store, f'{self.domain}.json')
+        return storef, os.path.join(self.quest.sphinx_env.srcdir, storef)
+
+    def load_cache(self):
+        """Load the last result from cache
+
+        :returns: the result of OSIntWhoisResolver.resolve or None
+        :rtype: dict
         """
-        cachef = os.path.join(self.quest.sphinx_env.config.osint_whois_cache, f'{self.name.replace(self.prefix+".","")}.json')
-        ffull = os.path.join(self.quest.sphinx_env.srcdir, cachef)
-        storef = os.path.join(self.quest.sphinx_env.config.osint_whois_store, f'{self.name.replace(self.prefix+".","")}.json')
-
-        if os.path.isfile(cachef):
-            return cachef, ffull
-        if os.path.isfile(storef):
-            ffull = os.path.join(self.quest.sphinx_env.srcdir, storef)
-            return storef, ffull
+        _, ffull = self.cache_files()
+        if os.path.isfile(ffull) is False:
+            return None
         try:
-            with self.time_limit(timeout):
-                w = self._imp_whois.whois(self.name)
-                result = {
-                    'whois' : dict(w),
-                }
-                with open(cachef, 'w') as f:
-                    f.write(self._imp_json.dumps(result, indent=2, default=str))
+            with open(ffull, 'r') as f:
+                return self._imp_json.load(f)
         except Exception:
-            logger.exception('Exception getting whois of %s to %s' %(self.name, cachef))
-            with open(cachef, 'w') as f:
-                f.write(self._imp_json.dumps({'whois':None}))
+            logger.exception('Exception loading whois of %s from %s' %(self.name, ffull))
+            return None
 
+    def dump_cache(self, result):
+        """Write a result of OSIntWhoisResolver.resolve to cache"""
+        _, ffull = self.cache_files()
+        tmpf = ffull + '.tmp'
+        with open(tmpf, 'w') as f:
+            f.write(self._imp_json.dumps(result, indent=2, default=str))
+        os.replace(tmpf, ffull)
+
+    @classmethod
+    def resolver(cls, config):
+        """Get the resolver for the config of the build"""
+        from .whoislib import OSIntWhoisResolver
+        return OSIntWhoisResolver.get_resolver(server=config.osint_whois_server,
+            workers=config.osint_whois_workers, delay=config.osint_whois_registry_delay)
+
+    def analyse(self):
+        """Analyse it. Whois are usually resolved by Whois.resolve_whoiss,
+        it is only resolved here when it was not.
+        """
+        from .whoislib import OSIntWhoisResolver
+
+        storef, ffull = self.store_files()
+        if os.path.isfile(ffull):
+            return storef, ffull
+        cachef, ffull = self.cache_files()
+        previous = self.load_cache()
+        config = self.quest.sphinx_env.config
+        if OSIntWhoisResolver.is_stale(previous, config.osint_whois_ttl):
+            self.dump_cache(self.resolver(config).resolve(self.domain, previous=previous))
         return cachef, ffull
 
 
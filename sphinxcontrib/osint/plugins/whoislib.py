@@ -0,0 +1,228 @@
+# -*- encoding: utf-8 -*-
+"""
+The whois lib plugins
+---------------------
+
+Domains of the whois directives are resolved once per build, before docs are
+written, by a pool of threads. Requests sent to a same registry are paced.
+Records are normalized and refreshed after a ttl : the changes of registrar,
+expiration date and name servers are kept in an history.
+
+"""
+from __future__ import annotations
+
+__author__ = 'bibi21000 aka Sébastien GALLET'
+__email__ = 'bibi21000@gmail.com'
+
+import time
+import socket
+import threading
+from datetime import datetime, timezone
+
+from sphinx.util import logging
+
+from . import reify_classmethod
+
+log = logging.getLogger(__name__)
+
+
+class OSIntWhoisResolver():
+
+    #: The fields of the normalized record
+    record_fields = ('domain_name', 'registrar', 'creation_date', 'updated_date',
+        'expiration_date', 'name_servers')
+    #: The fields compared between 2 lookups to build the history
+    history_fields = ('registrar', 'expiration_date', 'name_servers')
+    #: The resolvers shared by the whois of a build : {(server, workers, delay, timeout): resolver}
+    resolvers = {}
+    _resolvers_lock = threading.Lock()
+
+    def __init__(self, server=None, workers=8, delay=2, timeout=10):
+        """Resolve domains with whois
+
+        :param server: The whois server as host or host:port. None to let python-whois
+            find the server of the registry.
+        :type server: str or None
+        :param workers: The number of concurrent lookups.
+        :type workers: int
+        :param delay: The delay in seconds between 2 lookups on a same registry.
+        :type delay: float
+        :param timeout: The timeout of a lookup in seconds.
+        :type timeout: int
+        """
+        self.server = server
+        self.workers = max(1, workers)
+        self.delay = delay
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pace = {}
+
+    @classmethod
+    def get_resolver(cls, server=None, workers=8, delay=2, timeout=10):
+        """Get a resolver sharing its pacing with the other lookups of the build"""
+        with cls._resolvers_lock:
+            key = (server, workers, delay, timeout)
+            if key not in cls.resolvers:
+                cls.resolvers[key] = cls(server=server, workers=workers, delay=delay, timeout=timeout)
+            return cls.resolvers[key]
+
+    @reify_classmethod
+    def _imp_whois(cls):
+        """Lazy loader for import whois"""
+        import importlib
+        return importlib.import_module('whois')
+
+    @reify_classmethod
+    def _imp_concurrent_futures(cls):
+        """Lazy loader for import concurrent.futures"""
+        import importlib
+        return importlib.import_module('concurrent.futures')
+
+    def registry(self, domain):
+        """Get the registry of a domain : its tld or the whois server"""
+        if self.server is not None:
+            return self.server
+        return domain.rsplit('.', 1)[-1].lower()
+
+    def wait(self, registry):
+        """Sleep until a lookup on registry is allowed"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._pace.get(registry, now))
+            self._pace[registry] = start + self.delay
+        if start > now:
+            time.sleep(start - now)
+
+    def query(self, domain):
+        """Lookup a domain
+
+        :param domain: The domain.
+        :type domain: str
+        :returns: the whois fields parsed by python-whois
+        :rtype: dict
+        """
+        self.wait(self.registry(domain))
+        if self.server is None:
+            return dict(self._imp_whois.whois(domain, timeout=self.timeout))
+        host, __, port = self.server.partition(':')
+        chunks = []
+        with socket.create_connection((host, int(port or 43)), timeout=self.timeout) as sock:
+            sock.sendall(f'{domain}\r\n'.encode())
+            while True:
+                data = sock.recv(4096)
+                if not data:
+                    break
+                chunks.append(data)
+        return dict(self._imp_whois.WhoisEntry.load(domain, b''.join(chunks).decode('utf-8', errors='replace')))
+
+    @classmethod
+    def normalize(cls, whois):
+        """Get a normalized record from whois fields :
+        one value by field, dates as iso strings, sorted lowercase name servers.
+
+        :param whois: The whois fields.
+        :type whois: dict
+        :rtype: dict
+        """
+        def first(value):
+            if isinstance(value, (list, tuple)):
+                return value[0] if len(value) > 0 else None
+            return value
+
+        record = {}
+        for field in cls.record_fields:
+            value = whois.get(field)
+            if field == 'name_servers':
+                if value is None:
+                    value = []
+                elif isinstance(value, str):
+                    value = [value]
+                record[field] = sorted(set(ns.lower().rstrip('.') for ns in value if ns))
+                continue
+            value = first(value)
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            elif isinstance(value, str) and field == 'domain_name':
+                value = value.lower()
+            record[field] = value
+        return record
+
+    @classmethod
+    def changes(cls, old, new):
+        """Get the changes between 2 records
+
+        :returns: {field: [old, new]}
+        :rtype: dict
+        """
+        if old is None or new is None:
+            return {}
+        return {field: [old.get(field), new.get(field)] for field in cls.history_fields
+            if old.get(field) != new.get(field)}
+
+    @classmethod
+    def is_stale(cls, result, ttl, retry=3600):
+        """Check if a result must be resolved again
+
+        :param result: The result of resolve. None if the domain was never resolved.
+        :type result: dict or None
+        :param ttl: The number of days a result is kept. 0 or None to keep it forever.
+        :type ttl: int
+        :param retry: The number of seconds before retrying a failed lookup.
+        :type retry: int
+        :rtype: bool
+        """
+        def age(date):
+            return (datetime.now(timezone.utc) - datetime.fromisoformat(date)).total_seconds()
+
+        if result is None:
+            return True
+        if result.get('error') is not None and age(result['error']) < retry:
+            return False
+        if result.get('whois') is None:
+            return True
+        if not ttl:
+            return False
+        return result.get('time') is None or age(result['time']) > ttl * 24 * 3600
+
+    def resolve(self, domain, previous=None):
+        """Lookup a domain and update its previous result
+
+        :param domain: The domain.
+        :type domain: str
+        :param previous: The previous result. None if the domain was never resolved.
+        :type previous: dict or None
+        :returns: {'whois': fields, 'record': normalized fields, 'time': iso date, 'history': list}
+            On error, the previous result is returned with the date of the error.
+        :rtype: dict
+        """
+        history = list(previous.get('history', [])) if previous is not None else []
+        now = datetime.now(timezone.utc).isoformat()
+        try:
+            whois = self.query(domain)
+        except Exception:
+            log.warning("Can't get whois of %s" % domain, exc_info=True)
+            if previous is not None and previous.get('whois') is not None:
+                return dict(previous, error=now)
+            return {'whois': None, 'record': None, 'time': None, 'error': now, 'history': history}
+        record = self.normalize(whois)
+        changes = self.changes(previous.get('record') if previous is not None else None, record)
+        if len(changes) > 0:
+            history.append({'time': now, 'changes': changes})
+        return {'whois': whois, 'record': record, 'time': now, 'history': history}
+
+    def resolve_all(self, tasks):
+        """Resolve domains concurrently
+
+        :param tasks: The domains to resolve : {key: (domain, previous)}.
+        :type tasks: dict
+        :returns: a generator of (key, result)
+        :rtype: generator
+        """
+        if len(tasks) == 0:
+            return
+        futures_mod = self._imp_concurrent_futures
+        with futures_mod.ThreadPoolExecutor(max_workers=min(self.workers, len(tasks))) as pool:
+            futures = {pool.submit(self.resolve, domain, previous): key
+                for key, (domain, previous) in tasks.items()}
+            for future in futures_mod.as_completed(futures):
+                yield futures[future], future.result()
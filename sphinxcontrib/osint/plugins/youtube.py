@@ -404,7 +404,7 @@ class Youtube(PluginDirective):
             :type kwargs: kwargs
             """
             ytchannel = OSIntYtChannel(name, label, quest=quest, **kwargs)
-            quest.ytchannels[ytchannel.name] = ytchannel
+            quest._index_set('ytchannels', ytchannel)
         quest.add_ytchannel = add_ytchannel
 
         global get_ytchannels
@@ -9,6 +9,8 @@ from __future__ import annotations
 import configparser
 import ftplib
 import hashlib
+import hmac
+import json
 import logging
 import os
 import stat
@@ -16,7 +18,7 @@ import threading
 from abc import ABC, abstractmethod
 from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from dataclasses import dataclass, field
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from enum import Enum
 from pathlib import Path
 from typing import Optional
@@ -55,6 +57,11 @@ class SyncConfig:
     lock_suffix: str = ".lck"      # suffixe du fichier verrou (fetch_locked)
     lock_poll_interval: float = 2.0  # secondes entre deux sondages du verrou
     lock_timeout: float = 60.0      # secondes avant LockTimeoutError
+    manifest: bool = False          # journal distant des fichiers publiés (évite les balayages)
+    manifest_name: str = ".remotesync-manifest.json"  # nom du journal dans le répertoire distant
+    manifest_key: str = ""          # clé HMAC du journal (simple somme sha256 si vide)
+    manifest_cache: str = ""        # cache local du journal (défaut : logdir, puis ~/.cache/remotesync)
+    manifest_max_age: float = 7.0   # jours entre deux balayages complets de contrôle (0 = jamais)
 
     @classmethod
     def from_ini(cls, path: str | Path, section: str = "remotesync") -> "SyncConfig":
@@ -92,6 +99,11 @@ class SyncConfig:
             lock_suffix=s.get("lock_suffix", ".lck"),
             lock_poll_interval=float(s.get("lock_poll_interval", 2.0)),
             lock_timeout=float(s.get("lock_timeout", 60.0)),
+            manifest=s.getboolean("manifest", False),
+            manifest_name=s.get("manifest_name", ".remotesync-manifest.json"),
+            manifest_key=s.get("manifest_key", ""),
+            manifest_cache=s.get("manifest_cache", ""),
+            manifest_max_age=float(s.get("manifest_max_age", 7.0)),
         )
 
 
@@ -425,6 +437,90 @@ def _expand_dir_closure(dirs: set[str], root: str) -> list[set[str]]:
     return [by_depth[k] for k in sorted(by_depth)]
 
 
+# ---------------------------------------------------------------------------
+# Journal (manifest) des fichiers publiés
+# ---------------------------------------------------------------------------
+
+_MANIFEST_VERSION = 1
+
+
+def _file_sha256(path: Path) -> str:
+    """Empreinte sha256 du contenu d'un fichier local, lu par blocs."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _manifest_signature(manifest: dict, key: str) -> str:
+    """
+    Signature d'un journal, calculée sur sa forme JSON canonique (clés
+    triées, sans espaces) : HMAC-SHA256 si une clé est configurée, simple
+    somme sha256 sinon — qui détecte alors un journal tronqué ou corrompu,
+    mais pas un journal réécrit volontairement sur le serveur.
+    """
+    payload = json.dumps(
+        {k: manifest.get(k) for k in ("version", "created", "scanned", "files")},
+        sort_keys=True, separators=(",", ":"),
+    ).encode("utf-8")
+    if key:
+        return "hmac-sha256:" + hmac.new(key.encode("utf-8"), payload, hashlib.sha256).hexdigest()
+    return "sha256:" + hashlib.sha256(payload).hexdigest()
+
+
+def _sign_manifest(files: dict[str, list], scanned: str, key: str) -> dict:
+    """
+    Construit un journal signé.
+
+    :param files:   ``{chemin relatif : [taille, mtime local, sha256]}``.
+    :param scanned: Date ISO du dernier balayage distant complet.
+    :param key:     Clé HMAC (``config.manifest_key``).
+    """
+    manifest = {
+        "version": _MANIFEST_VERSION,
+        "created": datetime.now(tz=timezone.utc).isoformat(),
+        "scanned": scanned,
+        "files": files,
+    }
+    manifest["signature"] = _manifest_signature(manifest, key)
+    return manifest
+
+
+def _verify_manifest(manifest: object, key: str) -> bool:
+    """Retourne True si le journal est bien formé et que sa signature est valide."""
+    if not isinstance(manifest, dict) or manifest.get("version") != _MANIFEST_VERSION:
+        return False
+    if not isinstance(manifest.get("files"), dict) or not isinstance(manifest.get("scanned"), str):
+        return False
+    return hmac.compare_digest(
+        str(manifest.get("signature", "")), _manifest_signature(manifest, key)
+    )
+
+
+def _manifest_entries(
+    local: Path, rels: set[str], previous: dict[str, list], max_workers: int = 8
+) -> dict[str, list]:
+    """
+    Calcule ``[taille, mtime, sha256]`` de chaque fichier local.
+
+    L'empreinte du journal précédent est reprise telle quelle quand la
+    taille et le mtime n'ont pas changé : seuls les fichiers nouveaux ou
+    touchés sont relus. Sphinx réécrit souvent des pages à l'identique,
+    c'est justement l'empreinte qui permet de ne pas les renvoyer. La
+    lecture se fait dans un pool de threads (hashlib libère le GIL).
+    """
+    def entry(rel: str) -> tuple[str, list]:
+        st = (local / rel).stat()
+        old = previous.get(rel)
+        if old is not None and old[0] == st.st_size and old[1] == st.st_mtime:
+            return rel, old
+        return rel, [st.st_size, st.st_mtime, _file_sha256(local / rel)]
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        return dict(pool.map(entry, sorted(rels)))
+
+
 # ---------------------------------------------------------------------------
 # Backend abstrait
 # ---------------------------------------------------------------------------
@@ -531,6 +627,14 @@ class _BaseBackend(ABC):
     @abstractmethod
     def delete_remote(self, remote_path: str) -> None: ...
 
+    @abstractmethod
+    def rename_remote(self, remote_src: str, remote_dst: str) -> None:
+        """
+        Renomme remote_src en remote_dst, en remplaçant remote_dst s'il
+        existe — utilisé pour publier le journal d'un seul coup.
+        """
+        ...
+
     def __enter__(self):
         self.connect()
         return self
@@ -717,6 +821,18 @@ class _FTPBackend(_BaseBackend):
     def delete_remote(self, remote_path: str) -> None:
         self._ftp.delete(remote_path)
 
+    def rename_remote(self, remote_src: str, remote_dst: str) -> None:
+        try:
+            self._ftp.rename(remote_src, remote_dst)
+        except ftplib.error_perm:
+            # Certains serveurs refusent d'écraser la cible (RNTO → 550) :
+            # on la supprime puis on renomme.
+            try:
+                self._ftp.delete(remote_dst)
+            except ftplib.error_perm:
+                pass
+            self._ftp.rename(remote_src, remote_dst)
+
 
 # ---------------------------------------------------------------------------
 # Backend SFTP (SSH)
@@ -870,6 +986,19 @@ class _SFTPBackend(_BaseBackend):
     def delete_remote(self, remote_path: str) -> None:
         self._sftp.remove(remote_path)
 
+    def rename_remote(self, remote_src: str, remote_dst: str) -> None:
+        try:
+            # Extension posix-rename@openssh.com : remplacement atomique.
+            self._sftp.posix_rename(remote_src, remote_dst)
+        except OSError:
+            # Serveur sans l'extension : rename() SFTP standard, qui échoue
+            # si la cible existe.
+            try:
+                self._sftp.remove(remote_dst)
+            except FileNotFoundError:
+                pass
+            self._sftp.rename(remote_src, remote_dst)
+
 
 # ---------------------------------------------------------------------------
 # Exceptions publiques
@@ -1187,6 +1316,15 @@ class RemoteSync:
                             - Si absolu : utilisé tel quel.
         :param max_workers: Nombre de connexions/transferts simultanés.
                             Priorité : argument > ``config.max_workers`` (défaut 5).
+
+        Si ``config.manifest`` est activé, un journal signé des fichiers
+        publiés (taille, mtime, sha256) est déposé dans ``remote_dir`` à la
+        fin de chaque synchronisation et gardé en cache local. La
+        synchronisation suivante compare les fichiers locaux à ce journal
+        sans aucun listing distant ; le balayage complet ne sert plus que
+        si le journal est absent, invalide ou trop ancien
+        (``config.manifest_max_age``). Dans ce mode, seuls les fichiers du
+        journal sont candidats à la suppression des orphelins.
         """
         result = SyncResult()
         lock = threading.Lock()
@@ -1212,45 +1350,108 @@ class RemoteSync:
         # plusieurs répertoires.
         local_files = _scan_local_files(local, max_workers=max(workers * 2, 8))
 
-        # ── 2. Pré-création des répertoires distants (sérialisée) ─────────────
-        # On crée l'arborescence avant le lancement des workers pour éviter
-        # les conditions de course sur makedirs entre threads.
-        remote_dirs_needed = {
-            remote_dir.rstrip("/") + "/" + os.path.dirname(rel)
-            for rel in local_files
-        }
-        try:
-            self._ensure_remote_dirs_parallel(remote_dirs_needed, remote_dir, workers)
-        except Exception as exc:
-            logger.exception("Erreur lors de la préparation des répertoires distants")
-            result.errors.append(f"Préparation distante : {exc}")
-            return result
+        # ── 1bis. Journal des fichiers publiés (optionnel) ─────────────────────
+        # Si le dernier journal est valide, toute la décision se fait en
+        # local : pas de listing distant, seuls les répertoires que le
+        # journal ne connaît pas encore sont créés.
+        previous: Optional[dict] = None
+        local_entries: dict[str, list] = {}
+        failed: set[str] = set()
+        if self.config.manifest:
+            try:
+                previous = self._load_manifest(remote_dir)
+            except Exception as exc:
+                logger.warning("[MANIFEST] lecture impossible (%s) → balayage complet", exc)
+            try:
+                local_entries = _manifest_entries(
+                    local, local_files, previous["files"] if previous else {},
+                    max_workers=max(workers * 2, 8),
+                )
+            except OSError as exc:
+                logger.exception("Erreur lors du calcul des empreintes locales")
+                result.errors.append(f"Empreintes locales : {exc}")
+                return result
+
+        if previous is not None:
+            known: dict[str, list] = previous["files"]
+            to_upload: set[str] = set()
+            for rel in sorted(local_files):
+                old = known.get(rel)
+                entry = local_entries[rel]
+                if old is not None and old[0] == entry[0] and old[2] == entry[2]:
+                    result.skipped.append(remote_dir.rstrip("/") + "/" + rel)
+                else:
+                    to_upload.add(rel)
+            logger.info("[MANIFEST] %d fichier(s) à jour d'après le journal, %d à envoyer",
+                        len(result.skipped), len(to_upload))
+
+            known_dirs = {remote_dir.rstrip("/") + "/" + os.path.dirname(rel) for rel in known}
+            remote_dirs_needed = {
+                remote_dir.rstrip("/") + "/" + os.path.dirname(rel)
+                for rel in to_upload
+            } - known_dirs
+            if remote_dirs_needed and not self.config.dry_run:
+                try:
+                    self._ensure_remote_dirs_parallel(remote_dirs_needed, remote_dir, workers)
+                except Exception as exc:
+                    logger.exception("Erreur lors de la préparation des répertoires distants")
+                    result.errors.append(f"Préparation distante : {exc}")
+                    return result
 
-        # ── 2bis. Balayage distant EN PARALLÈLE (listing + mtimes) ────────────
-        # Sur SSH/SFTP, une seule connexion qui liste les répertoires un par
-        # un paie la latence réseau complète à chaque fois : c'est souvent le
-        # vrai goulot, avant même les uploads. On répartit donc le parcours
-        # de l'arborescence distante sur plusieurs connexions simultanées
-        # (voir _scan_remote_parallel), ce qui remplace aussi l'ancien
-        # MDTM/stat interrogé un par un pour chaque fichier pendant les
-        # transferts. Même nombre de connexions que pour les uploads
-        # (``max_workers``), pour rester cohérent avec ce que le serveur
-        # accepte déjà.
-        try:
-            remote_mtimes: dict[str, Optional[float]] = self._scan_remote_parallel(
-                remote_dir, workers
+            # Tout ce qui reste à traiter est à envoyer : aucun mtime distant.
+            remote_mtimes: dict[str, Optional[float]] = {}
+            remote_files_list: list[str] = (
+                [remote_dir.rstrip("/") + "/" + rel for rel in known if rel not in local_files]
+                if self.config.delete_orphans else []
             )
-        except Exception as exc:
-            logger.exception("Erreur lors du balayage distant")
-            result.errors.append(f"Balayage distant : {exc}")
-            return result
+            sorted_files = sorted(to_upload)
 
-        # Liste des fichiers distants (pour la suppression des orphelins),
-        # dérivée du même balayage — pas d'appel réseau supplémentaire.
-        remote_files_list: list[str] = (
-            [remote_dir.rstrip("/") + "/" + rel for rel in remote_mtimes]
-            if self.config.delete_orphans else []
-        )
+        else:
+            # ── 2. Pré-création des répertoires distants (sérialisée) ─────────────
+            # On crée l'arborescence avant le lancement des workers pour éviter
+            # les conditions de course sur makedirs entre threads.
+            remote_dirs_needed = {
+                remote_dir.rstrip("/") + "/" + os.path.dirname(rel)
+                for rel in local_files
+            }
+            try:
+                self._ensure_remote_dirs_parallel(remote_dirs_needed, remote_dir, workers)
+            except Exception as exc:
+                logger.exception("Erreur lors de la préparation des répertoires distants")
+                result.errors.append(f"Préparation distante : {exc}")
+                return result
+
+            # ── 2bis. Balayage distant EN PARALLÈLE (listing + mtimes) ────────────
+            # Sur SSH/SFTP, une seule connexion qui liste les répertoires un par
+            # un paie la latence réseau complète à chaque fois : c'est souvent le
+            # vrai goulot, avant même les uploads. On répartit donc le parcours
+            # de l'arborescence distante sur plusieurs connexions simultanées
+            # (voir _scan_remote_parallel), ce qui remplace aussi l'ancien
+            # MDTM/stat interrogé un par un pour chaque fichier pendant les
+            # transferts. Même nombre de connexions que pour les uploads
+            # (``max_workers``), pour rester cohérent avec ce que le serveur
+            # accepte déjà.
+            try:
+                remote_mtimes = self._scan_remote_parallel(
+                    remote_dir, workers
+                )
+            except Exception as exc:
+                logger.exception("Erreur lors du balayage distant")
+                result.errors.append(f"Balayage distant : {exc}")
+                return result
+
+            if self.config.manifest:
+                # Le journal lui-même n'est ni un fichier à comparer ni un orphelin.
+                for name in (self.config.manifest_name, self.config.manifest_name + ".tmp"):
+                    remote_mtimes.pop(name, None)
+
+            # Liste des fichiers distants (pour la suppression des orphelins),
+            # dérivée du même balayage — pas d'appel réseau supplémentaire.
+            remote_files_list = (
+                [remote_dir.rstrip("/") + "/" + rel for rel in remote_mtimes]
+                if self.config.delete_orphans else []
+            )
+            sorted_files = sorted(local_files)
 
         # ── 3. Transferts parallèles — connexion persistante par worker ──────────
         #
@@ -1261,7 +1462,6 @@ class RemoteSync:
         # On distribue les fichiers en lots équilibrés (round-robin), puis chaque
         # worker ouvre UNE connexion pour traiter tous les fichiers de son lot.
 
-        sorted_files = sorted(local_files)
         # Découpage en lots : chaque worker reçoit un sous-ensemble de fichiers
         # distribué de façon interleaved pour équilibrer la charge (pas de split
         # en tranches consécutives qui favoriserait les gros répertoires uniques).
@@ -1320,6 +1520,7 @@ class RemoteSync:
                             logger.error("[ERROR]  %s", msg)
                             with lock:
                                 result.errors.append(msg)
+                                failed.add(rel)
 
             except Exception as exc:
                 # Erreur de connexion : tous les fichiers du lot échouent
@@ -1329,6 +1530,7 @@ class RemoteSync:
                     logger.error("[ERROR]  %s", msg)
                     with lock:
                         result.errors.append(msg)
+                        failed.add(rel)
 
         try:
             # On ne soumet que les lots non vides (si workers > nb fichiers)
@@ -1344,6 +1546,7 @@ class RemoteSync:
                         logger.error("[ERROR]  %s", msg)
                         with lock:
                             result.errors.append(msg)
+                            failed.update(batch)
         except Exception as exc:
             logger.exception("Erreur du pool de threads")
             result.errors.append(str(exc))
@@ -1365,6 +1568,26 @@ class RemoteSync:
                 logger.exception("Erreur lors de la suppression des orphelins")
                 result.errors.append(f"Suppression orphelins : {exc}")
 
+        # ── 5. Publication du journal (optionnel) ─────────────────────────────
+        # Les fichiers en échec en sont retirés (état distant inconnu : ils
+        # seront renvoyés la prochaine fois) ; les orphelins conservés sur
+        # le serveur y restent, pour pouvoir être supprimés plus tard.
+        if self.config.manifest and not self.config.dry_run:
+            files = {rel: local_entries[rel] for rel in local_files if rel not in failed}
+            if previous is not None:
+                deleted = set(result.deleted)
+                for rel, entry in previous["files"].items():
+                    if rel not in local_files and remote_dir.rstrip("/") + "/" + rel not in deleted:
+                        files[rel] = entry
+                scanned = previous["scanned"]
+            else:
+                scanned = datetime.now(tz=timezone.utc).isoformat()
+            try:
+                self._publish_manifest(remote_dir, files, scanned)
+            except Exception as exc:
+                logger.exception("Erreur lors de la publication du journal")
+                result.errors.append(f"Journal distant : {exc}")
+
         logger.info(
             "sync_directory terminé — workers=%d | ↑%d uploadé(s) | ↷%d ignoré(s) | "
             "✗%d supprimé(s) | ⚠%d erreur(s)",
@@ -1516,6 +1739,117 @@ class RemoteSync:
             return _SFTPBackend(self.config)
         return _FTPBackend(self.config)
 
+    def _manifest_cache_path(self, remote_dir: str) -> Path:
+        """
+        Chemin du cache local du journal de ``remote_dir`` : un fichier par
+        serveur, compte et répertoire distant.
+        """
+        base = self.config.manifest_cache or self.config.logdir
+        cache_dir = Path(base) if base else Path.home() / ".cache" / "remotesync"
+        ident = (
+            f"{self.config.protocol.value}://{self.config.username}@"
+            f"{self.config.host}:{self.config.port}{remote_dir.rstrip('/')}"
+        )
+        return cache_dir / f"manifest_{hashlib.sha256(ident.encode('utf-8')).hexdigest()[:16]}.json"
+
+    @staticmethod
+    def _write_manifest_cache(cache_path: Path, manifest: dict, remote_mtime: Optional[float]) -> None:
+        """Écrit le cache local (journal + mtime distant du journal) via un fichier temporaire."""
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache_path.with_name(cache_path.name + ".tmp")
+        tmp.write_text(
+            json.dumps({"remote_mtime": remote_mtime, "manifest": manifest}), encoding="utf-8"
+        )
+        os.replace(tmp, cache_path)
+
+    def _load_manifest(self, remote_dir: str) -> Optional[dict]:
+        """
+        Retourne le dernier journal publié dans ``remote_dir``, ou ``None``
+        s'il faut revenir au balayage complet : journal absent, signature
+        invalide, ou dernier balayage complet plus vieux que
+        ``config.manifest_max_age`` jours.
+
+        Aucun listing distant : un seul ``remote_mtime`` sur le journal
+        suffit quand le cache local est à jour. Sinon (cache absent, ou
+        journal republié depuis une autre machine), le journal distant est
+        téléchargé et remplace le cache.
+        """
+        key = self.config.manifest_key
+        cache_path = self._manifest_cache_path(remote_dir)
+        remote_manifest = remote_dir.rstrip("/") + "/" + self.config.manifest_name
+
+        cached: Optional[dict] = None
+        try:
+            cached = json.loads(cache_path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as exc:
+            logger.warning("[MANIFEST] cache local illisible %s : %s", cache_path, exc)
+
+        with self._build_backend() as backend:
+            remote_mtime = backend.remote_mtime(remote_manifest)
+            if (
+                isinstance(cached, dict)
+                and remote_mtime is not None
+                and cached.get("remote_mtime") == remote_mtime
+                and _verify_manifest(cached.get("manifest"), key)
+            ):
+                manifest = cached["manifest"]
+                logger.debug("[MANIFEST] cache local à jour : %s", cache_path)
+            else:
+                download = cache_path.with_name(cache_path.name + ".download")
+                download.parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    backend.download_file(remote_manifest, download)
+                    manifest = json.loads(download.read_text(encoding="utf-8"))
+                except Exception as exc:
+                    logger.info("[MANIFEST] %s indisponible (%s) → balayage complet",
+                                remote_manifest, exc)
+                    return None
+                finally:
+                    download.unlink(missing_ok=True)
+                if not _verify_manifest(manifest, key):
+                    logger.warning("[MANIFEST] signature invalide pour %s → balayage complet",
+                                   remote_manifest)
+                    return None
+                self._write_manifest_cache(cache_path, manifest, remote_mtime)
+
+        if self.config.manifest_max_age > 0:
+            try:
+                scanned = datetime.fromisoformat(manifest["scanned"])
+            except ValueError:
+                return None
+            if datetime.now(tz=timezone.utc) - scanned > timedelta(days=self.config.manifest_max_age):
+                logger.info("[MANIFEST] dernier balayage complet du %s → balayage de contrôle",
+                            manifest["scanned"])
+                return None
+        return manifest
+
+    def _publish_manifest(self, remote_dir: str, files: dict[str, list], scanned: str) -> None:
+        """
+        Signe et publie le journal de ``remote_dir`` : upload sous un nom
+        temporaire puis renommage, pour qu'un lecteur ne voie jamais de
+        journal partiel. Le cache local n'est mis à jour qu'après le
+        renommage.
+        """
+        manifest = _sign_manifest(files, scanned, self.config.manifest_key)
+        cache_path = self._manifest_cache_path(remote_dir)
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        remote_manifest = remote_dir.rstrip("/") + "/" + self.config.manifest_name
+
+        upload = cache_path.with_name(cache_path.name + ".upload")
+        upload.write_text(json.dumps(manifest, sort_keys=True), encoding="utf-8")
+        try:
+            with self._build_backend() as backend:
+                backend.upload_file(upload, remote_manifest + ".tmp", ensure_dir=False)
+                backend.rename_remote(remote_manifest + ".tmp", remote_manifest)
+                remote_mtime = backend.remote_mtime(remote_manifest)
+        finally:
+            upload.unlink(missing_ok=True)
+
+        self._write_manifest_cache(cache_path, manifest, remote_mtime)
+        logger.info("[MANIFEST] %s publié (%d fichier(s))", remote_manifest, len(files))
+
     def _scan_remote_parallel(self, remote_dir: str, max_workers: int) -> dict[str, Optional[float]]:
         """
         Parcourt récursivement ``remote_dir`` sur le serveur distant EN
@@ -108,11 +108,28 @@ def get_app(sourcedir=None, builddir=None, docdir=None):
         )
     return app
 
-def load_quest(builddir):
-    with open(os.path.join(f'{builddir}/doctrees', 'osint_quest.pickle'), 'rb') as f:
+def load_quest(builddir, kinds=None):
+    """Charge la quête depuis le store sqlite du build.
+    kinds permet de ne charger que certains types d'objets (ex: ['sources']).
+    Les anciens builds (pickle complet) restent lisibles."""
+    from ..storelib import OSIntQuestStore
+    doctreedir = f'{builddir}/doctrees'
+    if OSIntQuestStore.exists(doctreedir):
+        return OSIntQuestStore(doctreedir).load_quest(kinds=kinds)
+    with open(os.path.join(doctreedir, 'osint_quest.pickle'), 'rb') as f:
         data = pickle.load(f)
     return data
 
+def load_quest_view(builddir, cache_size=1024):
+    """Charge une vue en lecture seule de la quête : les objets sont lus
+    dans le store à la demande et seuls les cache_size derniers restent en mémoire.
+    Les anciens builds (pickle complet) sont chargés entièrement."""
+    from ..storelib import OSIntQuestStore
+    doctreedir = f'{builddir}/doctrees'
+    if OSIntQuestStore.exists(doctreedir):
+        return OSIntQuestStore(doctreedir).load_view(cache_size=cache_size)
+    return load_quest(builddir)
+
 def inject_quest_into_sphinx(sphinx_app, quest_data):
     """Réinjecte les données du pickle dans le domain OSInt de Sphinx."""
     domain = sphinx_app.env.get_domain('osint')
@@ -159,15 +159,8 @@ def ident(common, missing, label_link, label_relation, ident):
     if ident.startswith(OSIntIdent.prefix) is False:
         ident = OSIntIdent.prefix + '.' + ident
 
-    sources = []
-    for source in quest.sources:
-        data = quest.load_json_analyse_source(source.replace(f"{OSIntSource.prefix}.", ''), srcdir=sourcedir,
-            osint_analyse_store=app.config.osint_analyse_store,
-            osint_analyse_cache=app.config.osint_analyse_cache)
-        if 'ident' in data and 'idents' in data['ident']:
-            for idt in data['ident']['idents']:
-                if idt[0] == ident:
-                    sources.append(source)
+    sources = [f"{OSIntSource.prefix}.{source}"
+        for source in quest.analyse_idents_index(srcdir=sourcedir).sources(ident)]
     for event in quest.events:
         for source in sources:
             if source in quest.events[event].linked_sources():
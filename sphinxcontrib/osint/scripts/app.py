@@ -14,7 +14,7 @@ import os
 import click
 
 from ..flask import app, CascadingTemplateLoader, init_xapian
-from . import parser_makefile, cli, get_app, load_quest
+from . import parser_makefile, cli, get_app, load_quest_view
 
 @cli.command()
 @click.option('--secret_key', default=None, help="Secret key")
@@ -33,7 +33,8 @@ def serve(common, secret_key, directory, listen, debug):
         length = 20
         secret_key = ''.join(random.choices(string.ascii_letters + string.digits, k=length))
 
-    data = load_quest(os.path.realpath(directory))
+    data = load_quest_view(os.path.realpath(directory),
+        cache_size=sphinx_app.config.osint_flask_quest_cache)
 
     app.secret_key = secret_key
     app.config['SPHINX'] = sphinx_app
@@ -242,6 +242,85 @@ def profile(common, did, feed_filter, top_words, swearwords, entities, rhythm, t
     if top_words > 0:
         _print_top_words(analysis['top_words'])
 
+@cli.command()
+@click.argument('dids', nargs=-1)
+@click.option('--all/--no-all', 'all_profiles', default=False, help="Crawl all the bsky profiles of the quest")
+@click.option('--workers', default=None, type=int, help="How many profiles are updated at the same time")
+@click.option('--rate', default=None, type=float, help="Max number of requests by second for all the workers")
+@click.option('--feed-filter', default='posts_with_replies',
+    type=click.Choice(['posts_with_replies', 'posts_no_replies', 'posts_with_media', 'posts_and_author_threads']),
+    help="Which posts to fetch")
+@click.pass_obj
+def crawl(common, dids, all_profiles, workers, rate, feed_filter):
+    """Update many profiles in store concurrently.
+    Interrupted crawls resume where they stopped."""
+    sourcedir, builddir = parser_makefile(common.docdir)
+    app = get_app(sourcedir=sourcedir, builddir=builddir)
+
+    if app.config.osint_bsky_enabled is False:
+        print('Plugin bsky is not enabled')
+        sys.exit(1)
+
+    from ..plugins.bskylib import OSIntBSkyProfile
+
+    dids = [OSIntBSkyProfile.normalize_did(did) for did in dids]
+    if all_profiles is True:
+        data = load_quest(builddir)
+        dids += [did for did in OSIntBSkyProfile.quest_dids(data) if did not in dids]
+
+    diffs = OSIntBSkyProfile.crawl(dids,
+        user=app.config.osint_bsky_user,
+        apikey=app.config.osint_bsky_apikey,
+        osint_bsky_store=os.path.join(common.docdir, app.config.osint_bsky_store),
+        osint_bsky_cache=os.path.join(common.docdir, app.config.osint_bsky_cache),
+        osint_bsky_base_url=app.config.osint_bsky_base_url,
+        workers=workers if workers is not None else app.config.osint_bsky_crawl_workers,
+        rate=rate if rate is not None else app.config.osint_bsky_crawl_rate,
+        feed_filter=feed_filter)
+
+    for did in dids:
+        print(f"\nCompte : {did}")
+        if isinstance(diffs[did], Exception):
+            print(f"  Erreur : {diffs[did]}")
+        else:
+            _print_diff(diffs[did])
+
+@cli.command()
+@click.argument('dids', nargs=-1)
+@click.option('--top', default=20, type=int, help="How many pairs of profiles to display")
+@click.pass_obj
+def coordination(common, dids, top):
+    """Find the pairs of profiles sharing the most followers and follows.
+    Use all the bsky profiles of the quest if no did is given."""
+    sourcedir, builddir = parser_makefile(common.docdir)
+    app = get_app(sourcedir=sourcedir, builddir=builddir)
+
+    if app.config.osint_bsky_enabled is False:
+        print('Plugin bsky is not enabled')
+        sys.exit(1)
+
+    from ..plugins.bskylib import OSIntBSkyProfile
+
+    store = os.path.join(common.docdir, app.config.osint_bsky_store)
+    cache = os.path.join(common.docdir, app.config.osint_bsky_cache)
+    dids = [OSIntBSkyProfile.normalize_did(did) for did in dids]
+    if len(dids) == 0:
+        data = load_quest(builddir)
+        dids = [did for did in OSIntBSkyProfile.quest_dids(data)
+            if OSIntBSkyProfile.has_store(did, osint_bsky_store=store, osint_bsky_cache=cache)]
+
+    matrix = OSIntBSkyProfile.coordination_matrix(dids, osint_bsky_store=store, osint_bsky_cache=cache)
+
+    for collection in ('followers', 'follows'):
+        print(f"\n=== {collection} en commun ===")
+        pairs = sorted(((matrix[collection]['jaccard'][i][j], matrix[collection]['common'][i][j], i, j)
+            for i in range(len(dids)) for j in range(i + 1, len(dids))
+            if matrix[collection]['common'][i][j] > 0), reverse=True)
+        if not pairs:
+            print("  (aucun)")
+        for jaccard, count, i, j in pairs[:top]:
+            print(f"  {dids[i]} / {dids[j]} : {count} ({jaccard*100:.1f}%)")
+
 @cli.command()
 @click.argument('did', default=None)
 @click.option('--top-words', default=None, type=int, help="How many of the most frequent words/hashtags/mentions/entities to keep")
@@ -70,7 +70,8 @@ def search(common, fuzzy, threshold, sort, offset, limit, home, types, cats, cou
     # Chargée dans tous les cas: sert à la recherche par filtres seuls
     # (branche else ci-dessous) ET à résoudre les codes pays en libellés
     # pour l'affichage, quel que soit le chemin de recherche emprunté.
-    data = load_quest(builddir)
+    # Avec une requête xapian, seuls les pays sont nécessaires.
+    data = load_quest(builddir, kinds=None if query is None else ['countries'])
     country_labels = {}
     for key, obj_country in data.countries.items():
         code = key.replace(obj_country.prefix + '.', '')
@@ -34,6 +34,7 @@ def _build_registry(app, builddir):
         timeout=cfg.osint_mesh_sync_timeout,
         translate_keywords=getattr(cfg, 'osint_mesh_keywords_translate', True),
         translation_memory=TranslationMemory(getattr(cfg, 'osint_mesh_translation_memory', '') or None),
+        sync_workers=getattr(cfg, 'osint_mesh_sync_workers', 8),
     )
 
 
@@ -450,7 +450,7 @@ def dump(common, obj):
 def duplicates(common):
     """Check duplicates in sources urls and links"""
     sourcedir, builddir = parser_makefile(common.docdir)
-    data = load_quest(builddir)
+    data = load_quest(builddir, kinds=['sources'])
 
     seen = {}
     dupes = []
@@ -106,7 +106,7 @@ def refresh(common, url, before):
         print('URL too short : %r' % url)
         sys.exit(2)
 
-    data = load_quest(builddir)
+    data = load_quest(builddir, kinds=['sources'])
 
     Text.init(app)
     keys = [k for k in data.sources if data.sources[k].url is not None and url in data.sources[k].url]
@@ -138,7 +138,7 @@ def translate(common, sources):
             click.echo("Canceled by user")
             exit(0)
 
-    data = load_quest(builddir)
+    data = load_quest(builddir, kinds=['sources'])
 
     Text.init(app)
 
@@ -0,0 +1,619 @@
+# -*- encoding: utf-8 -*-
+"""
+The quest store
+------------------
+
+The quest is stored in a sqlite database in the doctrees directory, one row
+per item. After a build, only the items of the documents read (or removed)
+during this build are written again : the other ones are kept as is.
+
+Readers can load the whole quest, some kinds of items only, or a single item.
+
+"""
+from __future__ import annotations
+
+__author__ = 'bibi21000 aka Sébastien GALLET'
+__email__ = 'bibi21000@gmail.com'
+
+import os
+import io
+import pickle
+import sqlite3
+import threading
+from types import SimpleNamespace
+from collections import OrderedDict
+from urllib.parse import quote
+from collections.abc import Mapping, ItemsView, ValuesView
+
+from docutils import nodes
+from sphinx.util import logging
+
+from .osintlib import OSIntQuest
+
+log = logging.getLogger(__name__)
+
+
+class _QuestPickler(pickle.Pickler):
+    """Pickle items without the quest, the sphinx env and the doctrees they reference"""
+
+    def __init__(self, handle, quest, env=None):
+        super().__init__(handle, protocol=pickle.HIGHEST_PROTOCOL)
+        self.quest = quest
+        self.env = env
+        # The nodes already pickled with their parent
+        self._inside = {}
+
+    def persistent_id(self, obj):
+        if obj is self.quest:
+            return 'quest'
+        if self.env is not None and obj is self.env:
+            return 'env'
+        if isinstance(obj, nodes.document):
+            return 'document'
+        if isinstance(obj, nodes.Node) and id(obj) not in self._inside:
+            if obj.parent is not None:
+                # Nodes (ie ref_entry) are inserted in the doctrees while resolving.
+                # Store a copy without its parents.
+                copy = obj.deepcopy()
+                self._mark(copy)
+                return ('node', copy)
+            self._mark(obj)
+        return None
+
+    def _mark(self, node):
+        for child in node.findall():
+            self._inside[id(child)] = child
+
+
+class _QuestUnpickler(pickle.Unpickler):
+    """Unpickle items and bind them to a quest"""
+
+    def __init__(self, handle, quest):
+        super().__init__(handle)
+        self.quest = quest
+
+    def persistent_load(self, pid):
+        if pid == 'quest':
+            return self.quest
+        if pid == 'env':
+            return self.quest.sphinx_env
+        if pid == 'document':
+            return None
+        if isinstance(pid, tuple) and pid[0] == 'node':
+            return pid[1]
+        raise pickle.UnpicklingError('Unknown persistent id %s' % pid)
+
+
+class OSIntStoredEnv():
+
+    def __init__(self, srcdir=None, doctreedir=None, config=None):
+        """The parts of the sphinx env stored with the quest : its directories
+        and the osint config values. Items loaded from the store are bound to it,
+        so readers don't unpickle a whole BuildEnvironment.
+
+        :param srcdir: The source directory.
+        :type srcdir: str or None
+        :param doctreedir: The doctrees directory.
+        :type doctreedir: str or None
+        :param config: The config values : {name: value}.
+        :type config: dict or None
+        """
+        self.srcdir = srcdir
+        self.doctreedir = doctreedir
+        self.config = SimpleNamespace(**(config or {}))
+
+    @classmethod
+    def from_env(cls, env):
+        """Get the stored parts of a sphinx env. Values that can't be pickled are skipped."""
+        config = {}
+        for opt in env.config:
+            if opt.name.startswith('osint_') is False:
+                continue
+            try:
+                pickle.dumps(opt.value, protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception:
+                log.debug("Can't store config value %s" % opt.name)
+                continue
+            config[opt.name] = opt.value
+        return cls(srcdir=str(env.srcdir), doctreedir=str(env.doctreedir), config=config)
+
+
+class OSIntQuestStore():
+
+    #: Change it when the layout of the database changes
+    version = 2
+    #: The default filename in the doctrees directory
+    filename = 'osint_quest.sqlite'
+    #: The items of these kinds are written only when their document changed.
+    #: The other ones (graphs, reports, ... and plugins data) can be updated
+    #: while writing the documents and are always written.
+    incremental_kinds = OSIntQuest._index_kinds + ('sources',)
+
+    #: The size of the memory map used by read only connections
+    mmap_size = 256 * 1024 * 1024
+
+    def __init__(self, path):
+        """A sqlite store for the quest
+
+        :param path: The sqlite file or the doctrees directory.
+        :type path: str
+        """
+        if os.path.isdir(path):
+            path = os.path.join(path, self.filename)
+        self.path = path
+        self._lock = threading.Lock()
+        self._reader = None
+
+    @classmethod
+    def exists(cls, path):
+        """Check if a store exists in path (a file or a doctrees directory)"""
+        if os.path.isdir(path):
+            path = os.path.join(path, cls.filename)
+        return os.path.isfile(path)
+
+    def _connect(self):
+        con = sqlite3.connect(self.path)
+        # Let readers (ie the flask app) read while a build is writing
+        con.execute('PRAGMA journal_mode=WAL')
+        con.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value BLOB)')
+        con.execute('CREATE TABLE IF NOT EXISTS items ('
+            'id INTEGER PRIMARY KEY, kind TEXT NOT NULL, name TEXT NOT NULL, '
+            'docname TEXT, data BLOB NOT NULL, UNIQUE(kind, name))')
+        con.execute('CREATE INDEX IF NOT EXISTS items_docname ON items (docname)')
+        # The reference indexes of the quest, written with the items they come from
+        con.execute('CREATE TABLE IF NOT EXISTS refs ('
+            'ref TEXT NOT NULL, key TEXT, name TEXT NOT NULL, docname TEXT)')
+        con.execute('CREATE INDEX IF NOT EXISTS refs_key ON refs (ref, key)')
+        con.execute('CREATE INDEX IF NOT EXISTS refs_docname ON refs (docname)')
+        return con
+
+    def _read(self, sql, args=()):
+        """Run a query on the shared read only connection"""
+        with self._lock:
+            if self._reader is None:
+                self._reader = sqlite3.connect('file:%s?mode=ro' % quote(os.path.abspath(self.path)),
+                    uri=True, check_same_thread=False)
+                # Pages are mapped, not copied in the memory of the process
+                self._reader.execute('PRAGMA mmap_size=%d' % self.mmap_size)
+            return self._reader.execute(sql, args).fetchall()
+
+    def close(self):
+        """Close the read only connection"""
+        with self._lock:
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+
+    def _meta(self, con, key, default=None):
+        row = con.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return default
+        return pickle.loads(row[0])
+
+    def _set_meta(self, con, key, value):
+        con.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+            (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)))
+
+    @classmethod
+    def kinds(cls, quest):
+        """Get the names of the attributes of the quest holding items.
+        Plugins ones (ie _analyses) are included.
+
+        :param quest: The quest.
+        :type quest: OSIntQuest
+        :returns: the names of the attributes
+        :rtype: list of str
+        """
+        return quest.get_item_kinds()
+
+    @classmethod
+    def dumps(cls, quest, obj, env=True):
+        """Pickle obj without the quest (and the sphinx env if env is True)"""
+        handle = io.BytesIO()
+        _QuestPickler(handle, quest, env=quest.sphinx_env if env is True else None).dump(obj)
+        return handle.getvalue()
+
+    @classmethod
+    def loads(cls, quest, data):
+        """Unpickle obj and bind it to quest"""
+        return _QuestUnpickler(io.BytesIO(data), quest).load()
+
+    def _is_synced(self, con, quest):
+        return self._meta(con, 'version') == self.version \
+            and self._meta(con, 'quest') == quest._store_id
+
+    def begin(self, quest):
+        """Start a new build. Must be called before reading documents.
+        Forget the documents changed by the previous build if they have been saved.
+
+        :param quest: The quest.
+        :type quest: OSIntQuest
+        """
+        with self._lock:
+            if os.path.isfile(self.path):
+                con = self._connect()
+                try:
+                    if self._is_synced(con, quest) and \
+                      self._meta(con, 'serial') == quest._store_serial:
+                        quest._store_dirty = set()
+                finally:
+                    con.close()
+            quest._store_serial += 1
+
+    def save(self, quest):
+        """Write the items of the documents changed since the last save
+
+        :param quest: The quest.
+        :type quest: OSIntQuest
+        :returns: the number of items written
+        :rtype: int
+        """
+        with self._lock:
+            con = self._connect()
+            try:
+                with con:
+                    full = self._is_synced(con, quest) is False
+                    dirty = quest._store_dirty
+                    if full:
+                        con.execute('DELETE FROM items')
+                        con.execute('DELETE FROM refs')
+                    else:
+                        con.execute('DELETE FROM items WHERE docname IS NULL OR kind NOT IN (%s)' %
+                            ','.join('?' * len(self.incremental_kinds)), self.incremental_kinds)
+                        con.executemany('DELETE FROM items WHERE docname = ?',
+                            [(docname,) for docname in dirty])
+                        con.execute('DELETE FROM refs WHERE docname IS NULL')
+                        con.executemany('DELETE FROM refs WHERE docname = ?',
+                            [(docname,) for docname in dirty])
+                    kinds = self.kinds(quest)
+                    rows = []
+                    refs = []
+                    for kind in kinds:
+                        incremental = full is False and kind in self.incremental_kinds
+                        for name, item in getattr(quest, kind).items():
+                            docname = getattr(item, 'docname', None)
+                            if incremental and docname is not None and docname not in dirty:
+                                continue
+                            rows.append((kind, name, docname, self.dumps(quest, item)))
+                            if kind in quest._index_kinds:
+                                refs.extend((ref, key, name, docname)
+                                    for ref, key in quest._index_refs_of(kind, item))
+                    con.executemany('INSERT OR REPLACE INTO items (kind, name, docname, data) '
+                        'VALUES (?, ?, ?, ?)', rows)
+                    con.executemany('INSERT INTO refs (ref, key, name, docname) '
+                        'VALUES (?, ?, ?, ?)', refs)
+                    self._set_meta(con, 'version', self.version)
+                    self._set_meta(con, 'quest', quest._store_id)
+                    self._set_meta(con, 'serial', quest._store_serial)
+                    self._set_meta(con, 'class', type(quest))
+                    con.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                        ('shell', self.dumps(quest, self.shell(quest, kinds), env=False)))
+            finally:
+                con.close()
+        log.debug('quest store : %s items written in %s' % (len(rows), self.path))
+        return len(rows)
+
+    @classmethod
+    def shell(cls, quest, kinds):
+        """Get the state of the quest without its items and indexes.
+        The sphinx env is replaced by an OSIntStoredEnv."""
+        state = quest.__getstate__()
+        for kind in kinds:
+            state[kind] = {}
+        if quest.sphinx_env is not None:
+            state['sphinx_env'] = OSIntStoredEnv.from_env(quest.sphinx_env)
+        # Cats and countries indexes are rebuilt on demand.
+        # Reference, position and docname indexes are rebuilt by load_quest
+        # and read in the tables by load_view.
+        state['_index'] = {}
+        state['_index_refs'] = {}
+        state['_index_pos'] = {}
+        state['_index_docs'] = {}
+        state['_store_dirty'] = set()
+        state['_changed'] = set()
+        state['_removed'] = {}
+        state['_merged_docnames'] = set()
+        return state
+
+    def load_quest(self, kinds=None):
+        """Load the quest from the store
+
+        :param kinds: The kinds of items to load (ie ['sources', 'idents']). None for all.
+            The other kinds are left empty and can be loaded later with load_kind.
+        :type kinds: list of str or None
+        :returns: the quest
+        :rtype: OSIntQuest
+        """
+        con = self._connect()
+        try:
+            cls = self._meta(con, 'class', OSIntQuest)
+            quest = cls.__new__(cls)
+            row = con.execute("SELECT value FROM meta WHERE key = 'shell'").fetchone()
+            if row is None:
+                raise FileNotFoundError('No quest in store %s' % self.path)
+            quest.__dict__.update(self.loads(quest, row[0]))
+            quest._index_reset()
+            if kinds is None:
+                cursor = con.execute('SELECT kind, data FROM items ORDER BY id')
+            else:
+                kinds = list(kinds)
+                cursor = con.execute('SELECT kind, data FROM items WHERE kind IN (%s) ORDER BY id' %
+                    ','.join('?' * len(kinds)), kinds)
+            for kind, data in cursor:
+                quest._index_set(kind, self.loads(quest, data))
+        finally:
+            con.close()
+        return quest
+
+    def load_kind(self, quest, kind):
+        """Load the items of a kind in a quest loaded from the store
+
+        :param quest: The quest.
+        :type quest: OSIntQuest
+        :param kind: The kind of items (ie 'idents').
+        :type kind: str
+        :returns: the items
+        :rtype: dict
+        """
+        con = self._connect()
+        try:
+            for data, in con.execute('SELECT data FROM items WHERE kind = ? ORDER BY id', (kind,)):
+                quest._index_set(kind, self.loads(quest, data))
+        finally:
+            con.close()
+        return getattr(quest, kind)
+
+    def load_item(self, quest, kind, name):
+        """Load a single item without adding it to the quest
+
+        :param quest: The quest to bind the item to.
+        :type quest: OSIntQuest
+        :param kind: The kind of the item (ie 'idents').
+        :type kind: str
+        :param name: The name of the item.
+        :type name: str
+        :returns: the item or None if not found
+        :rtype: OSIntItem
+        """
+        con = self._connect()
+        try:
+            row = con.execute('SELECT data FROM items WHERE kind = ? AND name = ?',
+                (kind, name)).fetchone()
+        finally:
+            con.close()
+        if row is None:
+            return None
+        return self.loads(quest, row[0])
+
+    def names(self, kind):
+        """Get the names of the items of a kind, in the order of the quest"""
+        return [name for name, in self._read(
+            'SELECT name FROM items WHERE kind = ? ORDER BY id', (kind,))]
+
+    def load_view(self, cache_size=1024):
+        """Get a read only view of the quest. Items are unpickled on first access
+        and only the last cache_size ones are kept in memory.
+
+        :param cache_size: The max number of items kept in memory.
+        :type cache_size: int
+        :returns: the quest
+        :rtype: OSIntQuest
+        """
+        rows = self._read("SELECT key, value FROM meta WHERE key IN ('class', 'shell')")
+        meta = dict(rows)
+        if 'shell' not in meta:
+            raise FileNotFoundError('No quest in store %s' % self.path)
+        cls = pickle.loads(meta['class'])
+        quest = cls.__new__(cls)
+        quest.__dict__.update(self.loads(quest, meta['shell']))
+        cache = OSIntItemCache(cache_size)
+        for kind, in self._read('SELECT DISTINCT kind FROM items'):
+            setattr(quest, kind, OSIntQuestItems(self, quest, kind, cache))
+        quest._index_refs = {ref: OSIntStoredRefs(self, ref) for ref in quest._index_ref_names}
+        quest._index_pos = {kind: OSIntStoredPositions(self, kind) for kind in quest._index_kinds}
+        quest._index_docs = OSIntStoredDocs(self)
+        return quest
+
+
+class OSIntItemCache():
+
+    def __init__(self, size=1024):
+        """A thread safe LRU cache of items
+
+        :param size: The max number of items.
+        :type size: int
+        """
+        self.size = max(1, size)
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Get an item or None"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+            return item
+
+    def put(self, key, item):
+        """Add an item and forget the oldest ones"""
+        with self._lock:
+            self._items[key] = item
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class _ItemsView(ItemsView):
+
+    def __iter__(self):
+        yield from self._mapping._iter_items()
+
+
+class _ValuesView(ValuesView):
+
+    def __iter__(self):
+        for _, item in self._mapping._iter_items():
+            yield item
+
+
+class OSIntQuestItems(Mapping):
+
+    #: The number of items read by query when iterating
+    page_size = 256
+
+    def __init__(self, store, quest, kind, cache):
+        """A read only dict of items, read from the store on first access
+
+        :param store: The store.
+        :type store: OSIntQuestStore
+        :param quest: The quest the items belong to.
+        :type quest: OSIntQuest
+        :param kind: The kind of items (ie 'idents').
+        :type kind: str
+        :param cache: The cache shared by all kinds.
+        :type cache: OSIntItemCache
+        """
+        self.store = store
+        self.quest = quest
+        self.kind = kind
+        self.cache = cache
+        self._names = None
+
+    def _keys(self):
+        if self._names is None:
+            self._names = dict.fromkeys(self.store.names(self.kind))
+        return self._names
+
+    def _load(self, name, data):
+        item = self.cache.get((self.kind, name))
+        if item is None:
+            item = self.store.loads(self.quest, data)
+            self.cache.put((self.kind, name), item)
+        return item
+
+    def __getitem__(self, name):
+        item = self.cache.get((self.kind, name))
+        if item is not None:
+            return item
+        if name not in self._keys():
+            raise KeyError(name)
+        rows = self.store._read('SELECT data FROM items WHERE kind = ? AND name = ?',
+            (self.kind, name))
+        if len(rows) == 0:
+            raise KeyError(name)
+        return self._load(name, rows[0][0])
+
+    def __contains__(self, name):
+        return name in self._keys()
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self):
+        return len(self._keys())
+
+    def _iter_items(self):
+        """Read items by pages in the order of the quest"""
+        last = -1
+        while True:
+            rows = self.store._read('SELECT id, name, data FROM items WHERE kind = ? AND id > ? '
+                'ORDER BY id LIMIT ?', (self.kind, last, self.page_size))
+            for last, name, data in rows:
+                yield name, self._load(name, data)
+            if len(rows) < self.page_size:
+                break
+
+    def items(self):
+        return _ItemsView(self)
+
+    def values(self):
+        return _ValuesView(self)
+
+
+class OSIntStoredRefs(Mapping):
+
+    def __init__(self, store, ref):
+        """A read only reference index of the quest, read from the store :
+        {key: set of names}
+
+        :param store: The store.
+        :type store: OSIntQuestStore
+        :param ref: The name of the reference index (ie 'ident_relations').
+        :type ref: str
+        """
+        self.store = store
+        self.ref = ref
+
+    def __getitem__(self, key):
+        names = {name for name, in self.store._read(
+            'SELECT name FROM refs WHERE ref = ? AND key IS ?', (self.ref, key))}
+        if len(names) == 0:
+            raise KeyError(key)
+        return names
+
+    def __contains__(self, key):
+        return len(self.store._read('SELECT 1 FROM refs WHERE ref = ? AND key IS ? LIMIT 1',
+            (self.ref, key))) > 0
+
+    def __iter__(self):
+        return iter([key for key, in self.store._read(
+            'SELECT DISTINCT key FROM refs WHERE ref = ?', (self.ref,))])
+
+    def __len__(self):
+        return self.store._read('SELECT COUNT(DISTINCT key) FROM refs WHERE ref = ?', (self.ref,))[0][0]
+
+
+class OSIntStoredPositions(Mapping):
+
+    def __init__(self, store, kind):
+        """The positions of the items of a kind in the quest, read from the store :
+        {name: position}
+
+        :param store: The store.
+        :type store: OSIntQuestStore
+        :param kind: The kind of items (ie 'idents').
+        :type kind: str
+        """
+        self.store = store
+        self.kind = kind
+
+    def __getitem__(self, name):
+        rows = self.store._read('SELECT id FROM items WHERE kind = ? AND name = ?', (self.kind, name))
+        if len(rows) == 0:
+            raise KeyError(name)
+        return rows[0][0]
+
+    def __iter__(self):
+        return iter(self.store.names(self.kind))
+
+    def __len__(self):
+        return self.store._read('SELECT COUNT(*) FROM items WHERE kind = ?', (self.kind,))[0][0]
+
+
+class OSIntStoredDocs(Mapping):
+
+    def __init__(self, store):
+        """The items of the documents, read from the store :
+        {docname: {(kind, name): None}}
+
+        :param store: The store.
+        :type store: OSIntQuestStore
+        """
+        self.store = store
+
+    def __getitem__(self, docname):
+        names = dict.fromkeys(self.store._read(
+            'SELECT kind, name FROM items WHERE docname IS ? ORDER BY id', (docname,)))
+        if len(names) == 0:
+            raise KeyError(docname)
+        return names
+
+    def __iter__(self):
+        return iter([docname for docname, in self.store._read('SELECT DISTINCT docname FROM items')])
+
+    def __len__(self):
+        return self.store._read('SELECT COUNT(DISTINCT docname) FROM items')[0][0]
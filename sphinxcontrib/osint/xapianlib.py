@@ -238,8 +238,7 @@ class XapianIndexer:
         urls = []
         for src in linked_sources:
             if remove is True:
-                if src in sources:
-                    sources.remove(src)
+                sources.pop(src, None)
             obj_src = quest.sources[src]
             srcname = obj_src.name.replace(OSIntSource.prefix + '.','')
             if obj_src.url is not None:
@@ -422,8 +421,7 @@ class XapianIndexer:
         passe (cf. indexation incrémentale ci-dessous) — sinon un "skip"
         ferait apparaître ces sources comme non liées par erreur."""
         for src in linked_sources:
-            if src in sources:
-                sources.remove(src)
+            sources.pop(src, None)
 
     def _source_file_signature(self, srcname):
         """Signature (chemins + mtimes) des fichiers de cache/store d'une
@@ -635,7 +633,8 @@ class XapianIndexer:
             indexed_count = 0
             error_count = 0
 
-            sources = quest.get_sources()
+            # Ensemble ordonné : les sources liées en sont retirées en O(1)
+            sources = dict.fromkeys(quest.iter_sources())
             orgs = quest.get_orgs()
             idents = quest.get_idents()
             events = quest.get_events()
@@ -5,8 +5,14 @@
 import os
 import sys
 import io
+import json
+import time
+import base64
+import threading
 from random import randbytes
 import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
 
 import pytest
 
@@ -45,3 +51,273 @@ def test_bsky_post(caplog):
     # ~ print(json.dumps(resp.__dict__), indent=4)
     # ~ assert False
 
+
+def test_bsky_classify_texts():
+    from sphinxcontrib.osint.plugins import bskylib
+    calls = []
+    def classifier(texts, **kwargs):
+        calls.append(texts)
+        return [{'label': 'Real', 'score': len(text)} for text in texts]
+    short = 'x' * bskylib.OSIntBSkyProfile.min_text_for_ai
+    texts = ['a' * 40, short, 'b' * 50]
+    results = bskylib.OSIntBSkyProfile.classify_texts(classifier, texts)
+    assert calls == [['a' * 40, 'b' * 50]]
+    assert results == [{'label': 'Real', 'score': 40}, {'label': 'Too short', 'score': 0},
+        {'label': 'Real', 'score': 50}]
+    assert bskylib.OSIntBSkyProfile.classify_texts(classifier, [short]) == [{'label': 'Too short', 'score': 0}]
+    assert len(calls) == 1
+
+
+def test_bsky_store(tmp_path):
+    from sphinxcontrib.osint.plugins import bskylib
+    import json
+    store = bskylib.OSIntBSkyStore(str(tmp_path / 'profile.sqlite'))
+    store.put('feeds', {'c1': {'cid': 'c1', 'text': 'one'}, 'c2': {'cid': 'c2', 'text': 'two'}})
+    store.put('feeds', {'c3': {'cid': 'c3', 'text': 'three'}})
+    store.put('feeds', {'c1': {'cid': 'c1', 'text': 'one', 'spell': []}})
+    assert store.count('feeds') == 3
+    assert store.has('feeds', 'c2') is True
+    assert store.has('follows', 'c2') is False
+    assert list(store.keys('feeds')) == ['c1', 'c2', 'c3']
+    assert [key for key, _ in store.items('feeds', page_size=2)] == ['c1', 'c2', 'c3']
+    assert store.get('feeds', 'c1')['spell'] == []
+    store.set_header('profile', {'did': 'did:plc:test'})
+    store.add_diff(2.5, {'posts_count': 2})
+    store.add_diff(10.0, {})
+    store.clean_diffs()
+    data = store.view()
+    assert data['profile'] == {'did': 'did:plc:test'}
+    assert 'c3' in data['feeds'] and len(data['follows']) == 0
+    assert list(data['diff'].keys()) == ['2.5']
+    loaded = store.load()
+    store.dump(loaded)
+    assert store.load() == loaded
+    store.close()
+
+    cache = tmp_path / 'cache'
+    cache.mkdir()
+    legacy = {'profile': {'did': 'did:plc:old'}, 'feeds': {'c1': {'cid': 'c1'}},
+        'followers': {}, 'follows': {'d1': {'did': 'd1'}}, 'diff': {'1.0': {'handle': 'old'}}}
+    with open(cache / 'profile_old.json', 'w') as f:
+        json.dump(legacy, f)
+    path, data = bskylib.OSIntBSkyProfile.load_json(did='did:plc:old',
+        osint_bsky_store=str(tmp_path / 'store'), osint_bsky_cache=str(cache))
+    assert path.endswith('profile_old.sqlite')
+    assert not (cache / 'profile_old.json').exists()
+    assert data == legacy
+
+
+def test_bsky_update_collection(tmp_path):
+    from sphinxcontrib.osint.plugins import bskylib
+    store = bskylib.OSIntBSkyStore(str(tmp_path / 'profile.sqlite'))
+    pages = {None: ('1', ['p9', 'p8']), '1': ('2', ['p7', 'p6']), '2': (None, ['p5'])}
+    calls = []
+    def get_page(cursor):
+        calls.append(cursor)
+        if cursor == '2' and len(calls) == 3:
+            raise ConnectionError('interrupted')
+        next_cursor, keys = pages[cursor]
+        return next_cursor, [(key, {'cid': key}) for key in keys]
+    with pytest.raises(ConnectionError):
+        bskylib.OSIntBSkyProfile.update_collection(store, 'feeds', get_page)
+    assert store.header('cursors') == {'feeds': '2'}
+    # Newer posts were published since
+    pages[None] = ('1', ['p11', 'p10', 'p9'])
+    calls.clear()
+    limiter = bskylib.OSIntBSkyRateLimiter(0)
+    assert bskylib.OSIntBSkyProfile.update_collection(store, 'feeds', get_page, limiter=limiter) == 3
+    assert calls == ['2', None]
+    assert store.header('cursors') == {}
+    assert sorted(store.keys('feeds')) == ['p10', 'p11', 'p5', 'p6', 'p7', 'p8', 'p9']
+    store.close()
+
+
+class FakeAtprotoHandler(BaseHTTPRequestHandler):
+    """A local xrpc server with the endpoints used by OSIntBSkyProfile.update"""
+    page_size = 2
+    accounts = {}
+    requests = []
+    fail_feeds = set()
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def page(self, items, params):
+        start = int(params.get('cursor', ['0'])[0])
+        end = start + self.page_size
+        return items[start:end], str(end) if end < len(items) else None
+
+    def profile(self, did):
+        return {'did': did, 'handle': f'{did[8:]}.test', 'displayName': did[8:],
+            'createdAt': '2024-01-01T00:00:00Z', 'indexedAt': '2024-01-01T00:00:00Z'}
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        data = json.loads(self.rfile.read(length))
+        now = int(time.time())
+        jwt = '.'.join(base64.urlsafe_b64encode(json.dumps(part).encode()).decode().rstrip('=')
+            for part in ({'alg': 'HS256', 'typ': 'JWT'}, {'scope': 'com.atproto.access',
+                'sub': 'did:plc:crawler', 'iat': now, 'exp': now + 3600, 'aud': 'did:web:localhost'}))
+        self.reply({'accessJwt': jwt + '.sig', 'refreshJwt': jwt + '.sig',
+            'handle': data['identifier'], 'did': 'did:plc:crawler'})
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        method = url.path.rsplit('/', 1)[-1]
+        actor = params.get('actor', [None])[0]
+        self.requests.append((method, actor, params.get('cursor', [None])[0]))
+        if method == 'app.bsky.actor.getProfile':
+            account = self.accounts.get(actor, {'followers': [], 'follows': [], 'feeds': []})
+            return self.reply(self.profile(actor) | {'followersCount': len(account['followers']),
+                'followsCount': len(account['follows']), 'postsCount': len(account['feeds'])})
+        account = self.accounts[actor]
+        if method in ('app.bsky.graph.getFollowers', 'app.bsky.graph.getFollows'):
+            key = 'followers' if method.endswith('Followers') else 'follows'
+            items, cursor = self.page(account[key], params)
+            return self.reply({'subject': self.profile(actor), key: [self.profile(did) for did in items],
+                'cursor': cursor})
+        if method == 'app.bsky.feed.getAuthorFeed':
+            if (actor, params.get('cursor', [None])[0]) in self.fail_feeds:
+                self.fail_feeds.discard((actor, params.get('cursor', [None])[0]))
+                return self.reply({'error': 'InternalServerError', 'message': 'Failure'}, status=500)
+            items, cursor = self.page(account['feeds'], params)
+            return self.reply({'feed': [{'post': {'uri': f'at://{actor}/app.bsky.feed.post/{cid}',
+                'cid': cid, 'author': self.profile(actor), 'indexedAt': '2024-01-02T00:00:00Z',
+                'record': {'$type': 'app.bsky.feed.post', 'text': f'Post {cid}',
+                    'createdAt': '2024-01-02T00:00:00Z'}}} for cid in items], 'cursor': cursor})
+        return self.reply({'error': 'MethodNotImplemented', 'message': method}, status=501)
+
+
+def test_bsky_crawl_fake_server(tmp_path):
+    pytest.importorskip('atproto')
+    from sphinxcontrib.osint.plugins import bskylib
+    FakeAtprotoHandler.accounts = {
+        'did:plc:one': {'followers': ['did:plc:a', 'did:plc:b', 'did:plc:c'], 'follows': ['did:plc:a'],
+            'feeds': ['c1', 'c2', 'c3', 'c4', 'c5']},
+        'did:plc:two': {'followers': [], 'follows': ['did:plc:b', 'did:plc:c'], 'feeds': ['d1']},
+    }
+    FakeAtprotoHandler.fail_feeds = {('did:plc:one', '2')}
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeAtprotoHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        base_url = 'http://127.0.0.1:%s/xrpc' % server.server_address[1]
+        kwargs = dict(user='crawler.test', apikey='secret', osint_bsky_store=str(tmp_path / 'store'),
+            osint_bsky_cache=str(tmp_path), osint_bsky_base_url=base_url, workers=2, rate=0)
+        diffs = bskylib.OSIntBSkyProfile.crawl(['did:plc:one', 'did:plc:two'], **kwargs)
+        assert isinstance(diffs['did:plc:one'], Exception)
+        assert diffs['did:plc:two'] == {}
+        store = bskylib.OSIntBSkyProfile.open_store('did:plc:one', osint_bsky_store=str(tmp_path / 'store'),
+            osint_bsky_cache=str(tmp_path))
+        assert store.header('cursors') == {'feeds': '2'}
+        assert list(store.keys('feeds')) == ['c1', 'c2']
+        store.close()
+
+        FakeAtprotoHandler.requests.clear()
+        diffs = bskylib.OSIntBSkyProfile.crawl(['did:plc:one'], **kwargs)
+        assert diffs['did:plc:one'] == {}
+        feeds_requests = [req for req in FakeAtprotoHandler.requests if req[0] == 'app.bsky.feed.getAuthorFeed']
+        assert feeds_requests[0] == ('app.bsky.feed.getAuthorFeed', 'did:plc:one', '2')
+        path, data = bskylib.OSIntBSkyProfile.load_json(did='did:plc:one', osint_bsky_store=str(tmp_path / 'store'),
+            osint_bsky_cache=str(tmp_path))
+        assert list(data['feeds'].keys()) == ['c1', 'c2', 'c3', 'c4', 'c5']
+        assert list(data['followers'].keys()) == ['did:plc:a', 'did:plc:b', 'did:plc:c']
+        assert data['cursors'] == {}
+    finally:
+        server.shutdown()
+        bskylib.OSIntBSkyProfile.bsky_tools.pop('client', None)
+
+
+def test_bsky_coordination_matrix(tmp_path):
+    np = pytest.importorskip('numpy')
+    from sphinxcontrib.osint.plugins import bskylib
+    profile = bskylib.OSIntBSkyProfile
+    sets = [set(range(0, 50)), set(range(40, 90, 2)), set(), set(range(45, 47))]
+    arrays = [np.array(sorted(values), dtype=np.int64) for values in sets]
+    expected = [[len(a & b) for b in sets] for a in sets]
+    assert profile.overlap_matrix(arrays, chunk_size=4).tolist() == expected
+    assert profile.overlap_matrix(arrays).tolist() == expected
+
+    kwargs = dict(osint_bsky_store=str(tmp_path / 'store'), osint_bsky_cache=str(tmp_path))
+    for i, name in enumerate(['one', 'two', 'three']):
+        store = profile.open_store(did=f'did:plc:{name}', **kwargs)
+        store.put('followers', {f'did:plc:f{j}': {'did': f'did:plc:f{j}'} for j in range(i, i + 4)})
+        store.put('follows', {f'did:plc:g{i}': {'did': f'did:plc:g{i}'}})
+        store.close()
+    matrix = profile.coordination_matrix(['did:plc:one', 'did:plc:two', 'did:plc:three'], **kwargs)
+    assert matrix['followers']['common'] == [[4, 3, 2], [3, 4, 3], [2, 3, 4]]
+    assert matrix['followers']['jaccard'][0][1] == 0.6
+    assert matrix['follows']['common'] == [[1, 0, 0], [0, 1, 0], [0, 0, 1]]
+
+    class Quest:
+        bskyprofiles = {'bskyprofile.one': None, 'bskyprofile.two': None,
+            'bskyprofile.three': None, 'bskyprofile.untracked': None}
+    common = profile.common_network(Quest(), did='did:plc:one', **kwargs)
+    assert [c['did'] for c in common] == ['did:plc:two', 'did:plc:three']
+    assert common[0]['common_followers'] == ['did:plc:f1', 'did:plc:f2', 'did:plc:f3']
+    assert common[0]['common_follows_count'] == 0
+    assert not (tmp_path / 'profile_untracked.sqlite').exists()
+
+
+def test_bsky_analyse_account(tmp_path, monkeypatch):
+    pytest.importorskip('numpy')
+    from sphinxcontrib.osint.plugins import bskylib
+    profile = bskylib.OSIntBSkyProfile
+
+    class Analyzer:
+        def polarity_scores(self, text):
+            return {'compound': -0.5 if 'idiot' in text else 0.5}
+
+    class Profanity:
+        def contains_profanity(self, text):
+            return 'f*ck' in text
+
+    monkeypatch.setattr(profile, 'init_nltk', classmethod(lambda cls: None))
+    monkeypatch.setitem(profile.bsky_tools, 'sentiment', Analyzer())
+    monkeypatch.setitem(profile.bsky_tools, 'profanity', Profanity())
+    for key, value in (('osint_bsky_swearwords', ['idiot']), ('osint_bsky_top_words', 5),
+            ('osint_bsky_toxicity_model', 'none'), ('osint_bsky_toxicity_threshold', 0.5),
+            ('osint_bsky_suspicious_cluster_size', 2), ('osint_bsky_suspicious_cluster_ratio', 0.1)):
+        monkeypatch.setattr(profile, key, value)
+    monkeypatch.setattr(profile, 'checkpoint_posts', 2)
+
+    kwargs = dict(osint_bsky_store=str(tmp_path / 'store'), osint_bsky_cache=str(tmp_path))
+    store = profile.open_store(did='did:plc:one', **kwargs)
+    store.set_header('profile', {'followers_count': 3, 'follows_count': 1})
+    store.put('feeds', {
+        'c1': {'cid': 'c1', 'text': 'you idiot', 'is_reply': True},
+        'c2': {'cid': 'c2', 'text': 'what a f*ck day', 'is_reply': False},
+        'c3': {'cid': 'c3', 'text': 'nice day', 'is_reply': False},
+        'c4': {'cid': 'c4', 'text': None},
+    })
+    store.put('followers', {f'did:plc:f{i}': {'did': f'did:plc:f{i}',
+        'created_at': '2024-01-02T10:00:00Z'} for i in range(3)})
+    store.close()
+
+    analysis = profile.analyse_account(did='did:plc:one', include_entities=False,
+        include_rhythm=False, include_toxicity=False, **kwargs)
+    assert analysis['posts_analysed'] == 3
+    assert analysis['insults']['posts_with_insults'] == 2
+    assert analysis['insults']['words'] == {'idiot': 1}
+    assert analysis['by_kind']['reply']['insults']['posts_with_insults'] == 1
+    assert analysis['by_kind']['post']['insults']['posts_with_insults'] == 1
+    assert analysis['by_kind']['reply']['mood']['label'] == 'negative'
+    assert analysis['network']['suspicious_creation_clusters'][0]['accounts_created'] == 3
+
+    # The fields of the posts are saved in the store
+    store = profile.open_store(did='did:plc:one', **kwargs)
+    assert store.get('feeds', 'c1')['insults'] == ['idiot']
+    assert store.get('feeds', 'c1')['mood'] == {'compound': -0.5}
+    assert store.get('feeds', 'c2')['profanity_flag'] is True
+    assert 'mood' not in store.get('feeds', 'c4')
+    assert store.header('account_analysis')['posts_analysed'] == 3
+    store.close()
@@ -0,0 +1,105 @@
+# -*- encoding: utf-8 -*-
+"""Test module
+
+"""
+import os
+import sys
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+import pytest
+
+from sphinxcontrib.osint.plugins import cartolib
+
+sys.path.append(os.path.abspath(".."))
+
+def test_geocoder_offline(tmp_path):
+    with open(tmp_path / 'geolocator.json', 'w') as f:
+        json.dump({'Lyon': {'longitude': 4.83, 'latitude': 45.76}}, f)
+    geocoder = cartolib.OSIntGeocoder(filename=str(tmp_path / 'geolocator.jsonl'), url='http://127.0.0.1:9')
+    locations = geocoder.locate(['FR', 'DE', 'Lyon', None])
+    assert locations['FR'] == (2.213749, 46.227638)
+    assert locations['DE'] == (10.451526, 51.165691)
+    assert locations['Lyon'] == (4.83, 45.76)
+    assert geocoder._nominatim is None
+
+    geocoder.cache.add('Paris', 2.35, 48.85)
+    with open(tmp_path / 'geolocator.jsonl', 'a') as f:
+        f.write('{"key": "Broken", "longi')
+    cache = cartolib.OSIntGeoCache(str(tmp_path / 'geolocator.jsonl'))
+    assert cache.get('Paris') == (2.35, 48.85)
+    assert cache.get('Lyon') == (4.83, 45.76)
+    assert 'Broken' not in cache
+
+
+class FakeNominatimHandler(BaseHTTPRequestHandler):
+    """A local nominatim server knowing some places"""
+    places = {}
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)['q'][0]
+        self.requests.append(query)
+        data = []
+        if query in self.places:
+            lon, lat = self.places[query]
+            data = [{'place_id': 1, 'lat': str(lat), 'lon': str(lon), 'display_name': query,
+                'boundingbox': [str(lat), str(lat), str(lon), str(lon)]}]
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def test_geocoder_fake_server(tmp_path):
+    pytest.importorskip('geopy')
+    FakeNominatimHandler.places = {'Lyon': (4.83, 45.76), 'Marseille': (5.37, 43.3), 'Nice': (7.26, 43.7)}
+    FakeNominatimHandler.requests = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeNominatimHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        url = 'http://127.0.0.1:%s' % server.server_address[1]
+        geocoder = cartolib.OSIntGeocoder(filename=str(tmp_path / 'geolocator.jsonl'), url=url, workers=3, rate=0)
+        locations = geocoder.locate(['FR', 'Lyon', 'Marseille', 'Nice', 'Nowhere', 'Lyon'])
+        assert locations == {'FR': (2.213749, 46.227638), 'Lyon': (4.83, 45.76),
+            'Marseille': (5.37, 43.3), 'Nice': (7.26, 43.7)}
+        assert sorted(FakeNominatimHandler.requests) == ['Lyon', 'Marseille', 'Nice', 'Nowhere']
+
+        FakeNominatimHandler.requests = []
+        geocoder = cartolib.OSIntGeocoder(filename=str(tmp_path / 'geolocator.jsonl'), url=url, rate=0)
+        locations = geocoder.locate(['Lyon', 'Marseille', 'Nice'])
+        assert len(locations) == 3
+        assert FakeNominatimHandler.requests == []
+    finally:
+        server.shutdown()
+
+
+def test_carto_render_job(tmp_path):
+    from types import SimpleNamespace
+    from sphinxcontrib.osint.plugins.carto import OSIntCarto
+    config = SimpleNamespace(osint_carto_cache='carto_cache', osint_carto_geocoder_url='http://127.0.0.1:9',
+        osint_carto_geocoder_workers=1, osint_carto_geocoder_rate=0)
+    quest = SimpleNamespace(sphinx_env=SimpleNamespace(srcdir=str(tmp_path), config=config))
+    os.makedirs(tmp_path / 'carto_cache')
+    carto = OSIntCarto('carto.test', 'Test', quest=quest, data_countries='FR:10,DE:20:blue,IT', region='europe')
+    filename, job = carto.render_job(str(tmp_path / '_images'))
+    assert job['basemap'] == {'width': 900, 'height': 450, 'dpi': 300, 'projection': 'Robinson', 'region': 'europe'}
+    assert job['markers'] == [(2.213749, 46.227638, 'red', 10**0.5), (10.451526, 51.165691, 'blue', 100**0.5),
+        (12.56738, 41.87194, 'red', 10**0.5)]
+    assert job['filepath'] == os.path.join(str(tmp_path / '_images'), filename)
+
+    world = OSIntCarto('carto.world', 'World', quest=quest, data_countries='FR:10,DE:20:blue,IT')
+    assert world.render_job(str(tmp_path / '_images'))[0] != filename
+    with open(job['filepath'], 'w') as f:
+        f.write('rendered')
+    assert carto.render_job(str(tmp_path / '_images')) == (filename, None)
+    assert carto.graph(str(tmp_path / '_images')) == filename
@@ -5,6 +5,8 @@ sockets sur 127.0.0.1, dans des threads -- qui se synchronisent via
 /mesh/v1/* en HTTP, comme ils le feraient en production. Pas de mock de
 `requests` : on teste le vrai comportement réseau, y compris les échecs.
 """
+from flask import request
+
 from sphinxcontrib.osint.mesh.registry import PeerRegistry
 
 
@@ -112,3 +114,68 @@ def test_auth_between_peers_with_shared_secret(live_server_factory):
     good_registry = PeerRegistry(self_id='osint-en', self_url='', secret='s3cret')
     good_registry.add_peer('osint-fr', peer_server.url, lang='fr', source='bootstrap')
     assert good_registry.sync_peer('osint-fr') is True
+
+
+def test_sync_peer_unchanged_peer_costs_a_304(live_server_factory):
+    peer_registry = PeerRegistry(self_id='osint-fr', self_url='', lang='fr')
+    peer_registry.set_local_keywords(['ukraine'])
+    peer_server = live_server_factory(peer_registry)
+
+    client_registry = PeerRegistry(self_id='osint-en', self_url='')
+    statuses = []
+    client_registry.session.hooks['response'].append(lambda r, *args, **kwargs: statuses.append(r.status_code))
+    client_registry.add_peer('osint-fr', peer_server.url, lang='fr', source='bootstrap')
+
+    assert client_registry.sync_peer('osint-fr') is True
+    assert client_registry.sync_peer('osint-fr') is True
+    assert statuses == [200, 304]
+    # un 304 garde ce qu'on avait
+    assert client_registry.known_peers()['osint-fr']['keywords'] == {'ukraine'}
+
+    peer_registry.set_local_keywords(['ukraine', 'kyiv'])
+    assert client_registry.sync_peer('osint-fr') is True
+    assert statuses == [200, 304, 200]
+    assert client_registry.known_peers()['osint-fr']['keywords'] == {'ukraine', 'kyiv'}
+
+
+def test_sync_peer_falls_back_without_sync_route(live_server_factory):
+    # pair d'une version précédente, sans /mesh/v1/sync
+    peer_registry = PeerRegistry(self_id='osint-fr', self_url='', lang='fr')
+    peer_registry.set_local_keywords(['ukraine'])
+    peer_server = live_server_factory(peer_registry)
+    peer_server.app.before_request(
+        lambda: ('', 404) if request.path == '/mesh/v1/sync' else None)
+
+    client_registry = PeerRegistry(self_id='osint-en', self_url='')
+    client_registry.add_peer('osint-fr', peer_server.url, lang='fr', source='bootstrap')
+
+    assert client_registry.sync_peer('osint-fr') is True
+    assert client_registry.known_peers()['osint-fr']['keywords'] == {'ukraine'}
+
+
+def test_sync_all_syncs_peers_in_parallel_not_in_series():
+    import time
+
+    SLEEP = 0.2
+    N_PEERS = 5
+
+    registry = PeerRegistry(self_id='osint-en', self_url='')
+    for i in range(N_PEERS):
+        registry.add_peer(f'osint-{i}', f'http://peer{i}.example', 'fr')
+
+    def slow_sync_peer(peer_id):
+        time.sleep(SLEEP)
+        return True
+
+    registry.sync_peer = slow_sync_peer
+
+    started = time.monotonic()
+    results = registry.sync_all()
+    elapsed = time.monotonic() - started
+
+    assert results == {f'osint-{i}': True for i in range(N_PEERS)}
+    assert list(results) == [f'osint-{i}' for i in range(N_PEERS)]
+    assert elapsed < SLEEP * (N_PEERS / 2), (
+        f"trop lent ({elapsed:.2f}s) pour {N_PEERS} pairs à {SLEEP}s chacun -- "
+        "semble s'exécuter en série plutôt qu'en parallèle"
+    )
@@ -83,3 +83,38 @@ def test_auth_required_when_secret_configured(app_factory):
 
     resp = client.get('/mesh/v1/info', headers={'X-Mesh-Token': 's3cret'})
     assert resp.status_code == 200
+
+
+def test_sync_combines_info_keywords_and_peers(app_factory):
+    registry = _registry()
+    registry.set_local_keywords(['ukraine'])
+    registry.add_peer('osint-fr', 'http://osint-fr.example.org', 'fr', source='bootstrap')
+    app = app_factory(registry)
+
+    body = app.test_client().get('/mesh/v1/sync').get_json()
+
+    assert body['info'] == {'id': 'osint-test', 'url': 'http://testserver', 'lang': 'fr'}
+    assert body['keywords'] == ['ukraine']
+    assert {p['id'] for p in body['peers']} == {'osint-test', 'osint-fr'}
+
+
+def test_keywords_unchanged_returns_304(app_factory):
+    registry = _registry()
+    registry.set_local_keywords(['ukraine', 'kyiv'])
+    app = app_factory(registry)
+    client = app.test_client()
+
+    resp = client.get('/mesh/v1/keywords')
+    etag = resp.headers['ETag']
+    assert etag
+
+    # même contenu, même si ré-extrait plus tard : 304 sans corps
+    registry.set_local_keywords(['ukraine', 'kyiv'])
+    resp = client.get('/mesh/v1/keywords', headers={'If-None-Match': etag})
+    assert resp.status_code == 304
+    assert resp.data == b''
+
+    registry.set_local_keywords(['ukraine', 'kyiv', 'sanctions'])
+    resp = client.get('/mesh/v1/keywords', headers={'If-None-Match': etag})
+    assert resp.status_code == 200
+    assert resp.headers['ETag'] != etag
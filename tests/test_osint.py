@@ -233,3 +233,592 @@ def test_plugins(caplog):
     print(plgs['source'][0].order)
     # ~ assert False
 
+
+def test_fetch_queue(caplog):
+    caplog.set_level(logging.DEBUG, logger="osint")
+    quest = osint.OSIntQuest(default_cats=cats)
+    quest.add_source('source1', 'source1', url='https://example.com/a', docname='doc1')
+    quest.add_source('source2', 'source2', url='https://example.com/b', docname='doc2')
+    quest.add_source('source1', 'source1', url='https://example.com/a', docname='doc1')
+    quest.clean_docname('doc2')
+    assert ['source.source1'] == quest.pop_fetch()
+    assert [] == quest.pop_fetch()
+
+def test_fetcher(caplog):
+    import threading
+    import time
+    from sphinxcontrib.osint.fetchlib import OSIntFetcher
+
+    class FakeApp:
+        verbosity = 0
+
+    class FakeEnv:
+        app = FakeApp()
+
+    class FakePlugin:
+        name = 'fake'
+        lock = threading.Lock()
+        running = {}
+        max_running = {}
+        fetched = []
+
+        @classmethod
+        def init_source(cls, env, source):
+            host = OSIntFetcher.host(source)
+            with cls.lock:
+                cls.running[host] = cls.running.get(host, 0) + 1
+                cls.max_running[host] = max(cls.max_running.get(host, 0), cls.running[host])
+            time.sleep(0.02)
+            with cls.lock:
+                cls.running[host] -= 1
+                cls.fetched.append(source.name)
+
+    quest = osint.OSIntQuest(default_cats=cats)
+    for i in range(6):
+        quest.add_source(f'source{i}', f'source{i}', url=f'https://host{i%2}.example.com/{i}')
+    quest.add_source('local1', 'local1', local='local1.pdf')
+    assert OSIntFetcher.host(quest.sources['source.local1']) == 'local'
+    fetcher = OSIntFetcher(FakeEnv(), [FakePlugin], workers=8, per_host=2)
+    fetched = fetcher.process(quest)
+    assert sorted(fetched) == sorted(quest.sources.keys())
+    assert sorted(FakePlugin.fetched) == sorted(quest.sources.keys())
+    assert FakePlugin.max_running['host0.example.com'] <= 2
+    assert FakePlugin.max_running['host1.example.com'] <= 2
+    assert [] == fetcher.process(quest)
+
+def test_fetcher_timeout(caplog):
+    import time
+    import threading
+    from sphinxcontrib.osint.fetchlib import OSIntFetcher
+
+    class FakeApp:
+        verbosity = 0
+
+    class FakeEnv:
+        app = FakeApp()
+
+    class HungPlugin:
+        name = 'hung'
+        release = threading.Event()
+        left = None
+
+        workers_done = []
+
+        @classmethod
+        def fetch_worker_done(cls, env):
+            cls.workers_done.append(threading.current_thread().name)
+
+        @classmethod
+        def init_source(cls, env, source):
+            if source.name == 'source.source0':
+                cls.release.wait(30)
+            elif source.name == 'source.source1':
+                # Signals don't work in workers : the calls get a deadline
+                with Plugin.time_limit(60):
+                    cls.left = time_left()
+
+    from sphinxcontrib.osint.plugins import Plugin
+    from sphinxcontrib.osint.osintlib import time_left
+    quest = osint.OSIntQuest(default_cats=cats)
+    for i in range(4):
+        quest.add_source(f'source{i}', f'source{i}', url=f'https://host{i}.example.com/{i}')
+    # Waiting for the slot of the hung worker on host0
+    quest.add_source('source4', 'source4', url='https://host0.example.com/4')
+    fetcher = OSIntFetcher(FakeEnv(), [HungPlugin], workers=2, per_host=1, timeout=1)
+    try:
+        fetched = fetcher.process(quest)
+    finally:
+        HungPlugin.release.set()
+    assert sorted(fetched) == ['source.source1', 'source.source2', 'source.source3']
+    assert 'Timeout fetching source.source0' in caplog.text
+    assert 'Skip fetching source.source4 : a fetch timed out on host0.example.com' in caplog.text
+    assert 50 < HungPlugin.left <= 60
+    assert time_left() is None
+    # The workers released their resources when they ended
+    for i in range(50):
+        if len(HungPlugin.workers_done) == 3:
+            break
+        time.sleep(0.1)
+    assert HungPlugin.workers_done == ['osint-fetch'] * 3
+
+def test_host_scheduler(tmp_path):
+    from sphinxcontrib.osint.fetchlib import OSIntHostScheduler
+
+    methods = ['trafilatura', 'selenium', 'selenium_delay', 'playwright']
+    hostsf = str(tmp_path / 'hosts.json')
+    scheduler = OSIntHostScheduler(hostsf, delay=0, backoff=0.01, max_delay=0.02)
+    assert scheduler.order('example.com', methods) == methods
+    scheduler.wait('example.com')
+    scheduler.failure('example.com', 'trafilatura')
+    scheduler.failure('example.com', 'selenium')
+    scheduler.wait('example.com')
+    scheduler.success('example.com', 'playwright')
+    # A single failure is not enough to drop a method
+    assert scheduler.order('example.com', methods) == ['playwright', 'trafilatura', 'selenium', 'selenium_delay']
+    for i in range(2):
+        scheduler.failure('example.com', 'trafilatura')
+        scheduler.failure('example.com', 'selenium')
+    scheduler.failure('example.com', 'selenium_delay')
+    scheduler.failure('example.com', 'selenium_delay')
+    scheduler.success('example.com', 'selenium_delay')
+    scheduler.failure('example.com', 'selenium_delay')
+    assert scheduler.order('example.com', methods) == ['playwright', 'selenium_delay']
+    assert scheduler.order('other.com', methods) == methods
+    # Stats are written in batches, or by dump()
+    assert not os.path.isfile(hostsf)
+    scheduler.dump()
+
+    scheduler = OSIntHostScheduler(hostsf)
+    assert scheduler.order('example.com', methods) == ['playwright', 'selenium_delay']
+    assert scheduler.order('example.com', ['selenium']) == ['selenium']
+    scheduler = OSIntHostScheduler(hostsf, ttl=-1)
+    assert scheduler.order('example.com', methods) == methods
+
+def test_quest_index(caplog):
+    quest = osint.OSIntQuest(default_cats=cats, default_country='FR')
+    quest.add_org('org1', 'org1', cats=['test1'], docname='doc1')
+    quest.add_org('org2', 'org2', cats=['test2'], country='DE', docname='doc2')
+    quest.add_ident('ident1', 'ident1', orgs='org1', docname='doc1')
+    quest.add_ident('ident2', 'ident2', orgs='org2', docname='doc2')
+    quest.add_ident('ident3', 'ident3', cats='test2', docname='doc2')
+    quest.add_relation('rel1', 'ident1', 'ident2', docname='doc2')
+    quest.add_event('event1', 'event1', orgs='org1', docname='doc1')
+    quest.add_link('link1', 'ident3', 'event1', docname='doc2')
+    assert ['ident.ident1'] == quest.get_idents(cats=['test1'])
+    assert ['ident.ident2', 'ident.ident3'] == quest.get_idents(cats=['test2'])
+    assert ['ident.ident2'] == quest.get_idents(countries=['DE'])
+    assert ['ident.ident1'] == quest.get_idents(orgs=['org1'])
+    assert ['ident.ident3'] == quest.get_idents(cats=['test1', 'test2'], exclude_cats=['test1'], countries='FR')
+    assert ['relation.ident.ident1__rel1__ident.ident2'] == quest.get_relations(cats=['test1'])
+    rel_idents, rels = quest.get_idents_relations(['ident.ident1'])
+    assert ['ident.ident2', 'ident.ident1'] == rel_idents
+    assert ['relation.ident.ident1__rel1__ident.ident2'] == rels
+    idents, events, links = quest.get_idents_events(['ident.ident1'], ['event.event1'])
+    assert ['ident.ident3', 'ident.ident1'] == idents
+    assert ['link.ident.ident3__link1__event.event1'] == links
+
+    quest.clean_docname('doc2')
+    assert ['ident.ident1'] == quest.get_idents()
+    assert [] == quest.get_idents(cats=['test2'])
+    assert ([], []) == quest.get_idents_relations([])
+    assert (['ident.ident1'], []) == quest.get_idents_relations(['ident.ident1'])
+
+    other = osint.OSIntQuest(default_cats=cats, default_country='FR')
+    other.add_org('org2', 'org2', cats=['test2'], country='DE', docname='doc2')
+    other.add_ident('ident2', 'ident2', orgs='org2', docname='doc2')
+    other.add_ident('ident4', 'ident4', orgs='org2', docname='doc3')
+    other.add_relation('rel1', 'ident1', 'ident2', docname='doc2')
+    quest.merge_quest('doc2', other)
+    assert ['ident.ident1', 'ident.ident2'] == quest.get_idents()
+    assert ['ident.ident2'] == quest.get_idents(orgs=['org2'])
+    rel_idents, rels = quest.get_idents_relations(['ident.ident2'])
+    assert ['relation.ident.ident1__rel1__ident.ident2'] == rels
+
+def test_source_linked(caplog):
+    quest = osint.OSIntQuest(default_cats=cats, default_country='FR')
+    quest.add_source('source1', 'source1', docname='doc1')
+    quest.add_org('org1', 'org1', sources='source1', docname='doc1')
+    quest.add_ident('ident1', 'ident1', orgs='org1', sources='source1', docname='doc1')
+    quest.add_ident('ident2', 'ident2', sources='source1', fetchmethod='playwright', docname='doc2')
+    quest.add_event('event1', 'event1', sources='source1', docname='doc1')
+    quest.add_link('link1', 'ident2', 'event1', sources='source1', docname='doc2')
+    source = quest.sources['source.source1']
+    assert ['org.org1'] == source.linked_orgs()
+    assert ['ident.ident1', 'ident.ident2'] == source.linked_idents()
+    assert ['ident.ident2'] == source.linked_idents(['ident.ident2'])
+    assert ['event.event1'] == source.linked_events()
+    assert ['link.ident.ident2__link1__event.event1'] == source.linked_links()
+    assert ['ident.ident1'] == quest.orgs['org.org1'].linked_idents()
+    assert source.fetchmethod == 'playwright'
+
+    quest.clean_docname('doc2')
+    assert ['ident.ident1'] == source.linked_idents()
+    assert [] == source.linked_links()
+    assert source.fetchmethod is None
+    quest.add_ident('ident2', 'ident2', sources='source1', docname='doc2')
+    assert ['ident.ident1', 'ident.ident2'] == source.linked_idents()
+
+def test_sources_dedup(caplog):
+    quest = osint.OSIntQuest(default_cats=cats, default_country='FR')
+    for i in range(4):
+        quest.add_source(f'source{i}', f'source{i}')
+    quest.add_org('org1', 'org1', sources='source2,source1')
+    quest.add_ident('ident1', 'ident1', orgs='org1', sources='source1,source3')
+    quest.add_ident('ident2', 'ident2', sources='source0,source2')
+    assert ['source.source2', 'source.source1', 'source.source3', 'source.source0'] == quest.get_sources()
+    sources = quest.iter_sources()
+    assert 'source.source2' == next(sources)
+    assert ['source.source1', 'source.source3', 'source.source0'] == list(sources)
+    assert ['source.source1', 'source.source3', 'source.source0', 'source.source2'] == quest.get_sources(
+        filtered_orgs=[], filtered_idents={'ident.ident2', 'ident.ident1'})
+
+def test_query_cache(caplog):
+    import pickle
+    quest = osint.OSIntQuest(default_cats=cats, default_country='FR')
+    quest.add_org('org1', 'org1', cats=['test1'])
+    quest.add_ident('ident1', 'ident1', orgs='org1')
+    quest.add_ident('ident2', 'ident2', cats='test2')
+    quest.add_relation('rel1', 'ident1', 'ident2')
+    quest.add_graph('graph1', 'graph1', cats='test1')
+    graph = quest.graphs['graph.graph1']
+    data = graph.data_filter(graph.cats, graph.orgs, graph.begin, graph.end, graph.countries, graph.idents)
+    assert ['ident.ident2', 'ident.ident1'] == data[3]
+    data[3].append('ident.fake')
+    data = graph.data_filter(['test1'], graph.orgs, graph.begin, graph.end, graph.countries, graph.idents)
+    assert ['ident.ident2', 'ident.ident1'] == data[3]
+    assert 1 == len(quest._query_cache)
+    quest.add_ident('ident3', 'ident3', cats='test1')
+    data = graph.data_filter(graph.cats, graph.orgs, graph.begin, graph.end, graph.countries, graph.idents)
+    assert ['ident.ident2', 'ident.ident1', 'ident.ident3'] == data[3]
+    assert 1 == len(quest._query_cache)
+    assert {} == pickle.loads(pickle.dumps(quest))._query_cache
+
+def test_quest_store(tmp_path):
+    from sphinxcontrib.osint.storelib import OSIntQuestStore
+    quest = osint.OSIntQuest(default_cats=cats, default_country='FR')
+    quest.add_org('org1', 'org1', cats=['test1'], docname='doc1')
+    quest.add_ident('ident1', 'ident1', orgs='org1', docname='doc1')
+    quest.add_ident('ident2', 'ident2', cats='test2', docname='doc2')
+    quest.add_relation('rel1', 'ident1', 'ident2', docname='doc2')
+    quest.add_graph('graph1', 'graph1', cats='test1', docname='doc3')
+    store = OSIntQuestStore(str(tmp_path))
+    store.begin(quest)
+    assert 5 == store.save(quest)
+
+    loaded = store.load_quest()
+    assert list(quest.idents) == list(loaded.idents)
+    assert loaded is loaded.idents['ident.ident1'].quest
+    assert ['ident.ident1'] == loaded.get_idents(orgs=['org1'])
+    assert ['ident.ident2', 'ident.ident1'] == loaded.get_idents_relations(['ident.ident1'])[0]
+
+    # Only changed documents and relateds are written again
+    store.begin(quest)
+    quest.clean_docname('doc2')
+    quest.add_ident('ident3', 'ident3', cats='test2', docname='doc2')
+    assert 2 == store.save(quest)
+    loaded = store.load_quest(kinds=['idents'])
+    assert ['ident.ident1', 'ident.ident3'] == list(loaded.idents)
+    assert {} == loaded.relations
+    assert ['graph.graph1'] == store.names('graphs')
+    assert 'org1' == store.load_item(loaded, 'orgs', 'org.org1').label
+    assert None is store.load_item(loaded, 'orgs', 'org.fake')
+
+    # A new quest is fully written
+    other = osint.OSIntQuest(default_cats=cats)
+    other.add_org('org2', 'org2', docname='doc1')
+    store.begin(other)
+    assert 1 == store.save(other)
+    assert ['org.org2'] == list(store.load_quest().orgs)
+
+def test_quest_store_env(tmp_path):
+    from types import SimpleNamespace
+    from sphinx.config import Config
+    from sphinxcontrib.osint.storelib import OSIntQuestStore, OSIntStoredEnv
+    config = Config({'project': 'test'}, {})
+    for name, default, rebuild in osint.config_values:
+        config.add(name, default, rebuild, ())
+    config.add('osint_test_value', 'test', 'html', ())
+    config.add('osint_test_func', None, 'html', ())
+    config.init_values()
+    config.osint_test_func = lambda: None
+    env = SimpleNamespace(srcdir=str(tmp_path), doctreedir=str(tmp_path), config=config)
+    quest = osint.OSIntQuest(default_cats=cats, default_country='FR', sphinx_env=env)
+    quest.add_org('org1', 'org1', cats=['test1'], docname='doc1')
+    store = OSIntQuestStore(str(tmp_path))
+    store.save(quest)
+
+    for loaded in (store.load_quest(), store.load_view()):
+        assert isinstance(loaded.sphinx_env, OSIntStoredEnv)
+        assert loaded.sphinx_env is loaded.orgs['org.org1'].quest.sphinx_env
+        assert str(tmp_path) == loaded.sphinx_env.srcdir
+        assert 'test' == loaded.get_config('osint_test_value')
+        assert hasattr(loaded.sphinx_env.config, 'osint_test_func') is False
+        assert hasattr(loaded.sphinx_env.config, 'project') is False
+    store.close()
+
+def test_quest_view(tmp_path):
+    from sphinxcontrib.osint.storelib import OSIntQuestStore
+    quest = osint.OSIntQuest(default_cats=cats, default_country='FR')
+    quest.add_org('org1', 'org1', cats=['test1'], docname='doc1')
+    for i in range(10):
+        quest.add_ident(f'ident{i}', f'ident{i}', orgs='org1', docname='doc1')
+    quest.add_relation('rel1', 'ident1', 'ident2', docname='doc2')
+    store = OSIntQuestStore(str(tmp_path))
+    store.save(quest)
+
+    view = OSIntQuestStore(str(tmp_path)).load_view(cache_size=4)
+    assert list(quest.idents) == list(view.idents)
+    assert 10 == len(view.idents)
+    assert 'ident.ident3' in view.idents
+    assert 'ident3' == view.idents['ident.ident3'].label
+    assert view is view.idents['ident.ident3'].quest
+    assert view.idents['ident.ident3'] is view.idents['ident.ident3']
+    assert [f'ident{i}' for i in range(10)] == [idt.label for idt in view.idents.values()]
+    assert 4 == len(view.idents.cache)
+    with pytest.raises(KeyError):
+        view.idents['ident.fake']
+    with pytest.raises(TypeError):
+        view.idents['ident.fake'] = None
+    assert ['relation.ident.ident1__rel1__ident.ident2'] == view.get_linked('ident_relations', 'ident.ident1')
+    assert ['ident.ident0', 'ident.ident1'] == view.get_idents(orgs=['org1'])[:2]
+    assert [('relations', 'relation.ident.ident1__rel1__ident.ident2')] == view.get_docname_items('doc2')
+    assert [] == view.get_docname_items('doc3')
+    view.idents.store.close()
+
+    # Reference indexes are not in the shell but updated with the items
+    store.begin(quest)
+    quest.clean_docname('doc2')
+    quest.add_relation('rel1', 'ident3', 'ident2', docname='doc2')
+    store.save(quest)
+    view = OSIntQuestStore(str(tmp_path)).load_view()
+    assert [] == view.get_linked('ident_relations', 'ident.ident1')
+    assert ['relation.ident.ident3__rel1__ident.ident2'] == view.get_linked('ident_relations', 'ident.ident2')
+    assert 'ident.ident3' in view._index_refs['ident_relations']
+    assert 'ident.ident1' not in view._index_refs['ident_relations']
+    shell = OSIntQuestStore.shell(quest, OSIntQuestStore.kinds(quest))
+    assert {} == shell['_index_refs'] and {} == shell['_index_pos'] and {} == shell['_index_docs']
+    view.idents.store.close()
+
+def test_related_outdated(caplog):
+    quest = osint.OSIntQuest(default_cats=cats, default_country='FR')
+    quest.add_org('org1', 'org1', cats=['test1'], docname='doc1')
+    quest.add_ident('ident1', 'ident1', orgs='org1', docname='doc1')
+    quest.add_ident('ident2', 'ident2', cats='test2', docname='doc2')
+    quest.add_graph('graph1', 'graph1', cats='test1', docname='doc3')
+    graph = quest.graphs['graph.graph1']
+    assert graph.outdated(quest.get_changed()) is True
+    assert {'org.org1', 'ident.ident1'} == graph._depends
+
+    # An item not shown by the graph changed
+    quest.reset_changed()
+    quest.clean_docname('doc2')
+    quest.add_ident('ident2', 'ident2', cats='test2', docname='doc2')
+    assert graph.outdated(quest.get_changed()) is False
+
+    # The items shown by the graph are read again without change
+    quest.reset_changed()
+    quest.clean_docname('doc1')
+    quest.add_org('org1', 'org1', cats=['test1'], docname='doc1')
+    quest.add_ident('ident1', 'ident1', orgs='org1', docname='doc1')
+    assert set() == quest.get_changed()
+    assert graph.outdated(quest.get_changed()) is False
+
+    # An item shown by the graph changed
+    quest.reset_changed()
+    quest.clean_docname('doc1')
+    quest.add_org('org1', 'org1', cats=['test1'], docname='doc1')
+    quest.add_ident('ident1', 'ident1 changed', orgs='org1', docname='doc1')
+    assert {'ident.ident1'} == quest.get_changed()
+    assert graph.outdated(quest.get_changed()) is True
+
+    # An item shown by the graph is removed
+    quest.reset_changed()
+    quest.clean_docname('doc1')
+    assert {'org.org1', 'ident.ident1'} == quest.get_changed()
+
+    # The lines of the document are shifted
+    from docutils.statemachine import StringList
+    def content(offset):
+        parent = StringList(['', 'before'] * offset + ['text'], source='doc5.rst')
+        return parent[len(parent) - 1:]
+    quest.add_ident('ident5', 'ident5', content=content(1), docname='doc5')
+    quest.reset_changed()
+    quest.clean_docname('doc5')
+    quest.add_ident('ident5', 'ident5', content=content(3), docname='doc5')
+    assert set() == quest.get_changed()
+    quest.clean_docname('doc5')
+    quest.add_ident('ident5', 'ident5', content=StringList(['other text']), docname='doc5')
+    assert {'ident.ident5'} == quest.get_changed()
+
+    # A new item is shown by the graph
+    quest.reset_changed()
+    quest.add_ident('ident3', 'ident3', cats='test1', docname='doc4')
+    assert graph.outdated(set()) is True
+    assert graph.outdated(set()) is False
+
+def test_merge_quest(caplog):
+    import pickle
+    quest = osint.OSIntQuest(default_cats=cats, default_country='FR')
+    quest.add_org('org1', 'org1', cats=['test1'], docname='doc1')
+    quest.add_ident('ident1', 'ident1', orgs='org1', docname='doc1')
+
+    other = pickle.loads(pickle.dumps(quest))
+    other.add_country('DE', 'Germany', docname='doc2')
+    other.add_city('berlin', 'Berlin', docname='doc2')
+    other.add_ident('ident2', 'ident2', cats='test2', docname='doc2')
+    other.add_event('event1', 'event1', docname='doc3')
+    other.add_quote('quote1', 'event1', 'event1', docname='doc3')
+    other.add_ident('ident1', 'ident1', docname='doc3')
+    other.add_ident('ident4', 'ident4', docname='doc4')
+
+    # The parallel build reported the duplicate of doc1 which it did not read
+    caplog.clear()
+    conflicts = quest.merge_quest({'doc3', 'doc2'}, other)
+    assert [('idents', 'ident.ident1', 'doc3', 'doc1')] == conflicts
+    assert 'Duplicate' not in caplog.text
+    assert ['ident.ident1', 'ident.ident2'] == list(quest.idents)
+    assert 'country.DE' in quest.countries
+    assert 1 == len(quest.cities)
+    assert 1 == len(quest.quotes)
+    assert quest is quest.idents['ident.ident2'].quest
+    assert ['ident.ident2'] == quest.get_idents(cats=['test2'])
+
+    quest.clean_docname('doc3')
+    assert [] == list(quest.quotes)
+    assert [] == list(quest.events)
+    assert ['ident.ident2'] == list(quest.idents)
+    assert [('countries', 'country.DE'), ('cities', 'city.berlin'), ('idents', 'ident.ident2')] == \
+        quest.get_docname_items('doc2')
+
+    # A duplicate of a document merged before is reported by the merge
+    other = pickle.loads(pickle.dumps(quest))
+    other.clean_docname('doc2')
+    other.add_ident('ident2', 'ident2', docname='doc5')
+    caplog.clear()
+    assert [('idents', 'ident.ident2', 'doc5', 'doc2')] == quest.merge_quest('doc5', other)
+    assert 'Duplicate idents ident.ident2 in doc5 and doc2' in caplog.text
+
+def test_duplicate(caplog):
+    quest = osint.OSIntQuest(default_cats=cats, default_country='FR')
+    quest.add_ident('ident1', 'ident1', docname='doc1')
+    caplog.clear()
+    quest.add_ident('ident1', 'ident1', docname='doc1')
+    assert 'Duplicate' not in caplog.text
+    quest.add_ident('ident1', 'ident1', docname='doc2')
+    assert 'Duplicate idents ident.ident1 in doc2 and doc1' in caplog.text
+
+def test_lexicon(tmp_path):
+    import pickle
+    from sphinxcontrib.osint.plugins.analyselib import OSIntLexicon
+    quest = osint.OSIntQuest(default_cats=cats, default_country='FR')
+    quest.add_org('org1', 'Big Org', docname='doc1')
+    quest.add_ident('ident1', 'John Doe', altlabels='JD|Johnny', docname='doc1')
+    quest.add_ident('ident2', 'Doe John', docname='doc1')
+    filename = str(tmp_path / 'lexicon.json')
+    lexicon = OSIntLexicon(filename)
+    assert lexicon.update(quest) is True
+    assert quest.build_full_list(objs='idents') == lexicon.get('idents')
+    assert quest.build_full_list(objs='orgs') == lexicon.get('orgs')
+    assert 'ident.ident1' == lexicon.get('idents')['doe john']
+    assert lexicon.update(quest) is False
+
+    quest.add_ident('ident3', 'Jane', docname='doc2')
+    quest.clean_docname('doc1')
+    quest.add_ident('ident2', 'Doe John', docname='doc1')
+    assert lexicon.update(quest) is True
+    assert quest.build_full_list(objs='idents') == lexicon.get('idents')
+    assert 'ident.ident2' == lexicon.get('idents')['doe john']
+
+    # Warm start : nothing to compute
+    warm = pickle.loads(pickle.dumps(lexicon))
+    assert warm.update(quest) is False
+    assert quest.build_full_list(objs='idents') == warm.get('idents')
+
+def test_matcher():
+    import random
+    from sphinxcontrib.osint.plugins.analyselib import OSIntMatcher, OSIntLexicon
+    words = ['he', 'she', 'his', 'hers', 'john', 'doe', 'jo', 'big', 'org', 'a']
+    rnd = random.Random(42)
+    patterns = {}
+    for i in range(200):
+        phrase = ' '.join(rnd.choice(words) for j in range(rnd.randint(1, 3)))
+        patterns.setdefault(f" {phrase} ", 'item%s' % (i % 50))
+    patterns['she'] = 'raw'
+    matcher = OSIntMatcher(patterns)
+    for i in range(50):
+        text = ' '.join(rnd.choice(words) for j in range(rnd.randint(0, 30)))
+        assert matcher.find(text) == [patterns[mot] for mot in patterns if mot in text]
+    assert OSIntMatcher({'': 'empty', 'x': 'x'}).find('abc') == ['empty']
+
+    quest = osint.OSIntQuest(default_cats=cats, default_country='FR')
+    quest.add_ident('ident1', 'John Doe', docname='doc1')
+    lexicon = OSIntLexicon()
+    lexicon.update(quest)
+    calls = []
+    def patterns():
+        calls.append(1)
+        return {f" {mot} ": name for mot, name in lexicon.get('idents').items()}
+    inputs = lambda: (lexicon.get('idents'),)
+    matcher = lexicon.matcher('idents', patterns, inputs=inputs())
+    assert matcher.find('a doe john b') == ['ident.ident1']
+    assert lexicon.matcher('idents', patterns, inputs=inputs()) is matcher
+    assert len(calls) == 1
+    quest.add_ident('ident2', 'Jane', docname='doc1')
+    lexicon.update(quest)
+    assert lexicon.matcher('idents', patterns, inputs=inputs()) is not matcher
+    assert lexicon.matcher('idents', patterns, inputs=inputs()).find('a jane doe john b') == ['ident.ident1', 'ident.ident2']
+    assert len(calls) == 2
+    # Lists not from the lexicon are not cached
+    matcher = lexicon.matcher('idents', patterns, inputs=inputs())
+    only = {mot: name for mot, name in lexicon.get('idents').items() if name == 'ident.ident2'}
+    assert lexicon.matcher('idents', lambda: {f" {mot} ": name for mot, name in only.items()},
+        inputs=(only,)).find('a jane doe john b') == ['ident.ident2']
+    assert lexicon.matcher('idents', patterns, inputs=inputs()) is matcher
+
+def test_analyse_batch():
+    from sphinxcontrib.osint.plugins.analyselib import OSIntLexicon, analyse_batch
+    quest = osint.OSIntQuest(default_cats=cats, default_country='FR')
+    quest.add_country('france', 'France', docname='doc1')
+    lexicon = OSIntLexicon()
+    lexicon.update(quest)
+    ret = analyse_batch([
+        ('src1', 'Visit France and france.', ['countries'], {}),
+        ('src2', 'Nothing here', ['countries'], {}),
+        ('src3', 'France', ['countries', 'unknown'], {}),
+    ], quest=quest, lexicon=lexicon)
+    assert ret[0] == ('src1', {'countries': {'countries': [('country.france', 1)]}}, None)
+    assert ret[1] == ('src2', {'countries': {'countries': []}}, None)
+    assert ret[2][0] == 'src3' and ret[2][1] is None and 'unknown' in ret[2][2]
+
+def test_engine_accumulator():
+    from sphinxcontrib.osint.plugins.analyselib import ENGINES
+    sources = [
+        {'ident': {'idents': [['ident.a', 2], ['ident.b', 1]], 'orgs': []},
+         'mood': {'sentiment_general': 'Positive', 'scores_vader': {'positif': 0.5}}},
+        {'ident': {'idents': [['ident.b', 3]], 'orgs': [['org.a', 1]]},
+         'mood': {'sentiment_general': 'Neutral', 'scores_vader': {'positif': 0.1}}},
+        {},
+    ]
+    stats = {}
+    for stats1 in sources:
+        if stats == {}:
+            stats = stats1
+        else:
+            stats = {engine: ENGINES[engine].merge(stats, stats1) for engine in ('ident', 'mood')}
+    for engine in ('ident', 'mood'):
+        acc = ENGINES[engine].begin()
+        for stats1 in sources:
+            if engine in stats1:
+                ENGINES[engine].add(acc, stats1[engine])
+        assert ENGINES[engine].finalize(acc) == stats[engine]
+    assert stats['ident']['idents'] == [('ident.b', 4), ('ident.a', 2)]
+
+def test_idents_index(tmp_path):
+    import json
+    import pickle
+    from sphinxcontrib.osint.plugins.analyselib import OSIntIdentsIndex
+    files = {}
+    for name, idents in (('src1', ['ident.a', 'ident.b']), ('src2', ['ident.b', 'ident.c']), ('src3', [])):
+        files[name] = str(tmp_path / f'{name}.json')
+        with open(files[name], 'w') as f:
+            json.dump({'ident': {'idents': [[idt, 1] for idt in idents], 'orgs': []}}, f)
+    filename = str(tmp_path / '__idents__.json')
+    index = OSIntIdentsIndex(filename)
+    assert index.sync(files, generation=1) is True
+    index.dump()
+    assert index.sources('ident.b') == ['src1', 'src2']
+    assert index.cooccurrences('ident.b') == {'ident.a': ['src1'], 'ident.c': ['src2']}
+    assert index.cooccurrences('ident.z') == {}
+
+    warm = pickle.loads(pickle.dumps(index))
+    assert warm.generation is None
+    assert warm.sync(files) is False
+    assert warm.cooccurrences('ident.b') == index.cooccurrences('ident.b')
+
+    index.update('src2', 0.0, {'ident': {'idents': [['ident.a', 2]]}})
+    assert index.cooccurrences('ident.a') == {'ident.b': ['src1']}
+    assert index.sources('ident.c') == []
+    del files['src1']
+    assert index.sync(files) is True
+    assert index.sources('ident.a') == []
+    assert index.sources('ident.c') == ['src2']
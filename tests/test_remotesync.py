@@ -0,0 +1,157 @@
+# -*- encoding: utf-8 -*-
+"""Test module
+
+"""
+import os
+import sys
+import json
+import shutil
+from pathlib import Path
+
+from sphinxcontrib.osint import remotesync
+
+sys.path.append(os.path.abspath(".."))
+
+
+class LocalBackend(remotesync._BaseBackend):
+    """A backend writing in a local directory, counting the listings"""
+    root = None
+    listings = []
+
+    def path(self, remote_path):
+        return Path(self.root) / remote_path.lstrip("/")
+
+    def connect(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def upload_file(self, local_path, remote_path, ensure_dir=True):
+        if ensure_dir:
+            self.makedirs(os.path.dirname(remote_path))
+        shutil.copyfile(local_path, self.path(remote_path))
+
+    def remote_mtime(self, remote_path):
+        try:
+            return self.path(remote_path).stat().st_mtime
+        except FileNotFoundError:
+            return None
+
+    def makedirs(self, remote_dir):
+        self.path(remote_dir).mkdir(parents=True, exist_ok=True)
+
+    def mkdir_leaf(self, remote_dir):
+        self.path(remote_dir).mkdir(exist_ok=True)
+
+    def list_remote(self, remote_dir):
+        return list(self.list_remote_with_mtimes(remote_dir))
+
+    def list_dir_entries(self, remote_dir):
+        self.listings.append(remote_dir)
+        if not self.path(remote_dir).is_dir():
+            return []
+        return [(e.name, e.is_dir(), None if e.is_dir() else e.stat().st_mtime)
+            for e in os.scandir(self.path(remote_dir))]
+
+    def remote_exists(self, remote_path):
+        return self.path(remote_path).exists()
+
+    def create_empty_file(self, remote_path):
+        self.path(remote_path).touch(exist_ok=False)
+
+    def download_file(self, remote_path, local_path):
+        shutil.copyfile(self.path(remote_path), local_path)
+
+    def delete_remote(self, remote_path):
+        self.path(remote_path).unlink()
+
+    def rename_remote(self, remote_src, remote_dst):
+        os.replace(self.path(remote_src), self.path(remote_dst))
+
+
+def make_sync(tmp_path, monkeypatch, **extra):
+    ini = tmp_path / "config.ini"
+    options = dict(protocol="sftp", host="localhost", username="test", remote_base_dir="/www",
+        manifest="true", manifest_key="secret", manifest_cache=str(tmp_path / "cache"),
+        delete_orphans="true", max_workers="2")
+    options.update(extra)
+    ini.write_text("[remotesync]\n" + "".join("%s = %s\n" % item for item in options.items()))
+    LocalBackend.root = str(tmp_path / "server")
+    LocalBackend.listings = []
+    monkeypatch.setattr(remotesync.RemoteSync, "_build_backend", lambda self: LocalBackend(self.config))
+    return remotesync.RemoteSync(ini, section="remotesync")
+
+
+def test_manifest_sync(tmp_path, monkeypatch):
+    site = tmp_path / "site"
+    (site / "sub" / "deep").mkdir(parents=True)
+    (site / "index.html").write_text("index")
+    (site / "sub" / "page.html").write_text("page")
+    (site / "sub" / "deep" / "old.html").write_text("old")
+    sync = make_sync(tmp_path, monkeypatch)
+
+    result = sync.sync_directory(site)
+    assert result.success
+    assert len(result.uploaded) == 3
+    assert len(LocalBackend.listings) > 0
+    manifest_file = tmp_path / "server" / "www" / ".remotesync-manifest.json"
+    manifest = json.loads(manifest_file.read_text())
+    assert remotesync._verify_manifest(manifest, "secret")
+    assert not remotesync._verify_manifest(manifest, "other")
+    assert sorted(manifest["files"]) == ["index.html", "sub/deep/old.html", "sub/page.html"]
+
+    # Rewritten with the same content, changed, added, removed : no listing
+    LocalBackend.listings = []
+    (site / "index.html").write_text("index")
+    os.utime(site / "index.html", (1, 1))
+    (site / "sub" / "page.html").write_text("page changed")
+    (site / "new").mkdir()
+    (site / "new" / "added.html").write_text("added")
+    (site / "sub" / "deep" / "old.html").unlink()
+    result = sync.sync_directory(site)
+    assert result.success
+    assert LocalBackend.listings == []
+    assert sorted(result.uploaded) == ["/www/new/added.html", "/www/sub/page.html"]
+    assert result.skipped == ["/www/index.html"]
+    assert result.deleted == ["/www/sub/deep/old.html"]
+    assert (tmp_path / "server" / "www" / "new" / "added.html").read_text() == "added"
+    assert not (tmp_path / "server" / "www" / ".remotesync-manifest.json.tmp").exists()
+
+    # Nothing changed
+    result = sync.sync_directory(site)
+    assert result.uploaded == [] and result.deleted == []
+    assert len(result.skipped) == 3
+    assert LocalBackend.listings == []
+
+
+def test_manifest_fallback(tmp_path, monkeypatch):
+    site = tmp_path / "site"
+    site.mkdir()
+    (site / "index.html").write_text("index")
+    sync = make_sync(tmp_path, monkeypatch)
+    assert sync.sync_directory(site).success
+    manifest_file = tmp_path / "server" / "www" / ".remotesync-manifest.json"
+
+    # Tampered manifest : full scan, and the manifest itself is not an orphan
+    manifest = json.loads(manifest_file.read_text())
+    manifest["files"]["ghost.html"] = [1, 1, "0"]
+    manifest_file.write_text(json.dumps(manifest))
+    LocalBackend.listings = []
+    result = sync.sync_directory(site)
+    assert result.success and result.deleted == []
+    assert len(LocalBackend.listings) > 0
+    assert "ghost.html" not in json.loads(manifest_file.read_text())["files"]
+
+    # Missing manifest : full scan
+    manifest_file.unlink()
+    LocalBackend.listings = []
+    assert sync.sync_directory(site).success
+    assert len(LocalBackend.listings) > 0
+    assert manifest_file.exists()
+
+    # The cache of another machine is rebuilt from the remote manifest
+    shutil.rmtree(tmp_path / "cache")
+    LocalBackend.listings = []
+    assert sync.sync_directory(site).skipped == ["/www/index.html"]
+    assert LocalBackend.listings == []
@@ -0,0 +1,50 @@
+# -*- encoding: utf-8 -*-
+"""Test module
+
+"""
+import os
+import sys
+import logging
+
+import pytest
+
+from sphinxcontrib import osint
+from sphinxcontrib.osint.plugins import timelinelib
+
+sys.path.append(os.path.abspath(".."))
+
+def test_timeline_render_job(tmp_path, caplog):
+    caplog.set_level(logging.DEBUG, logger="osint")
+    from sphinxcontrib.osint.plugins.timeline import OSIntTimeline
+    quest = osint.OSIntQuest()
+    quest.add_org('org1', 'org1')
+    quest.add_ident('ident1', 'ident1', orgs='org1')
+    quest.add_event('event2', 'event2', begin='2024-03-01', orgs='org1')
+    quest.add_event('event1', 'event1', begin='2023-05-01', orgs='org1')
+    quest.add_link('link1', 'ident1', 'event1')
+    quest.add_link('link2', 'ident1', 'event2')
+    timeline = OSIntTimeline('timeline.test', 'Test', quest=quest, orgs='org1', format='svg')
+    filename, job = timeline.render_job(str(tmp_path))
+    assert filename.endswith('_400x200.svg')
+    assert job['dates'] == ['2023-05-01', '2024-03-01']
+    assert job['labels'] == [quest.events['event.event1'].sshort, quest.events['event.event2'].sshort]
+    with open(job['filepath'], 'w') as f:
+        f.write('rendered')
+    assert timeline.render_job(str(tmp_path)) == (filename, None)
+    assert timeline.graph(str(tmp_path)) == filename
+
+def test_timeline_thin_and_tooltips(tmp_path):
+    np = pytest.importorskip('numpy')
+    assert list(timelinelib.OSIntTimelineRenderer.thin(np.array([0, 1, 2, 10, 10.5, 30]), 5)) == [0, 3, 5]
+    assert list(timelinelib.OSIntTimelineRenderer.thin(np.array([0, 1, 2]), 0)) == [0, 1, 2]
+    pytest.importorskip('matplotlib')
+    labels = ['event %s' % i for i in range(200)]
+    job = {'filepath': str(tmp_path / 'timeline.svg'), 'format': 'svg',
+        'dates': [str(np.datetime64('2020-01-01') + i * 3) for i in range(200)], 'labels': labels,
+        'width': 400, 'height': 200, 'dpi': 100, 'fontsize': 9, 'color': '#2E86AB', 'marker': 'o'}
+    timelinelib.render_timeline(job)
+    with open(job['filepath']) as f:
+        svg = f.read()
+    assert svg.count('<title>') == 200
+    # Labels without room are only tooltips
+    assert svg.count('<g id="text_') < 50
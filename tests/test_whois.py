@@ -0,0 +1,108 @@
+# -*- encoding: utf-8 -*-
+"""Test module
+
+"""
+import os
+import sys
+import json
+import threading
+import socketserver
+from types import SimpleNamespace
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from sphinxcontrib.osint.plugins.whoislib import OSIntWhoisResolver
+
+sys.path.append(os.path.abspath(".."))
+
+def test_whois_normalize_history():
+    record = OSIntWhoisResolver.normalize({'domain_name': ['EXAMPLE.COM', 'example.com'],
+        'registrar': 'Registrar One', 'creation_date': [datetime(2000, 1, 1), datetime(2000, 1, 2)],
+        'expiration_date': datetime(2030, 1, 1), 'name_servers': ['NS2.EXAMPLE.NET.', 'ns1.example.net']})
+    assert record == {'domain_name': 'example.com', 'registrar': 'Registrar One',
+        'creation_date': '2000-01-01T00:00:00', 'updated_date': None,
+        'expiration_date': '2030-01-01T00:00:00', 'name_servers': ['ns1.example.net', 'ns2.example.net']}
+    assert OSIntWhoisResolver.changes(None, record) == {}
+    assert OSIntWhoisResolver.changes(record, dict(record, registrar='Registrar Two', creation_date='2001')) == {
+        'registrar': ['Registrar One', 'Registrar Two']}
+
+    now = datetime.now(timezone.utc)
+    assert OSIntWhoisResolver.is_stale(None, 30) is True
+    assert OSIntWhoisResolver.is_stale({'whois': None}, 30) is True
+    assert OSIntWhoisResolver.is_stale({'whois': {}}, 30) is True
+    assert OSIntWhoisResolver.is_stale({'whois': {}}, 0) is False
+    assert OSIntWhoisResolver.is_stale({'whois': {}, 'time': (now - timedelta(days=2)).isoformat()}, 30) is False
+    assert OSIntWhoisResolver.is_stale({'whois': {}, 'time': (now - timedelta(days=31)).isoformat()}, 30) is True
+    assert OSIntWhoisResolver.is_stale({'whois': None, 'error': now.isoformat()}, 30) is False
+
+
+class FakeWhoisHandler(socketserver.StreamRequestHandler):
+    """A local whois server on a random port"""
+    records = {}
+    queries = []
+
+    def handle(self):
+        domain = self.rfile.readline().decode().strip()
+        self.queries.append(domain)
+        if domain in self.records:
+            registrar, expiry, nameservers = self.records[domain]
+            text = f"   Domain Name: {domain.upper()}\n   Registrar: {registrar}\n" \
+                "   Creation Date: 2000-01-01T00:00:00Z\n" \
+                f"   Registry Expiry Date: {expiry}T00:00:00Z\n" + \
+                ''.join(f"   Name Server: {ns}\n" for ns in nameservers)
+        else:
+            text = f'No match for "{domain.upper()}".\n'
+        self.wfile.write(text.encode())
+
+
+def test_whois_fake_server(tmp_path):
+    pytest.importorskip('whois')
+    from sphinxcontrib.osint.plugins.whois import OSIntWhois
+    FakeWhoisHandler.records = {
+        'example.com': ('Registrar One', '2030-01-01', ['NS1.EXAMPLE.NET', 'NS2.EXAMPLE.NET']),
+        'example.org': ('Registrar One', '2031-01-01', ['NS1.EXAMPLE.NET']),
+    }
+    FakeWhoisHandler.queries = []
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), FakeWhoisHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        config = SimpleNamespace(osint_whois_cache='whois_cache', osint_whois_store='whois_store',
+            osint_whois_ttl=30, osint_whois_workers=4, osint_whois_registry_delay=0,
+            osint_whois_server='127.0.0.1:%s' % server.server_address[1])
+        os.makedirs(tmp_path / 'whois_cache')
+        quest = SimpleNamespace(sphinx_env=SimpleNamespace(srcdir=str(tmp_path), config=config))
+        whoiss = {domain: OSIntWhois(f'whois.{domain}', domain, quest=quest)
+            for domain in ('example.com', 'example.org', 'unknown.com')}
+        resolver = OSIntWhois.resolver(config)
+        results = dict(resolver.resolve_all({name: (whois.domain, whois.load_cache())
+            for name, whois in whoiss.items()}))
+        assert sorted(FakeWhoisHandler.queries) == ['example.com', 'example.org', 'unknown.com']
+        assert results['example.com']['record']['registrar'] == 'Registrar One'
+        assert results['example.com']['record']['expiration_date'].startswith('2030-01-01')
+        assert results['example.com']['record']['name_servers'] == ['ns1.example.net', 'ns2.example.net']
+        assert results['unknown.com']['whois'] is None
+        for name, result in results.items():
+            whoiss[name].dump_cache(result)
+
+        # Fresh records and recent failures are not resolved again
+        FakeWhoisHandler.queries = []
+        for whois in whoiss.values():
+            whois.analyse()
+        assert FakeWhoisHandler.queries == []
+
+        # An expired record is resolved and its changes go to history
+        cached = whoiss['example.com'].load_cache()
+        cached['time'] = (datetime.now(timezone.utc) - timedelta(days=31)).isoformat()
+        whoiss['example.com'].dump_cache(cached)
+        FakeWhoisHandler.records['example.com'] = ('Registrar Two', '2032-01-01', ['NS1.EXAMPLE.NET'])
+        _, ffull = whoiss['example.com'].analyse()
+        assert FakeWhoisHandler.queries == ['example.com']
+        with open(ffull) as f:
+            result = json.load(f)
+        assert list(result['history'][0]['changes'].keys()) == ['registrar', 'expiration_date', 'name_servers']
+        assert result['history'][0]['changes']['registrar'] == ['Registrar One', 'Registrar Two']
+    finally:
+        server.shutdown()
+        server.server_close()